@@ -0,0 +1,448 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Incrementally maintained summary statistics (per personality, pair, condition and sweep cell)
+# in SQLite, updated as games finish and queryable while a sweep runs
+
+import argparse
+import ast
+import contextlib
+import glob
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import COOPERATIVE_ACTIONS
+
+logger = logging.getLogger(__name__)
+
+# Path of the aggregate database that every result writer updates (unset: no aggregates)
+AGGREGATES_ENV = "MBTI_AGGREGATES"
+
+RATE_METRICS = ("cooperation_rate", "truthfulness")
+METRICS = RATE_METRICS + ("score_diff",)
+
+# Key columns of each aggregate table ("<scope>_stats"). Personality and pair statistics are
+# per seat (the personality's own decisions and payoffs, against `opponent` for pairs);
+# condition and cell statistics are per game, as used by the stopping rules.
+SCOPES = {
+    "personality": ("personality", "base_game_name", "variant_type"),
+    "pair": ("personality", "opponent", "base_game_name", "variant_type"),
+    "condition": ("base_game_name", "variant_type", "regulator_model"),
+    "cell": ("condition_key",),
+}
+
+
+def _as_list(value) -> list:
+    # CSV rows store lists as their repr
+    return ast.literal_eval(value) if isinstance(value, str) else list(value)
+
+
+def game_metrics(game_name: str, result: dict) -> dict:
+    """
+    Per-game outcome metrics from an end state or a saved result row.
+
+    Returns:
+        dict: cooperation_rate and truthfulness in [0, 1] (pooled over both agents), score_diff,
+            the per-round score difference agent_1 - agent_2, and "observations", the number of
+            agent-round decisions behind each rate
+    """
+    actions_1, actions_2 = _as_list(result["agent_1_actions"]), _as_list(result["agent_2_actions"])
+    truthful = _as_list(result["truthful_agent_1"]) + _as_list(result["truthful_agent_2"])
+    scores_1, scores_2 = _as_list(result["agent_1_scores"]), _as_list(result["agent_2_scores"])
+    rounds = max(len(actions_1), 1)
+
+    cooperative_action = COOPERATIVE_ACTIONS.get(game_name)
+    if cooperative_action is None:
+        cooperation_trials = rounds
+        cooperation_rate = sum(a == b for a, b in zip(actions_1, actions_2)) / rounds
+    else:
+        cooperation_trials = 2 * rounds
+        cooperation_rate = sum(a == cooperative_action for a in actions_1 + actions_2) / cooperation_trials
+    return {
+        "cooperation_rate": cooperation_rate,
+        "truthfulness": sum(bool(t) for t in truthful) / len(truthful) if truthful else 0.0,
+        "score_diff": (sum(scores_1) - sum(scores_2)) / rounds,
+        "observations": {"cooperation_rate": cooperation_trials, "truthfulness": len(truthful)},
+    }
+
+
+def seat_metrics(game_name: str, result: dict, seat: int) -> dict:
+    """
+    Metrics of one seat (1 or 2) of a game: its cooperation rate (agreement rate in pure
+    coordination games), truthfulness (omitted when nothing was judged) and score per round.
+    """
+    own, other = (1, 2) if seat == 1 else (2, 1)
+    actions = _as_list(result[f"agent_{own}_actions"])
+    truthful = _as_list(result[f"truthful_agent_{own}"])
+    rounds = max(len(actions), 1)
+    cooperative_action = COOPERATIVE_ACTIONS.get(game_name)
+    if cooperative_action is None:
+        cooperation = sum(a == b for a, b in zip(actions, _as_list(result[f"agent_{other}_actions"])))
+    else:
+        cooperation = sum(a == cooperative_action for a in actions)
+    metrics = {
+        "cooperation_rate": cooperation / rounds,
+        "score": sum(_as_list(result[f"agent_{own}_scores"])) / rounds,
+    }
+    if truthful:
+        metrics["truthfulness"] = sum(bool(t) for t in truthful) / len(truthful)
+    return metrics
+
+
+class RunningStats:
+    """
+    Welford running mean and variance; two instances merge exactly (Chan et al.), so partial
+    statistics can be combined in any order.
+    """
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: "RunningStats"):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else math.inf
+
+    def ci_half_width(self, z: float) -> float:
+        return z * math.sqrt(self.variance / self.n) if self.n > 1 else math.inf
+
+
+def _schema() -> str:
+    tables = [
+        """
+        CREATE TABLE IF NOT EXISTS counted_games (
+            game_id    TEXT PRIMARY KEY,
+            counted_at REAL NOT NULL
+        );
+        """
+    ]
+    for scope, keys in SCOPES.items():
+        key_columns = "".join(f"{key} TEXT NOT NULL, " for key in keys)
+        tables.append(f"""
+        CREATE TABLE IF NOT EXISTS {scope}_stats (
+            {key_columns}metric TEXT NOT NULL,
+            n INTEGER NOT NULL, total REAL NOT NULL, mean REAL NOT NULL, m2 REAL NOT NULL,
+            min REAL NOT NULL, max REAL NOT NULL, updated_at REAL NOT NULL,
+            PRIMARY KEY ({", ".join(keys)}, metric)
+        ) WITHOUT ROWID;
+        """)
+    return "".join(tables)
+
+
+def _upsert(scope: str) -> str:
+    # Merges a partial aggregate into the stored one (the right-hand sides read the old row)
+    keys = SCOPES[scope]
+    columns = [*keys, "metric", "n", "total", "mean", "m2", "min", "max", "updated_at"]
+    return f"""
+        INSERT INTO {scope}_stats ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})
+        ON CONFLICT ({", ".join(keys)}, metric) DO UPDATE SET
+            n = n + excluded.n,
+            total = total + excluded.total,
+            mean = mean + (excluded.mean - mean) * excluded.n / (n + excluded.n),
+            m2 = m2 + excluded.m2
+                 + (excluded.mean - mean) * (excluded.mean - mean) * n * excluded.n / (n + excluded.n),
+            min = min(min, excluded.min),
+            max = max(max, excluded.max),
+            updated_at = excluded.updated_at
+    """
+
+
+class _Partial:
+    """
+    Aggregate of the values of one key within a batch of games.
+    """
+
+    __slots__ = ("stats", "total", "min", "max")
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.total, self.min, self.max = 0.0, math.inf, -math.inf
+
+    def add(self, value: float):
+        self.stats.add(value)
+        self.total += value
+        self.min, self.max = min(self.min, value), max(self.max, value)
+
+
+def _key(value) -> str:
+    # Key columns are NOT NULL (NULLs never conflict in a primary key)
+    return "" if value is None or (isinstance(value, float) and math.isnan(value)) else str(value)
+
+
+def result_observations(row: dict):
+    """
+    (scope, key, metric, value) of everything one result row contributes to the aggregates.
+
+    Args:
+        row (dict): A result row (saved CSV/Parquet row, or an end state merged with its setup
+            and tags, see `add_games`)
+    """
+    game_name = _key(row.get("base_game_name")) or _key(row.get("game_name"))
+    variant_type, regulator = _key(row.get("variant_type")), _key(row.get("regulator_model"))
+    personalities = (_key(row.get("personality_1")), _key(row.get("personality_2")))
+    for seat, (personality, opponent) in enumerate((personalities, personalities[::-1]), start=1):
+        for metric, value in seat_metrics(game_name, row, seat).items():
+            yield "personality", (personality, game_name, variant_type), metric, value
+            yield "pair", (personality, opponent, game_name, variant_type), metric, value
+
+    metrics = game_metrics(game_name, row)
+    per_game = {metric: metrics[metric] for metric in METRICS}
+    for column in ("total_tokens", "total_cost_USD"):
+        value = row.get(column)
+        if value is not None and not (isinstance(value, float) and math.isnan(value)):
+            per_game[column] = float(value)
+    for metric, value in per_game.items():
+        yield "condition", (game_name, variant_type, regulator), metric, value
+
+    cell_key = _key(row.get("cell_key"))
+    if cell_key:
+        # What the sequential stopping rules track per condition: the metrics, the pooled rate
+        # counts (as totals) and the highest replicate launched
+        condition_key, _, replicate = cell_key.rpartition("|r")
+        for metric in METRICS:
+            yield "cell", (condition_key,), metric, metrics[metric]
+        for metric in RATE_METRICS:
+            trials = metrics["observations"][metric]
+            yield "cell", (condition_key,), f"{metric}_trials", trials
+            yield "cell", (condition_key,), f"{metric}_successes", metrics[metric] * trials
+        if replicate.isdigit():
+            yield "cell", (condition_key,), "replicate", int(replicate)
+
+
+class AggregateStore:
+    """
+    Summary statistics in one SQLite file, merged in as games finish.
+
+    Each (scope, key, metric) row holds count, sum, min, max and the Welford mean and M2 of the
+    values, so readers get means and variances without rescanning results, and partial
+    aggregates (a batch of games, another worker) merge in with one UPSERT. Games with a
+    game_id are counted once, so re-ingesting results is harmless.
+
+    As for the work queue, the rollback journal works on shared/network filesystems; `wal=True`
+    (persistent for the file) lets readers run without ever blocking writers on one machine.
+    """
+
+    def __init__(self, path: str, wal: bool = False):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            if wal:
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_schema())
+
+    @contextlib.contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def add_rows(self, rows) -> int:
+        """
+        Merge result rows into the aggregates in one transaction.
+
+        Returns:
+            int: Number of games counted (rows whose game_id was already counted are skipped)
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            partials = {}
+            counted = 0
+            for row in rows:
+                game_id = _key(row.get("game_id"))
+                if game_id:
+                    before = connection.total_changes
+                    connection.execute("INSERT OR IGNORE INTO counted_games VALUES (?, ?)", (game_id, now))
+                    if connection.total_changes == before:
+                        continue
+                for scope, key, metric, value in result_observations(row):
+                    partial = partials.get((scope, key, metric))
+                    if partial is None:
+                        partial = partials[(scope, key, metric)] = _Partial()
+                    partial.add(value)
+                counted += 1
+            for scope in SCOPES:
+                connection.executemany(_upsert(scope), [
+                    (*key, metric, p.stats.n, p.total, p.stats.mean, p.stats.m2, p.min, p.max, now)
+                    for (row_scope, key, metric), p in partials.items() if row_scope == scope
+                ])
+        return counted
+
+    def add_games(self, results: list) -> int:
+        """
+        Merge finished games, given as in run_regulated_game.save_game_results.
+
+        Args:
+            results (list): (end_state, setup, tags) of each game
+        """
+        rows = []
+        for end_state, setup, tags in results:
+            rows.append({
+                **setup, **(tags or {}), **end_state,
+                "personality_1": end_state["personality_key_1"],
+                "personality_2": end_state["personality_key_2"],
+            })
+        return self.add_rows(rows)
+
+    def query(self, scope: str, metric: str = None, **keys) -> list:
+        """
+        Aggregate rows of a scope, optionally filtered by metric and key columns.
+
+        Returns:
+            list: dicts with the key columns, metric, n, total, mean, variance, std_error, min, max
+                and updated_at
+        """
+        conditions = {**keys, **({"metric": metric} if metric else {})}
+        unknown = set(conditions) - {*SCOPES[scope], "metric"}
+        if unknown:
+            raise ValueError(f"Unknown key columns for scope {scope}: {sorted(unknown)}")
+        where = " AND ".join(f"{column} = ?" for column in conditions) or "1"
+        with self._connect() as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                f"SELECT * FROM {scope}_stats WHERE {where} ORDER BY {', '.join(SCOPES[scope])}, metric",
+                list(conditions.values()),
+            ).fetchall()
+        results = []
+        for row in rows:
+            row = dict(row)
+            stats = RunningStats(row["n"], row["mean"], row["m2"])
+            row["variance"] = stats.variance
+            row["std_error"] = math.sqrt(stats.variance / stats.n) if stats.n > 1 else math.inf
+            results.append(row)
+        return results
+
+    def stats(self, scope: str, metric: str, *key) -> RunningStats:
+        """
+        Running statistics of one key and metric (empty if nothing was recorded).
+        """
+        where = " AND ".join(f"{column} = ?" for column in SCOPES[scope])
+        with self._connect() as connection:
+            row = connection.execute(
+                f"SELECT n, mean, m2 FROM {scope}_stats WHERE {where} AND metric = ?", (*key, metric)
+            ).fetchone()
+        return RunningStats(*row) if row else RunningStats()
+
+    def counts(self) -> dict:
+        with self._connect() as connection:
+            return {
+                "games": connection.execute("SELECT count(*) FROM counted_games").fetchone()[0],
+                **{scope: connection.execute(f"SELECT count(*) FROM {scope}_stats").fetchone()[0]
+                   for scope in SCOPES},
+            }
+
+
+_stores: dict[str, AggregateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_aggregate_store(path: str = None) -> Optional[AggregateStore]:
+    """
+    The process-wide aggregate store at `path` (default: MBTI_AGGREGATES), or None if no path is set.
+    """
+    path = path or os.getenv(AGGREGATES_ENV)
+    if not path:
+        return None
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = AggregateStore(path)
+        return _stores[path]
+
+
+def update_aggregates(results: list):
+    """
+    Merge just-saved games into the MBTI_AGGREGATES store, if one is set. The results are
+    already saved, so a failure is logged rather than raised (`ingest` catches up later).
+    """
+    store = get_aggregate_store()
+    if store is None:
+        return
+    try:
+        store.add_games(results)
+    except sqlite3.Error as e:
+        logger.warning("Aggregates in %s not updated for %d game(s): %s (run `aggregates.py ingest` to catch up)",
+                       store.path, len(results), e)
+
+
+def _format(value: float) -> str:
+    return "—" if value is None or math.isinf(value) else f"{value:.4g}"
+
+
+def main(args):
+    from logging_setup import setup_logging
+
+    setup_logging()
+    store = AggregateStore(args.db, wal=args.wal)
+    if args.command == "ingest":
+        from parquet_store import read_results_frame
+
+        paths = sorted({path for pattern in args.results for path in (glob.glob(pattern) or [pattern])})
+        for path in paths:
+            started = time.monotonic()
+            df = read_results_frame(path)
+            counted = store.add_rows(df.to_dict("records"))
+            print(f"{path}: {counted} of {len(df)} games counted ({time.monotonic() - started:.1f}s)")
+        print(f"{args.db}: {store.counts()}")
+    elif args.command == "show":
+        keys = dict(item.split("=", 1) for item in args.where or [])
+        rows = store.query(args.scope, args.metric, **keys)
+        key_columns = SCOPES[args.scope]
+        print("  ".join([*key_columns, "metric", "n", "mean", "std_error", "min", "max"]))
+        for row in rows:
+            print("  ".join([*(row[column] or "-" for column in key_columns), row["metric"], str(row["n"]),
+                             *(_format(row[column]) for column in ("mean", "std_error", "min", "max"))]))
+        print(f"{len(rows)} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain and query incremental result aggregates")
+    parser.add_argument("--db", type=str, default=os.getenv(AGGREGATES_ENV) or "data/aggregates.db")
+    parser.add_argument("--wal", action="store_true",
+                        help="Switch the database to WAL mode (only when all writers share one machine)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Merge saved results (games already counted are skipped)")
+    ingest_parser.add_argument("results", nargs="+", help="Result CSVs or Parquet datasets (glob patterns allowed)")
+
+    show_parser = subparsers.add_parser("show", help="Print the aggregates of one scope")
+    show_parser.add_argument("scope", choices=list(SCOPES))
+    show_parser.add_argument("--metric", type=str, required=False)
+    show_parser.add_argument("--where", nargs="*", help="Key filters, e.g. personality=INTJ variant_type=base")
+
+    main(parser.parse_args())
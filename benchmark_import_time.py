@@ -0,0 +1,111 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Import-time benchmark with budgets (see BENCHMARKS.md)
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Cumulative import budget per entry module, in milliseconds (`python -X importtime`)
+IMPORT_BUDGETS_MS = {
+    "main": 50,
+    "config": 50,
+    "models": 50,
+    "run_regulated_game": 800,
+}
+
+# Wall-clock budget for `python main.py --help`, in milliseconds (includes interpreter startup)
+HELP_BUDGET_MS = 300
+
+# Heavy modules that must not be pulled in just by importing an entry module
+FORBIDDEN_AT_IMPORT = ["pandas", "langgraph", "langchain_community", "langchain_openai", "openai", "dotenv"]
+
+
+def measure_import(module_name: str) -> dict:
+    """
+    Import a module in a fresh interpreter with `-X importtime`.
+
+    Args:
+        module_name (str): The module to import
+    Returns:
+        dict: Cumulative import time in ms and the forbidden modules that got imported
+    """
+    check = (
+        f"import sys, {module_name}; "
+        f"print(','.join(m for m in {FORBIDDEN_AT_IMPORT!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=current_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module_name} failed:\n{result.stderr}")
+
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # The entry module's own line carries the cumulative time of everything it imported
+        if name.strip() == module_name and not name.startswith("  "):
+            cumulative_us = int(cumulative.strip())
+
+    leaked = [m for m in result.stdout.strip().split(",") if m]
+    return {"cumulative_ms": cumulative_us / 1000, "leaked_modules": leaked}
+
+
+def measure_help(repeat: int = 3) -> float:
+    """
+    Measure the best-of-n wall time of `python main.py --help` in milliseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "--help"], cwd=current_dir,
+                       capture_output=True, check=True)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def main(args):
+    report = {"imports": {}, "help_ms": None, "ok": True}
+
+    for module_name, budget in IMPORT_BUDGETS_MS.items():
+        measurement = measure_import(module_name)
+        within_budget = measurement["cumulative_ms"] <= budget and not measurement["leaked_modules"]
+        report["imports"][module_name] = {**measurement, "budget_ms": budget, "ok": within_budget}
+        report["ok"] &= within_budget
+        status = "✓" if within_budget else "✗"
+        leaked = f" (leaked: {', '.join(measurement['leaked_modules'])})" if measurement["leaked_modules"] else ""
+        print(f"{status} import {module_name:<22} {measurement['cumulative_ms']:8.1f} ms / {budget} ms{leaked}")
+
+    help_ms = measure_help(args.repeat)
+    report["help_ms"] = help_ms
+    report["help_ok"] = help_ms <= HELP_BUDGET_MS
+    report["ok"] &= report["help_ok"]
+    status = "✓" if report["help_ok"] else "✗"
+    print(f"{status} main.py --help{'':<15} {help_ms:8.1f} ms / {HELP_BUDGET_MS} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check import-time budgets of the entry modules")
+    parser.add_argument("--repeat", type=int, default=3,
+                       help="Number of `main.py --help` runs (best is reported)")
+    parser.add_argument("--output", type=str, required=False,
+                       help="Optional path to write the JSON report")
+    sys.exit(main(parser.parse_args()))
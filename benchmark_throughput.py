@@ -0,0 +1,237 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# End-to-end throughput and resilience benchmark against the local stand-in server
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from http_pool import http_pool_stats, reset_http_pool_stats
+from local_openai_server import LocalOpenAIServer, StandInSettings
+from logging_setup import setup_logging
+from request_executor import ExecutorSettings, configure_executor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+PERSONALITIES = ["INTJ", "ENFP", "ESTJ", "ISFP", "ENTP", "ISFJ", "ESTP", "INFJ",
+                 "INTP", "ESFP", "ENTJ", "INFP", "ESFJ", "ISTP", "ENFJ", "ISTJ"]
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    Nearest-rank percentile (q in [0, 100]); None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=current_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_one_game(game_index: int, scenario: dict, args) -> dict:
+    """
+    Play one game and collect its round timings and per-round prompt tokens.
+    """
+    from run_regulated_game import run_regulated_game
+
+    personality_1 = PERSONALITIES[game_index % len(PERSONALITIES)]
+    personality_2 = PERSONALITIES[(game_index * 7 + 3) % len(PERSONALITIES)]
+    timeline = []
+
+    def on_progress(event: dict):
+        timeline.append({**event, "time": time.perf_counter()})
+
+    start = time.perf_counter()
+    try:
+        run_regulated_game(
+            regulator_model_id=args.regulator_model, regulator_provider=None,
+            player_model_1=args.player_model, player_provider_1=None,
+            player_model_2=args.player_model, player_provider_2=None,
+            total_rounds=scenario["rounds"],
+            personality_key_1=personality_1, personality_key_2=personality_2,
+            base_game_name=args.game_name, variant_type=args.variant_type,
+            file_path=None, progress_callback=on_progress,
+        )
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    round_latencies = []
+    prompt_tokens_by_round = {}
+    for previous, event in zip(timeline, timeline[1:]):
+        round_latencies.append(event["time"] - previous["time"])
+        prompt_tokens_by_round[event["round"]] = event["prompt_tokens"] - previous["prompt_tokens"]
+    return {
+        "error": error,
+        "wall_seconds": time.perf_counter() - start,
+        "round_latencies": round_latencies,
+        "prompt_tokens_by_round": prompt_tokens_by_round,
+    }
+
+
+def run_scenario(scenario: dict, args) -> dict:
+    """
+    Run `args.games` games with the scenario's concurrency against a fresh stand-in server.
+    """
+    settings = StandInSettings(
+        latency=args.latency,
+        rate_limit_rate=scenario["rate_limit_rate"],
+        retry_after=args.retry_after,
+        stall_rate=scenario["timeout_rate"],
+        stall_seconds=args.stall_seconds,
+        drop_rate=scenario["drop_rate"],
+        seed=args.seed,
+    )
+    server = LocalOpenAIServer(settings).start()
+    os.environ["MBTI_API_BASE"] = server.base_url
+    # Fresh executor per scenario so AIMD limits and metrics do not leak between scenarios
+    executor = configure_executor(ExecutorSettings(hedge=args.hedge))
+    reset_http_pool_stats()
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=scenario["concurrency"]) as pool:
+            games = list(pool.map(lambda i: run_one_game(i, scenario, args), range(args.games)))
+    finally:
+        wall_seconds = time.perf_counter() - start
+        server_stats = server.stats()
+        server.stop()
+
+    completed = [g for g in games if g["error"] is None]
+    latencies = [latency for g in completed for latency in g["round_latencies"]]
+    tokens_by_round = {}
+    for game in completed:
+        for round_number, tokens in game["prompt_tokens_by_round"].items():
+            tokens_by_round.setdefault(round_number, []).append(tokens)
+
+    retried = server_stats["requests"] - server_stats["ok"]
+    return {
+        **scenario,
+        "games": len(games),
+        "completed_games": len(completed),
+        "errors": sorted({g["error"] for g in games if g["error"]}),
+        "wall_seconds": wall_seconds,
+        "games_per_minute": len(completed) / wall_seconds * 60 if wall_seconds else None,
+        "round_latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+        },
+        "calls_per_game": server_stats["requests"] / len(games) if games else None,
+        "successful_calls_per_game": server_stats["ok"] / len(games) if games else None,
+        "prompt_tokens_per_round": {
+            str(r): sum(v) / len(v) for r, v in sorted(tokens_by_round.items())
+        },
+        "retry": {
+            "retried_requests": retried,
+            "retry_fraction": retried / server_stats["requests"] if server_stats["requests"] else 0.0,
+            "rate_limited": server_stats["rate_limited"],
+            "dropped": server_stats["dropped"],
+            "stalled": server_stats["stalled"],
+        },
+        "server": server_stats,
+        "executor": executor.metrics(),
+        "http_pool": http_pool_stats(),
+    }
+
+
+def add_retry_overhead(results: list):
+    """
+    Express each faulty scenario's wall time relative to the fault-free run with the same shape.
+    """
+    baselines = {
+        (r["concurrency"], r["rounds"]): r["wall_seconds"]
+        for r in results
+        if r["rate_limit_rate"] == 0 and r["timeout_rate"] == 0 and r["drop_rate"] == 0
+    }
+    for result in results:
+        baseline = baselines.get((result["concurrency"], result["rounds"]))
+        result["retry"]["wall_time_overhead"] = (
+            (result["wall_seconds"] - baseline) / baseline if baseline else None
+        )
+
+
+def parse_list(value: str, cast=float) -> list:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main(args):
+    # The per-game log records go to stderr; keep only warnings unless asked for
+    setup_logging("INFO" if args.verbose else "WARNING")
+    scenarios = [
+        {"concurrency": c, "rounds": r, "rate_limit_rate": rl, "timeout_rate": to, "drop_rate": dr}
+        for c, r, rl, to, dr in itertools.product(
+            parse_list(args.concurrency, int), parse_list(args.rounds, int),
+            parse_list(args.rate_limit_rates), parse_list(args.timeout_rates), parse_list(args.drop_rates),
+        )
+    ]
+
+    results = []
+    for index, scenario in enumerate(scenarios, 1):
+        print(f"[{index}/{len(scenarios)}] {scenario}", flush=True)
+        result = run_scenario(scenario, args)
+        results.append(result)
+        latency = result["round_latency_seconds"]
+        p95 = f"{latency['p95']:.3f}s" if latency["p95"] is not None else "n/a"
+        print(f"    {result['games_per_minute']:.1f} games/min, p95 round {p95}, "
+              f"{result['calls_per_game']:.1f} calls/game, "
+              f"{result['retry']['retried_requests']} retried requests", flush=True)
+    add_retry_overhead(results)
+
+    report = {
+        "benchmark": "throughput",
+        "commit": get_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "verbose")},
+        "scenarios": results,
+    }
+    output_path = args.output or os.path.join(
+        "data", "benchmarks", f"throughput_{report['commit']}_{datetime.now().strftime('%y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run full run_regulated_game sweeps against a local stand-in endpoint and report throughput"
+    )
+    parser.add_argument("--games", type=int, default=8, help="Games per scenario")
+    parser.add_argument("--concurrency", type=str, default="1,4", help="Comma-separated concurrent games")
+    parser.add_argument("--rounds", type=str, default="3", help="Comma-separated rounds per game")
+    parser.add_argument("--rate_limit_rates", type=str, default="0,0.05", help="Comma-separated 429 probabilities")
+    parser.add_argument("--timeout_rates", type=str, default="0", help="Comma-separated stall probabilities")
+    parser.add_argument("--drop_rates", type=str, default="0", help="Comma-separated dropped-connection probabilities")
+    parser.add_argument("--stall_seconds", type=float, default=5.0, help="Duration of an injected stall")
+    parser.add_argument("--retry_after", type=float, default=0.5, help="Retry-After sent with injected 429s")
+    parser.add_argument("--latency", type=str, default="lognormal:0.05,0.5", help="Stand-in latency distribution")
+    parser.add_argument("--game_name", type=str, default="prisoners_dilemma")
+    parser.add_argument("--variant_type", type=str, default="complex")
+    parser.add_argument("--regulator_model", type=str, default="gpt-4o")
+    parser.add_argument("--player_model", type=str, default="gpt-4o-mini")
+    parser.add_argument("--hedge", action="store_true", help="Enable hedged requests in the executor")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=str, required=False,
+                       help="JSON output path (default: data/benchmarks/throughput_<commit>_<time>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Log the per-game INFO records")
+    main(parser.parse_args())
@@ -0,0 +1,464 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Bootstrap confidence intervals and permutation tests for per-personality, per-pair and
+# variant-vs-base metrics of stored results
+
+import argparse
+import logging
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import BASE_VARIANT_TYPE, COOPERATIVE_ACTIONS
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("cooperation_rate", "truthfulness", "score")
+# A seat row (one personality in one game) holds (numerator, denominator) per metric:
+# cooperative decisions / rounds, truthful messages / judged messages, payoff / rounds
+SEAT_COLUMNS = 2 * len(METRICS)
+BASE_VARIANT = BASE_VARIANT_TYPE
+
+RESULT_COLUMNS = ["base_game_name", "game_name", "variant_type", "personality_1", "personality_2",
+                  "agent_1_actions", "agent_2_actions", "agent_1_scores", "agent_2_scores",
+                  "truthful_agent_1", "truthful_agent_2"]
+
+
+def load_results(paths: list, extra_columns: list = ()):
+    """
+    Result rows of CSV files and Parquet datasets as one Arrow table (legacy CSVs are parsed
+    with the converter of parquet_store).
+    """
+    import pyarrow as pa
+
+    from parquet_store import is_parquet, legacy_csv_records, read_results, records_to_table
+
+    columns = RESULT_COLUMNS + [c for c in extra_columns if c not in RESULT_COLUMNS]
+    tables = []
+    for path in paths:
+        if is_parquet(path):
+            tables.append(read_results(path, columns))
+        else:
+            tables.append(records_to_table(legacy_csv_records(path)).select(columns))
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def _flatten(column, n_games: int) -> tuple:
+    """
+    Flattened values of a list column with the game index of each value and per-game lengths.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    column = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    values = pc.list_flatten(column)
+    if pa.types.is_dictionary(values.type):
+        values = values.dictionary_decode()
+    parents = pc.list_parent_indices(column).to_numpy()
+    lengths = np.bincount(parents, minlength=n_games)
+    return values.to_numpy(zero_copy_only=False), parents, lengths
+
+
+def seat_rows(table) -> tuple:
+    """
+    Per-seat sufficient statistics, vectorized over all games.
+
+    Returns:
+        tuple: (games, seats) where games is a DataFrame of the per-game keys and seats an
+            (n_games, 2, SEAT_COLUMNS) float array (axis 1: agent_1, agent_2)
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    rounds_1, rounds_2 = (
+        pc.fill_null(pc.list_value_length(table.column(f"agent_{i}_actions")), 0).to_numpy() for i in (1, 2)
+    )
+    keep = (rounds_1 == rounds_2) & (rounds_1 > 0)
+    if not keep.all():
+        logger.warning("Skipping %d games without rounds or with unequal action lists", (~keep).sum())
+        table = table.filter(pa.array(keep))
+    n = table.num_rows
+
+    games = table.select([c for c in table.column_names if not c.startswith(("agent_", "truthful_"))]).to_pandas()
+    for column in games.columns:
+        games[column] = games[column].astype(object)
+    games["base_game_name"] = games["base_game_name"].fillna(
+        games["game_name"].astype(str).str.removesuffix("_variant"))
+    cooperative = games["base_game_name"].map(COOPERATIVE_ACTIONS).to_numpy(dtype=object)
+
+    seats = np.zeros((n, 2, SEAT_COLUMNS))
+    actions = [_flatten(table.column(f"agent_{i}_actions"), n) for i in (1, 2)]
+    # Games without a cooperative action count coordinated rounds (as in sequential_stopping)
+    coordinated = actions[0][0] == actions[1][0]
+    for seat, (flat, parents, rounds) in enumerate(actions):
+        target = cooperative[parents]
+        hits = np.where(target == None, coordinated, flat == target)  # noqa: E711
+        seats[:, seat, 0] = np.bincount(parents, weights=hits, minlength=n)
+        seats[:, seat, 1] = rounds
+
+        truthful, truth_parents, truth_lengths = _flatten(table.column(f"truthful_agent_{seat + 1}"), n)
+        seats[:, seat, 2] = np.bincount(truth_parents, weights=truthful.astype(bool), minlength=n)
+        seats[:, seat, 3] = truth_lengths
+
+        scores, score_parents, score_lengths = _flatten(table.column(f"agent_{seat + 1}_scores"), n)
+        seats[:, seat, 4] = np.bincount(score_parents, weights=scores.astype(float), minlength=n)
+        seats[:, seat, 5] = score_lengths
+    return games, seats
+
+
+def ratios(totals: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return totals[..., 0::2] / totals[..., 1::2]
+
+
+def compress(rows: np.ndarray) -> tuple:
+    """
+    Distinct rows, their multiplicities and the index of each row's distinct row. Resampling
+    rows with replacement is a multinomial draw over the distinct rows, so the cost scales with
+    the (small) number of distinct rows rather than with the number of games.
+    """
+    # One integer key per row from the per-column codes (much faster than np.unique(axis=0))
+    key = np.zeros(len(rows), dtype=np.int64)
+    for column in rows.T:
+        uniques, codes = np.unique(column, return_inverse=True)
+        key = np.unique(key * len(uniques) + codes, return_inverse=True)[1]
+    _, first, inverse, counts = np.unique(key, return_index=True, return_inverse=True, return_counts=True)
+    return rows[first], counts, inverse
+
+
+def _blocks(resamples: int, width: int, max_cells: int = 4_000_000):
+    # Resamples per block, bounding the (samples x width) draw matrices
+    block = max(1, max_cells // max(width, 1))
+    for start in range(0, resamples, block):
+        yield start, min(resamples, start + block)
+
+
+# Below this many rows per distinct row, drawing row indices is cheaper than binomial draws
+DIRECT_DRAW_RATIO = 10
+
+
+def _category_counts(categories: np.ndarray, draws: np.ndarray, n_categories: int) -> np.ndarray:
+    """
+    Per-sample counts of each category, given sampled row positions (samples x positions).
+    """
+    offsets = np.arange(len(draws))[:, None] * n_categories
+    return np.bincount((offsets + categories[draws]).ravel(), minlength=len(draws) * n_categories
+                       ).reshape(len(draws), n_categories)
+
+
+def bootstrap_totals(values: np.ndarray, counts: np.ndarray, resamples: int, rng) -> np.ndarray:
+    """
+    Column totals of `resamples` bootstrap samples of the rows (values repeated counts times).
+    """
+    n, k = int(counts.sum()), len(counts)
+    totals = np.empty((resamples, values.shape[1]))
+    if n > DIRECT_DRAW_RATIO * k:
+        p = counts / n
+        for start, stop in _blocks(resamples, k):
+            totals[start:stop] = rng.multinomial(n, p, size=stop - start) @ values
+        return totals
+    categories = np.repeat(np.arange(k), counts)
+    for start, stop in _blocks(resamples, n):
+        draws = rng.integers(0, n, size=(stop - start, n))
+        totals[start:stop] = _category_counts(categories, draws, k) @ values
+    return totals
+
+
+def sign_flips(counts: np.ndarray, size: int, rng) -> np.ndarray:
+    """
+    Per-sample number of flipped rows of each distinct row, every row flipping with probability 1/2.
+    """
+    n, k = int(counts.sum()), len(counts)
+    if n > DIRECT_DRAW_RATIO * k:
+        return rng.binomial(counts, 0.5, size=(size, k))
+    bits = np.unpackbits(rng.integers(0, 256, size=(size, (n + 7) // 8), dtype=np.uint8), axis=1)[:, :n]
+    categories = np.repeat(np.arange(k), counts)
+    offsets = np.arange(size)[:, None] * k
+    return np.bincount((offsets + categories).ravel(), weights=bits.ravel(), minlength=size * k).reshape(size, k)
+
+
+def permutation_totals(values: np.ndarray, counts: np.ndarray, n_a: int, resamples: int, rng) -> np.ndarray:
+    """
+    Column totals of group A under random relabelling of the pooled rows into groups of n_a and
+    n - n_a rows (multivariate hypergeometric over the distinct rows).
+    """
+    totals = np.empty((resamples, values.shape[1]))
+    for start, stop in _blocks(resamples, len(counts)):
+        draws = rng.multivariate_hypergeometric(counts, n_a, size=stop - start, method="marginals")
+        totals[start:stop] = draws @ values
+    return totals
+
+
+def interval(samples: np.ndarray, confidence: float) -> tuple:
+    """
+    Percentile interval of bootstrap samples.
+    """
+    alpha = (1 - confidence) / 2
+    with np.errstate(invalid="ignore"):
+        return tuple(np.nanquantile(samples, [alpha, 1 - alpha]))
+
+
+def p_value(null: np.ndarray, observed: float) -> float:
+    """
+    Two-sided permutation p-value with the +1 correction.
+    """
+    null = null[~np.isnan(null)]
+    return (1 + np.sum(np.abs(null) >= abs(observed) - 1e-12)) / (1 + len(null))
+
+
+def _rng(seed: int, key: str):
+    # Seeded per cell, so results do not depend on the cell order or the number of workers
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(zlib.crc32(key.encode()),)))
+
+
+def two_group_task(task: dict) -> list:
+    """
+    Group A's metrics with bootstrap intervals, and the contrast A - B with an interval from
+    independent bootstraps of both groups and a label-permutation p-value.
+
+    Every metric is resampled on its own distinct (numerator, denominator) rows: the intervals
+    are per metric, and the few distinct rows per metric keep the draws cheap.
+    """
+    rng = _rng(task["seed"], task["key"])
+    resamples, rows = task["resamples"], []
+    for metric, values, counts_a, counts_b in zip(METRICS, task["values"], task["a"], task["b"]):
+        boot_a = ratios(bootstrap_totals(values, counts_a, resamples, rng))[:, 0]
+        estimate = ratios(counts_a @ values)[0]
+        low, high = interval(boot_a, task["confidence"])
+        row = {"metric": metric, "estimate": estimate, "ci_low": low, "ci_high": high}
+        if counts_b.sum():
+            boot_b = ratios(bootstrap_totals(values, counts_b, resamples, rng))[:, 0]
+            contrast = estimate - ratios(counts_b @ values)[0]
+            contrast_low, contrast_high = interval(boot_a - boot_b, task["confidence"])
+            pooled = counts_a + counts_b
+            perm_a = permutation_totals(values, pooled, int(counts_a.sum()), resamples, rng)
+            null = (ratios(perm_a) - ratios(pooled @ values - perm_a))[:, 0]
+            row.update({"contrast": contrast, "contrast_ci_low": contrast_low,
+                        "contrast_ci_high": contrast_high, "p_value": p_value(null, contrast)})
+        rows.append(row)
+    return _result_rows(task, rows, int(task["a"][0].sum()), int(task["b"][0].sum()))
+
+
+def pair_task(task: dict) -> list:
+    """
+    Metrics of a personality pair over its games (both seats pooled) with bootstrap intervals,
+    and the contrast between the two personalities within those games, tested by randomly
+    swapping which seat belongs to which personality (sign flips); "pds" is |cooperation contrast|.
+
+    Games are resampled jointly for all metrics: pairs have few games, most of them distinct.
+    """
+    rng = _rng(task["seed"], task["key"])
+    values, counts, resamples = task["values"], task["counts"], task["resamples"]  # A's seat, then B's
+    total = counts @ values
+    boot = bootstrap_totals(values, counts, resamples, rng)
+    swap = values[:, SEAT_COLUMNS:] - values[:, :SEAT_COLUMNS]
+    moved = np.empty((resamples, SEAT_COLUMNS))
+    for start, stop in _blocks(resamples, len(counts)):
+        moved[start:stop] = sign_flips(counts, stop - start, rng) @ swap
+
+    total_a, total_b = total[:SEAT_COLUMNS], total[SEAT_COLUMNS:]
+    boot_a, boot_b = boot[:, :SEAT_COLUMNS], boot[:, SEAT_COLUMNS:]
+    estimate = ratios(total_a + total_b)
+    contrast = ratios(total_a) - ratios(total_b)
+    boot_contrast = ratios(boot_a) - ratios(boot_b)
+    null = ratios(total_a + moved) - ratios(total_b - moved)
+    boot_pooled = ratios(boot_a + boot_b)
+    rows = []
+    for index, metric in enumerate(METRICS):
+        low, high = interval(boot_pooled[:, index], task["confidence"])
+        contrast_low, contrast_high = interval(boot_contrast[:, index], task["confidence"])
+        p = p_value(null[:, index], contrast[index])
+        rows.append({"metric": metric, "estimate": estimate[index], "ci_low": low, "ci_high": high,
+                     "contrast": contrast[index], "contrast_ci_low": contrast_low,
+                     "contrast_ci_high": contrast_high, "p_value": p})
+        if metric == "cooperation_rate":
+            pds_low, pds_high = interval(np.abs(boot_contrast[:, index]), task["confidence"])
+            rows.append({"metric": "pds", "estimate": abs(contrast[index]), "ci_low": pds_low,
+                         "ci_high": pds_high, "p_value": p})
+    n = int(counts.sum())
+    return _result_rows(task, rows, n, n)
+
+
+def _result_rows(task: dict, rows: list, n: int, n_reference: int) -> list:
+    return [
+        {**task["labels"], **{key: value if key == "metric" else float(value) for key, value in row.items()},
+         "n": n, "n_reference": n_reference}
+        for row in rows
+    ]
+
+
+def build_tasks(games, seats: np.ndarray, by: list, resamples: int, confidence: float, seed: int,
+                min_games: int) -> list:
+    """
+    One task per cell: per personality (against the other personalities of the same condition),
+    per unordered personality pair, and per variant type against the base game (per personality
+    and over all personalities). Tasks carry per-metric counts of distinct rows, not the rows.
+    """
+    condition_columns = ["base_game_name", "variant_type", *by]
+    games = games.assign(**{column: games[column].astype(str) for column in condition_columns})
+    seat_frame = games[condition_columns].copy()
+    seat_frame = seat_frame.loc[seat_frame.index.repeat(2)].reset_index(drop=True)
+    seat_frame["personality"] = np.column_stack([games["personality_1"].astype(str),
+                                                 games["personality_2"].astype(str)]).ravel()
+    seat_values = seats.reshape(-1, SEAT_COLUMNS)
+    # Distinct (numerator, denominator) rows of every metric over all seats, and each seat's row
+    metric_values, metric_codes = [], []
+    for index in range(len(METRICS)):
+        values, _, codes = compress(seat_values[:, [2 * index, 2 * index + 1]])
+        metric_values.append(values)
+        metric_codes.append(codes)
+
+    def seat_counts(seat_index) -> list:
+        return [np.bincount(codes[seat_index], minlength=len(values))
+                for values, codes in zip(metric_values, metric_codes)]
+
+    common = {"resamples": resamples, "confidence": confidence, "seed": seed}
+    tasks = []
+
+    def labels(analysis, condition, group, reference):
+        return {"analysis": analysis, **dict(zip(condition_columns, condition)), "group": group,
+                "reference": reference}
+
+    by_condition = dict(tuple(seat_frame.groupby(condition_columns, sort=True)))
+    for condition, frame in by_condition.items():
+        total = seat_counts(frame.index)
+        for personality, group in frame.groupby("personality", sort=True):
+            if len(group) < min_games:
+                continue
+            counts = seat_counts(group.index)
+            key = "|".join(map(str, ("personality", *condition, personality)))
+            tasks.append({**common, "kind": "two_group", "key": key, "values": metric_values, "a": counts,
+                          "b": [t - c for t, c in zip(total, counts)],
+                          "labels": labels("personality", condition, personality, "others")})
+
+    game_conditions = games[condition_columns[0]].str.cat([games[c] for c in condition_columns[1:]], sep="|")
+    personality_1, personality_2 = games["personality_1"].astype(str), games["personality_2"].astype(str)
+    swapped = (personality_1 > personality_2).to_numpy()
+    first = personality_1.where(~swapped, personality_2)
+    second = personality_2.where(~swapped, personality_1)
+    # Seat index of the alphabetically first and second personality of every game
+    seat_first = 2 * np.arange(len(games)) + swapped
+    seat_second = 2 * np.arange(len(games)) + ~swapped
+    pair_frame = games[condition_columns].assign(first=first, second=second)
+    for (condition_key, a, b), group in pair_frame.groupby([game_conditions, first, second], sort=True):
+        if a == b or len(group) < min_games:
+            continue
+        values, counts, _ = compress(np.hstack([seat_values[seat_first[group.index]],
+                                                seat_values[seat_second[group.index]]]))
+        condition = tuple(group.iloc[0][condition_columns])
+        tasks.append({**common, "kind": "pair", "key": f"pair|{condition_key}|{a}|{b}", "values": values,
+                      "counts": counts, "labels": labels("pair", condition, f"{a} vs {b}", None)})
+
+    unreferenced = 0
+    for condition, frame in by_condition.items():
+        if condition[1] == BASE_VARIANT:
+            continue
+        base = by_condition.get((condition[0], BASE_VARIANT, *condition[2:]))
+        if base is None:
+            unreferenced += 1
+            continue
+        groups = [("all", frame, base)] + [
+            (personality, group, base[base["personality"] == personality])
+            for personality, group in frame.groupby("personality", sort=True)
+        ]
+        for personality, group, reference in groups:
+            if len(group) < min_games or len(reference) < min_games:
+                continue
+            key = "|".join(map(str, ("variant", *condition, personality)))
+            tasks.append({**common, "kind": "two_group", "key": key, "values": metric_values,
+                          "a": seat_counts(group.index), "b": seat_counts(reference.index),
+                          "labels": labels("variant_vs_base", condition, personality, BASE_VARIANT)})
+    if unreferenced:
+        logger.warning("No variant-vs-base contrast for %d condition(s) without base-game games "
+                       "(play them with variant_type '%s' in a sweep spec, main.py or tournament.py --base_game)",
+                       unreferenced, BASE_VARIANT)
+    return tasks
+
+
+def run_task(task: dict) -> list:
+    return pair_task(task) if task["kind"] == "pair" else two_group_task(task)
+
+
+def analyze(paths: list, by: list = (), resamples: int = 10_000, confidence: float = 0.95, seed: int = 0,
+            min_games: int = 5, workers: int = None):
+    """
+    Intervals and tests for all cells of the results.
+
+    Returns:
+        pandas.DataFrame: One row per cell and metric
+    """
+    import pandas as pd
+
+    started = time.monotonic()
+    table = load_results(paths, by)
+    games, seats = seat_rows(table)
+    tasks = build_tasks(games, seats, list(by), resamples, confidence, seed, min_games)
+    logger.info("%d games (%d rounds) -> %d cells, loaded in %.1fs", len(games),
+                int(seats[:, 0, 1].sum()), len(tasks), time.monotonic() - started)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        results = [run_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    logger.info("%d cells x %d resamples in %.1fs", len(tasks), resamples, time.monotonic() - started)
+    return pd.DataFrame([row for rows in results for row in rows])
+
+
+def print_summary(df, limit: int = 20):
+    import pandas as pd
+
+    for analysis in ("personality", "pair", "variant_vs_base"):
+        rows = df[(df["analysis"] == analysis) & (df["metric"] == "cooperation_rate")]
+        if rows.empty:
+            continue
+        reference = rows["reference"].iloc[0]
+        print(f"\n{analysis}: {len(rows)} cells (cooperation rate; contrast against "
+              f"{'the partner' if pd.isna(reference) else reference})")
+        for _, row in rows.sort_values("p_value").head(limit).iterrows():
+            print(f"  {row['base_game_name']:<18} {row['variant_type']:<11} {row['group']:<16} "
+                  f"{row['estimate']:6.1%} [{row['ci_low']:6.1%}, {row['ci_high']:6.1%}]  "
+                  f"contrast {row['contrast']:+6.1%} [{row['contrast_ci_low']:+6.1%}, {row['contrast_ci_high']:+6.1%}]  "
+                  f"p={row['p_value']:.4f}  n={row['n']}")
+
+
+def main(args):
+    from logging_setup import setup_logging
+    from parquet_store import is_parquet
+
+    setup_logging()
+    df = analyze(args.results, args.by, args.resamples, args.confidence, args.seed, args.min_games, args.workers)
+    if df.empty:
+        print("No cell has enough games")
+        return
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    if is_parquet(args.output):
+        df.to_parquet(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+    print_summary(df)
+    print(f"\n{len(df)} rows -> {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bootstrap intervals and permutation tests for personality, pair and variant-vs-base metrics"
+    )
+    parser.add_argument("results", nargs="+", help="Result CSVs or Parquet datasets")
+    parser.add_argument("--by", nargs="*", default=[],
+                        help="Extra condition columns, e.g. regulator_model model_name_1")
+    parser.add_argument("--resamples", type=int, default=10_000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min_games", type=int, default=5, help="Skip cells with fewer games")
+    parser.add_argument("--workers", type=int, required=False, help="Processes (default: all cores)")
+    parser.add_argument("--output", type=str, default="data/analysis/intervals.csv",
+                        help="Output table (.csv or .parquet)")
+    main(parser.parse_args())
@@ -0,0 +1,194 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Compact per-game state: array-backed per-round records and a shared, refcounted message store
+
+import sys
+import threading
+from array import array
+
+AGENTS = ("agent_1", "agent_2")
+
+# Intent that the judge has not given (an action index otherwise)
+NO_INTENT = -1
+
+
+class MessageStore:
+    """
+    Texts (player messages, judge analyses) stored once per process and referenced by int id.
+
+    Identical texts share one entry. Entries are reference counted and freed when the last
+    game referencing them releases them; freed ids are reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts = []
+        self._refs = []
+        self._ids = {}
+        self._free = []
+        self._nbytes = 0
+
+    def add(self, text: str) -> int:
+        text = str(text)
+        with self._lock:
+            text_id = self._ids.get(text)
+            if text_id is None:
+                if self._free:
+                    text_id = self._free.pop()
+                    self._texts[text_id], self._refs[text_id] = text, 0
+                else:
+                    text_id = len(self._texts)
+                    self._texts.append(text)
+                    self._refs.append(0)
+                self._ids[text] = text_id
+                self._nbytes += sys.getsizeof(text)
+            self._refs[text_id] += 1
+            return text_id
+
+    def get(self, text_id: int) -> str:
+        return self._texts[text_id]
+
+    def release(self, text_ids):
+        with self._lock:
+            for text_id in text_ids:
+                self._refs[text_id] -= 1
+                if self._refs[text_id] == 0:
+                    text = self._texts[text_id]
+                    del self._ids[text]
+                    self._nbytes -= sys.getsizeof(text)
+                    self._texts[text_id] = None
+                    self._free.append(text_id)
+
+    def nbytes(self) -> int:
+        """
+        Bytes held by the stored texts.
+        """
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class CompactGame:
+    """
+    State of one game as per-round arrays: actions and intents as action indices (int8), scores
+    as float64, messages and analyses as ids into a shared MessageStore. Truthfulness is derived
+    (intent == action) rather than stored.
+
+    `view()` gives the lists the prompt helpers read (node_helpers.get_game_history), built on
+    demand; `to_state()` gives the full RegulatedGameState layout used for result rows.
+    """
+
+    __slots__ = ("personality_key_1", "personality_key_2", "total_rounds", "current_round",
+                 "actions", "variant_response", "regulator_model", "store",
+                 "_messages", "_actions", "_scores", "_intents", "_analyses")
+
+    def __init__(self, personality_key_1: str, personality_key_2: str, total_rounds: int, actions: tuple,
+                 variant_response, regulator_model: str, store: MessageStore):
+        self.personality_key_1 = personality_key_1
+        self.personality_key_2 = personality_key_2
+        self.total_rounds = total_rounds
+        self.current_round = 1
+        self.actions = tuple(actions)
+        self.variant_response = variant_response  # Shared by the games playing the same variant
+        self.regulator_model = regulator_model
+        self.store = store
+        self._messages = (array("i"), array("i"))
+        self._actions = (array("b"), array("b"))
+        self._scores = (array("d"), array("d"))
+        self._intents = (array("b"), array("b"))
+        self._analyses = (array("i"), array("i"))
+
+    @property
+    def finished(self) -> bool:
+        return self.current_round > self.total_rounds
+
+    def add_message(self, agent: str, message: str):
+        self._messages[AGENTS.index(agent)].append(self.store.add(message))
+
+    def add_action(self, agent: str, action: str):
+        self._actions[AGENTS.index(agent)].append(self.actions.index(action))
+
+    def add_judgement(self, agent: str, answer: str, analysis: str):
+        index = AGENTS.index(agent)
+        self._intents[index].append(self.actions.index(answer) if answer in self.actions else NO_INTENT)
+        self._analyses[index].append(self.store.add(analysis))
+
+    def last_message(self, agent: str) -> str:
+        return self.store.get(self._messages[AGENTS.index(agent)][-1])
+
+    def last_actions(self) -> tuple:
+        return tuple(self.actions[actions[-1]] for actions in self._actions)
+
+    def complete_round(self, score_1, score_2):
+        self._scores[0].append(score_1)
+        self._scores[1].append(score_2)
+        self.current_round += 1
+
+    @staticmethod
+    def _score(value: float):
+        return int(value) if float(value).is_integer() else value
+
+    def _agent_lists(self, index: int) -> dict:
+        return {
+            "messages": [self.store.get(text_id) for text_id in self._messages[index]],
+            "actions": [self.actions[action] for action in self._actions[index]],
+            "scores": [self._score(score) for score in self._scores[index]],
+        }
+
+    def view(self) -> dict:
+        """
+        The part of the game state read by the prompt helpers, as freshly built lists.
+        """
+        agent_1, agent_2 = self._agent_lists(0), self._agent_lists(1)
+        return {
+            "personality_key_1": self.personality_key_1,
+            "personality_key_2": self.personality_key_2,
+            "current_round": self.current_round,
+            "total_rounds": self.total_rounds,
+            **{f"agent_1_{key}": value for key, value in agent_1.items()},
+            **{f"agent_2_{key}": value for key, value in agent_2.items()},
+        }
+
+    def to_state(self) -> dict:
+        """
+        The full game state in the RegulatedGameState layout (see run_regulated_game).
+        """
+        state = self.view()
+        for index, agent in enumerate(AGENTS):
+            intents = [self.actions[i] if i != NO_INTENT else None for i in self._intents[index]]
+            state[f"intent_{agent}"] = intents
+            state[f"truthful_{agent}"] = [
+                intent == action for intent, action in zip(intents, state[f"{agent}_actions"])
+            ]
+            state[f"analysis_{agent}"] = [self.store.get(text_id) for text_id in self._analyses[index]]
+        state.update({
+            "variant_description": self.variant_response.variant_description,
+            "variant_complexity": self.variant_response.complexity_level,
+            "variant_reasoning": self.variant_response.reasoning,
+            "regulator_model": self.regulator_model,
+        })
+        return state
+
+    def _arrays(self) -> list:
+        return [*self._messages, *self._actions, *self._scores, *self._intents, *self._analyses]
+
+    def nbytes(self) -> int:
+        """
+        Bytes of the game's arrays plus the texts it references (shared texts counted in full).
+        """
+        array_bytes = sum(a.itemsize * len(a) for a in self._arrays())
+        text_ids = [*self._messages[0], *self._messages[1], *self._analyses[0], *self._analyses[1]]
+        return array_bytes + sum(sys.getsizeof(self.store.get(text_id)) for text_id in text_ids)
+
+    def release(self):
+        """
+        Drop the game's references to the message store (call once the game is saved or failed).
+        """
+        for ids in (*self._messages, *self._analyses):
+            self.store.release(ids)
+            del ids[:]
@@ -6,9 +6,70 @@
 #
 # Configuration management for regulated game experiments
 
+import json
+import os
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Literal
 
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Personality priming prompts shared by every entry point
+PRIMING_PATH = os.path.join(
+    current_dir, 'dependencies', 'priming',
+    'priming_without_mention_of_mbti_different_none_with_altruistic_selfish.json'
+)
+
+GAME_NAMES = ["prisoners_dilemma", "stag_hunt", "generic", "chicken", "coordination", "hawk_dove", "deadlock", "battle_of_sexes"]
+VARIANT_TYPES = ["complex", "contextual", "multi_stage"]
+# Variant type of games played on the unmodified base game (no regulator call), the reference of
+# bootstrap_analysis's variant-vs-base contrasts
+BASE_VARIANT_TYPE = "base"
+
+# Model that judges the intent of each player message
+INTENT_MODEL_ID = "gpt-4o-mini"
+
+# Action counted as cooperative when computing cooperation rates. Battle of the sexes has no
+# cooperative action; its "cooperation" is the share of rounds in which both players coordinate.
+COOPERATIVE_ACTIONS = {
+    "prisoners_dilemma": "cooperate",
+    "stag_hunt": "stag",
+    "generic": "cooperate",
+    "chicken": "swerve",
+    "coordination": "A",
+    "hawk_dove": "dove",
+    "deadlock": "cooperate",
+    "battle_of_sexes": None,
+}
+
+
+@lru_cache(maxsize=1)
+def load_priming() -> dict:
+    """
+    Personality priming prompts keyed by personality, read once per process (do not mutate).
+    
+    Returns:
+        dict: Personality key -> priming prompt
+    """
+    with open(PRIMING_PATH) as f:
+        return json.load(f)
+
+
+def load_personality_keys(mbti_only: bool = False) -> list[str]:
+    """
+    Load the personality keys from the priming file.
+    
+    Args:
+        mbti_only (bool): Keep only the 16 four-letter MBTI types (drop NONE, EXPERT, ...)
+    
+    Returns:
+        list[str]: Personality keys in file order
+    """
+    keys = list(load_priming().keys())
+    if mbti_only:
+        keys = [k for k in keys if len(k) == 4 and set(k) <= set("EISNTFJP")]
+    return keys
+
 
 @dataclass
 class ExperimentConfig:
@@ -27,7 +88,7 @@ class ExperimentConfig:
     
     # Game settings
     base_game_name: str = "prisoners_dilemma"
-    variant_type: Literal["complex", "contextual", "multi_stage"] = "complex"
+    variant_type: Literal["complex", "contextual", "multi_stage", BASE_VARIANT_TYPE] = "complex"
     rounds: int = 7
     
     # Personality settings
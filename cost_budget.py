@@ -0,0 +1,465 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Pre-flight token/cost estimates and a budget-capped sweep scheduler
+
+import argparse
+import json
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+
+from config import BASE_VARIANT_TYPE, INTENT_MODEL_ID, load_priming
+from logging_setup import setup_logging, worker_logging
+from sweep import SweepCell, SweepSpec, run_unit
+
+logger = logging.getLogger(__name__)
+
+# Fallback when no tokenizer is available (tiktoken downloads its vocabularies on first use)
+CHARS_PER_TOKEN = 4.0
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of `text` (o200k_base if tiktoken can load it, otherwise a character heuristic).
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+@dataclass
+class TokenProfile:
+    """
+    Assumed sizes of the parts of a game that are only known after it has run.
+
+    The defaults are deliberately on the generous side; the scheduler additionally calibrates
+    its estimates against the actual cost of finished games.
+    """
+    message_tokens: int = 90             # Player message (also its size in later history)
+    action_completion_tokens: int = 12   # {"action": "..."} reply
+    action_history_tokens: int = 3       # Action as it appears in the history
+    score_line_tokens: int = 14          # "Your total score x : y Their total score"
+    judge_completion_tokens: int = 50    # One-sentence analysis plus answer
+    variant_ratio: float = 2.0           # Variant description length relative to the base game prompt
+    regulator_extra_tokens: int = 250    # Reasoning, payoff JSON and JSON structure of the variant
+    schema_tokens: int = 60              # Response-format schema sent with each structured call
+    message_overhead_tokens: int = 4     # Per chat message
+
+
+@dataclass
+class CellEstimate:
+    """
+    Estimated tokens per model ({model: [prompt_tokens, completion_tokens]}) and cost of one cell
+    or unit.
+    """
+    tokens_by_model: dict
+    cost_usd: float
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(p + c for p, c in self.tokens_by_model.values())
+
+
+class PriceTable:
+    """
+    USD per token for each model.
+
+    Overrides are given in USD per 1M tokens as {"model": [prompt, completion]}; every other
+    model uses the OpenAI price table that also backs the callback handler's `total_cost`.
+    """
+
+    def __init__(self, overrides: dict = None):
+        self.overrides = {model: (p / 1e6, c / 1e6) for model, (p, c) in (overrides or {}).items()}
+
+    @classmethod
+    def from_file(cls, path: str = None) -> "PriceTable":
+        if not path:
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @lru_cache(maxsize=None)
+    def per_token(self, model_id: str) -> tuple:
+        if model_id in self.overrides:
+            return self.overrides[model_id]
+        from langchain_community.callbacks.openai_info import TokenType, get_openai_token_cost_for_model
+
+        # OpenRouter ids carry the provider ("openai/gpt-4o-mini")
+        name = model_id.split("/")[-1]
+        try:
+            return (
+                get_openai_token_cost_for_model(name, 1_000_000) / 1e6,
+                get_openai_token_cost_for_model(name, 1_000_000, token_type=TokenType.COMPLETION) / 1e6,
+            )
+        except ValueError as e:
+            raise ValueError(f"No price known for model '{model_id}'; pass one with --prices") from e
+
+    def cost(self, tokens_by_model: dict) -> float:
+        total = 0.0
+        for model_id, (prompt_tokens, completion_tokens) in tokens_by_model.items():
+            prompt_price, completion_price = self.per_token(model_id)
+            total += prompt_tokens * prompt_price + completion_tokens * completion_price
+        return total
+
+
+class CostEstimator:
+    """
+    Pre-flight estimate of one game's tokens per model.
+
+    Per round each player makes a message call and an action call whose prompts contain the
+    priming, the variant description and the history of all earlier rounds (so prompt tokens
+    grow quadratically with the number of rounds), and the judge makes one call per player.
+    The cells of a unit (a mirrored pair) share one regulator call.
+    """
+
+    def __init__(self, prices: PriceTable, profile: TokenProfile = None):
+        self.prices = prices
+        self.profile = profile or TokenProfile()
+
+    @lru_cache(maxsize=None)
+    def _priming_tokens(self, personality_key: str) -> int:
+        return count_tokens(load_priming()[personality_key])
+
+    @lru_cache(maxsize=None)
+    def _game_tokens(self, game_name: str, variant_type: str) -> tuple:
+        """
+        Tokens of (regulator prompt, base game prompt, coerce message, coerce action, judge question).
+        """
+        # regulator_agent puts dependencies/ on sys.path, where node_helpers lives
+        from regulator_agent import RegulatorAgent
+        from node_helpers import get_question_prompt, load_game_structure_from_registry
+
+        game = load_game_structure_from_registry(game_name)
+        regulator_prompt = RegulatorAgent.build_regulator_prompt(
+            game.GAME_PROMPT.content, game.payoff_matrix, game.game_name, variant_type
+        )
+        return (
+            sum(count_tokens(m.content) for m in regulator_prompt),
+            count_tokens(game.GAME_PROMPT.content),
+            count_tokens(game.coerce_message.content),
+            count_tokens(game.coerce_action.content),
+            count_tokens(get_question_prompt(game)),
+        )
+
+    def tokens(self, cell: SweepCell, regulator: bool = True) -> dict:
+        p = self.profile
+        regulator_prompt, base_prompt, coerce_message, coerce_action, question = self._game_tokens(
+            cell.game_name, cell.variant_type
+        )
+        base = cell.variant_type == BASE_VARIANT_TYPE
+        # A base-game cell plays the base prompt and makes no regulator call
+        variant = base_prompt if base else int(base_prompt * p.variant_ratio)
+        rounds = cell.rounds
+        overhead = p.message_overhead_tokens
+        history_per_round = (
+            2 * p.message_tokens + 2 * p.action_history_tokens + p.score_line_tokens + 5 * overhead
+        )
+        # Sum over rounds of the completed-round history: H * (0 + 1 + ... + (R - 1))
+        history_total = history_per_round * rounds * (rounds - 1) // 2
+        history_note = 12
+
+        tokens_by_model = {}
+
+        def add(model_id, prompt_tokens, completion_tokens):
+            totals = tokens_by_model.setdefault(model_id, [0, 0])
+            totals[0] += prompt_tokens
+            totals[1] += completion_tokens
+
+        if regulator and not base:
+            add(cell.regulator_model, regulator_prompt + p.schema_tokens,
+                variant + p.regulator_extra_tokens)
+        for model_id, personality in ((cell.player_model_1, cell.personality_1),
+                                      (cell.player_model_2, cell.personality_2)):
+            fixed = self._priming_tokens(personality) + history_note + variant + 4 * overhead + p.schema_tokens
+            message_prompts = rounds * (fixed + coerce_message) + history_total
+            # The action prompt also sees both messages of the current round
+            action_prompts = rounds * (fixed + coerce_action + 2 * (p.message_tokens + overhead)) + history_total
+            add(model_id, message_prompts + action_prompts,
+                rounds * (p.message_tokens + p.action_completion_tokens))
+        add(INTENT_MODEL_ID, 2 * rounds * (question + p.message_tokens + p.schema_tokens),
+            2 * rounds * p.judge_completion_tokens)
+        return tokens_by_model
+
+    def estimate(self, cell: SweepCell) -> CellEstimate:
+        return self.estimate_unit([cell])
+
+    def estimate_unit(self, unit: list) -> CellEstimate:
+        tokens_by_model = {}
+        for index, cell in enumerate(unit):
+            for model_id, (prompt_tokens, completion_tokens) in self.tokens(cell, regulator=index == 0).items():
+                totals = tokens_by_model.setdefault(model_id, [0, 0])
+                totals[0] += prompt_tokens
+                totals[1] += completion_tokens
+        return CellEstimate(tokens_by_model=tokens_by_model, cost_usd=self.prices.cost(tokens_by_model))
+
+
+def cell_value(cell: SweepCell) -> float:
+    """
+    Scientific value of running a cell: diminishing returns over replicates of one condition,
+    so every condition gets its first replicate before any gets its third.
+    """
+    return 1.0 / (1 + cell.replicate)
+
+
+def unit_key(unit: list) -> str:
+    return unit[0].key
+
+
+def unit_value(unit: list) -> float:
+    return sum(cell_value(cell) for cell in unit)
+
+
+@dataclass
+class BudgetScheduler:
+    """
+    Launch units (single cells, or mirrored pairs sharing one regulator variant) in order of
+    value per estimated dollar without exceeding the budget.
+
+    A unit is launched only if spent + reserved (in-flight estimates) + its own estimate fits;
+    estimates are multiplied by `safety_factor` and, after `min_calibration_games`, by the
+    observed actual/estimated cost ratio.
+    """
+    budget_usd: float
+    estimates: dict                       # unit key -> CellEstimate
+    safety_factor: float = 1.2
+    min_calibration_games: int = 3
+    spent_usd: float = 0.0
+    reserved_usd: float = 0.0
+    estimated_done_usd: float = 0.0
+    completed: int = 0                    # Cells (games) of the finished units
+    queue: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.in_flight = {}
+
+    def add_units(self, units: list):
+        self.queue.extend(units)
+        self.queue.sort(key=lambda u: unit_value(u) / max(self.estimates[unit_key(u)].cost_usd, 1e-9), reverse=True)
+
+    @property
+    def calibration(self) -> float:
+        if self.completed < self.min_calibration_games or self.estimated_done_usd <= 0:
+            return 1.0
+        return self.spent_usd / self.estimated_done_usd
+
+    def reservation(self, unit: list) -> float:
+        return self.estimates[unit_key(unit)].cost_usd * self.safety_factor * max(self.calibration, 1.0)
+
+    def next_unit(self):
+        """
+        Most valuable unit per dollar that still fits the budget, or None.
+        """
+        available = self.budget_usd - self.spent_usd - self.reserved_usd
+        for index, unit in enumerate(self.queue):
+            reservation = self.reservation(unit)
+            if reservation <= available:
+                del self.queue[index]
+                self.in_flight[unit_key(unit)] = reservation
+                self.reserved_usd += reservation
+                return unit
+        return None
+
+    def finished(self, unit: list, actual_cost_usd: float):
+        self.reserved_usd -= self.in_flight.pop(unit_key(unit))
+        self.spent_usd += actual_cost_usd
+        self.estimated_done_usd += self.estimates[unit_key(unit)].cost_usd
+        self.completed += len(unit)
+
+    def failed(self, unit: list, actual_cost_usd: float = 0.0):
+        # Failed games may still have been billed for the calls made before the failure
+        self.reserved_usd -= self.in_flight.pop(unit_key(unit))
+        self.spent_usd += actual_cost_usd
+
+
+def actual_cost(end_states: list, estimate: CellEstimate) -> float:
+    """
+    Cost of a unit's games reported by the callback handlers, or the token-scaled estimate when
+    the endpoint's model names are not in the price table (the handlers then report $0).
+    """
+    cost = sum(end_state.get("total_cost_USD") or 0.0 for end_state in end_states)
+    tokens = sum(end_state.get("total_tokens") or 0 for end_state in end_states)
+    if cost:
+        return cost
+    if not tokens or not estimate.total_tokens:
+        return estimate.cost_usd
+    return estimate.cost_usd * tokens / estimate.total_tokens
+
+
+def run_budgeted_unit(unit: list, estimate: CellEstimate, output_dir: str, api_base: str = None,
+                      mirror_pairs: bool = False, concurrent_seatings: bool = False) -> dict:
+    """
+    Worker process entry point: run one unit and report its actual tokens and cost.
+    """
+    if api_base:
+        os.environ["MBTI_API_BASE"] = api_base
+    date_string = datetime.now().strftime("%y%m%d")
+    file_path = os.path.join(output_dir, f"{date_string}_regulated_budget_{os.getpid()}.csv")
+    log_dir = os.path.join(output_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    with worker_logging(os.path.join(log_dir, f"budget_{os.getpid()}.log")):
+        end_states = run_unit(unit, file_path, mirror_pairs, concurrent_seatings)
+    return {"total_tokens": sum(end_state.get("total_tokens") or 0 for end_state in end_states),
+            "cost_usd": actual_cost(end_states, estimate)}
+
+
+def server_tokens_by_model(api_base: str):
+    """
+    Tokens per model served so far by a stand-in server (local_openai_server's `GET /stats`),
+    or None when `api_base` is not one.
+    """
+    import urllib.error
+    import urllib.parse
+    import urllib.request
+
+    parts = urllib.parse.urlsplit(api_base)
+    try:
+        with urllib.request.urlopen(f"{parts.scheme}://{parts.netloc}/stats", timeout=5) as response:
+            return json.load(response).get("by_model")
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def server_cost(prices: PriceTable, before: dict, after: dict) -> float:
+    """
+    Price of the tokens the server served between the `before` and `after` snapshots.
+    """
+    served = {
+        model: (prompt - before.get(model, (0, 0))[0], completion - before.get(model, (0, 0))[1])
+        for model, (prompt, completion) in after.items()
+    }
+    return prices.cost(served)
+
+
+def completed_cell_keys(paths: list) -> set:
+    from parquet_store import read_results_frame
+
+    keys = set()
+    for path in paths:
+        keys.update(read_results_frame(path, columns=["cell_key"])["cell_key"].dropna())
+    return keys
+
+
+def print_estimate(units: list, estimates: dict):
+    by_model = {}
+    for unit in units:
+        for model_id, (prompt_tokens, completion_tokens) in estimates[unit_key(unit)].tokens_by_model.items():
+            totals = by_model.setdefault(model_id, [0, 0])
+            totals[0] += prompt_tokens
+            totals[1] += completion_tokens
+    cells = sum(len(unit) for unit in units)
+    total_cost = sum(estimates[unit_key(u)].cost_usd for u in units)
+    print(f"Estimated {cells} cells in {len(units)} units: ${total_cost:.2f} "
+          f"(mean ${total_cost / max(cells, 1):.4f} per cell)")
+    for model_id, (prompt_tokens, completion_tokens) in sorted(by_model.items()):
+        print(f"  {model_id:<24} {prompt_tokens:>14,} prompt  {completion_tokens:>12,} completion tokens")
+
+
+def main(args):
+    setup_logging()
+    spec = SweepSpec.from_file(args.spec)
+    # A mirrored pair is one unit: both seatings play one regulator variant
+    units = spec.units()
+    if args.resume:
+        done = completed_cell_keys(args.resume)
+        units = [[c for c in unit if c.key not in done] for unit in units]
+        units = [unit for unit in units if unit]
+        print(f"Skipping {len(done)} cells already in {', '.join(args.resume)}")
+
+    estimator = CostEstimator(PriceTable.from_file(args.prices))
+    estimates = {unit_key(unit): estimator.estimate_unit(unit) for unit in units}
+    print_estimate(units, estimates)
+    if args.estimate_only:
+        return
+    if args.budget_usd is None:
+        raise ValueError("--budget_usd is required unless --estimate_only is set")
+
+    scheduler = BudgetScheduler(budget_usd=args.budget_usd, estimates=estimates, safety_factor=args.safety_factor)
+    scheduler.add_units(units)
+    os.makedirs(args.output_dir, exist_ok=True)
+    # Against the stand-in server the charged spend can be checked against what was actually served
+    served_before = server_tokens_by_model(args.api_base) if args.api_base else None
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        running = {}
+        while True:
+            while len(running) < args.workers:
+                unit = scheduler.next_unit()
+                if unit is None:
+                    break
+                future = pool.submit(run_budgeted_unit, unit, estimates[unit_key(unit)], args.output_dir,
+                                     args.api_base, spec.mirror_pairs, spec.concurrent_seatings)
+                running[future] = unit
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = running.pop(future)
+                try:
+                    scheduler.finished(unit, future.result()["cost_usd"])
+                except Exception as e:
+                    logger.error("Error in %s: %s: %s", " / ".join(c.key for c in unit), type(e).__name__, e)
+                    scheduler.failed(unit)
+                    failed += len(unit)
+            print(f"  ${scheduler.spent_usd:.2f} / ${args.budget_usd:.2f} spent, {scheduler.completed} completed, "
+                  f"{len(running)} running, calibration {scheduler.calibration:.2f}", flush=True)
+
+    stopped_by_budget = bool(scheduler.queue)
+    print(f"✓ {scheduler.completed} cells completed ({failed} failed), ${scheduler.spent_usd:.2f} spent; "
+          + (f"budget exhausted with {sum(len(u) for u in scheduler.queue)} cells left (rerun with --resume to continue)"
+             if stopped_by_budget else "all cells done"))
+    served_usd = None
+    if served_before is not None:
+        served_usd = server_cost(estimator.prices, served_before, server_tokens_by_model(args.api_base) or {})
+        print(f"Server-reported cost: ${served_usd:.4f} (spent ${scheduler.spent_usd:.4f})")
+        if not math.isclose(served_usd, scheduler.spent_usd, rel_tol=0.01, abs_tol=1e-6):
+            logger.warning("Spent $%.4f differs from the $%.4f the server served (other clients on the "
+                           "server, or calls missing from the games' cost)", scheduler.spent_usd, served_usd)
+
+    report_path = os.path.join(args.output_dir, f"budget_report_{datetime.now().strftime('%y%m%d_%H%M%S')}.json")
+    with open(report_path, "w") as f:
+        json.dump({
+            "spec": args.spec,
+            "budget_usd": args.budget_usd,
+            "spent_usd": scheduler.spent_usd,
+            "server_cost_usd": served_usd,
+            "completed": scheduler.completed,
+            "failed": failed,
+            "calibration": scheduler.calibration,
+            "remaining_cells": [c.key for unit in scheduler.queue for c in unit],
+            "remaining_estimated_usd": sum(estimates[unit_key(u)].cost_usd for u in scheduler.queue),
+        }, f, indent=2)
+    print(f"Report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a sweep under a global cost budget")
+    parser.add_argument("spec", type=str, help="Path to the sweep spec (see sweeps/)")
+    parser.add_argument("--budget_usd", type=float, required=False, help="Global budget cap in USD")
+    parser.add_argument("--estimate_only", action="store_true", help="Only print the pre-flight estimate")
+    parser.add_argument("--prices", type=str, required=False,
+                       help='JSON price overrides in USD per 1M tokens: {"model": [prompt, completion]}')
+    parser.add_argument("--safety_factor", type=float, default=1.2, help="Multiplier on estimates when reserving budget")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--resume", type=str, nargs="*", help="Result CSVs whose cells are already done")
+    parser.add_argument("--output_dir", type=str, default="data/outputs")
+    parser.add_argument("--api_base", type=str, required=False,
+                       help="OpenAI-compatible endpoint (default: OpenRouter, or MBTI_API_BASE)")
+    main(parser.parse_args())
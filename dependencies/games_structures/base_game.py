@@ -13,6 +13,11 @@ from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from pydantic import BaseModel
 from typing import Type, List, Annotated, TypedDict
 
+# Prompt messages are built once and shared by every game and prompt (never mutate them)
+# Added the word json to use a json mode and it requires to mention the word in the prompt
+COERCE_MESSAGE = SystemMessage("According to the description, the game history, your personality, your instrinsic goals, write the message you want to send to the other agent now. json")
+COERCE_ACTION = SystemMessage("According to the description, the game history, your personality, your last message and the other's agents message, give your action now. json")
+
 class MessageResponse(BaseModel):
     """
     Respond with a sentence to send to the other agent.
@@ -67,14 +72,14 @@ class BaseGameStructure(ABC):
         """
         Force the agent to write a message
         """
-        return SystemMessage("According to the description, the game history, your personality, your instrinsic goals, write the message you want to send to the other agent now. json") # Added the word json to use a json mode and it requires to mention the word in the prompt
+        return COERCE_MESSAGE
     
     @property
     def coerce_action(self) -> HumanMessage:
         """
         Force the agent to give an action
         """
-        return SystemMessage("According to the description, the game history, your personality, your last message and the other's agents message, give your action now. json")  # Added the word json to use a json mode and it requires to mention the word in the prompt
+        return COERCE_ACTION
 
 
 class GameState(TypedDict):
@@ -35,6 +35,9 @@ class BattleOfSexesActionResponse(BaseModel):
     action: Literal["football", "ballet"]
 
 
+# Built once, shared by every prompt
+GAME_PROMPT = SystemMessage(game_prompt_battle_of_sexes)
+
 class BattleOfSexesGame(BaseGameStructure):
     """
     Structured class for the Battle of the Sexes game.
@@ -49,7 +52,7 @@ class BattleOfSexesGame(BaseGameStructure):
 
     @property
     def GAME_PROMPT(self):
-        return SystemMessage(game_prompt_battle_of_sexes)
+        return GAME_PROMPT
 
     @property
     def payoff_matrix(self):
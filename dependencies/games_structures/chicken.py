@@ -31,6 +31,9 @@ class ChickenGameActionResponse(BaseModel):
     action: Literal["swerve", "stay"]
 
 
+# Built once, shared by every prompt
+GAME_PROMPT = SystemMessage(game_prompt_chicken)
+
 class ChickenGame(BaseGameStructure):
     """
     Structured class for the Chicken game.
@@ -44,7 +47,7 @@ class ChickenGame(BaseGameStructure):
 
     @property
     def GAME_PROMPT(self):
-        return SystemMessage(game_prompt_chicken)
+        return GAME_PROMPT
 
     @property
     def payoff_matrix(self):
@@ -34,6 +34,9 @@ class CoordinationActionResponse(BaseModel):
     """
     action: Literal["A", "B"]
 
+# Built once, shared by every prompt
+GAME_PROMPT = SystemMessage(game_prompt_coordination)
+
 class CoordinationGame(BaseGameStructure):
     """
     Structured class for the Coordination game.
@@ -48,7 +51,7 @@ class CoordinationGame(BaseGameStructure):
 
     @property
     def GAME_PROMPT(self):
-        return SystemMessage(game_prompt_coordination)
+        return GAME_PROMPT
 
     @property
     def payoff_matrix(self):
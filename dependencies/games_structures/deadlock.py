@@ -35,6 +35,9 @@ class DeadlockActionResponse(BaseModel):
     action: Literal["cooperate", "defect"]
 
 
+# Built once, shared by every prompt
+GAME_PROMPT = SystemMessage(game_prompt_deadlock)
+
 class DeadlockGame(BaseGameStructure):
     """
     Structured class for the Deadlock game.
@@ -49,7 +52,7 @@ class DeadlockGame(BaseGameStructure):
 
     @property
     def GAME_PROMPT(self):
-        return SystemMessage(game_prompt_deadlock)
+        return GAME_PROMPT
 
     @property
     def payoff_matrix(self):
@@ -31,6 +31,9 @@ class GenericActionResponse(BaseModel):
     action: Literal["cooperate", "defect"]
 
 
+# Built once, shared by every prompt
+GAME_PROMPT = SystemMessage(game_prompt_generic)
+
 class GenericGame(BaseGameStructure):
     """
     Structured class for a generic repeated game with communication.
@@ -45,7 +48,7 @@ class GenericGame(BaseGameStructure):
 
     @property
     def GAME_PROMPT(self):
-        return SystemMessage(game_prompt_generic)
+        return GAME_PROMPT
 
     @property
     def payoff_matrix(self):
@@ -35,6 +35,9 @@ class HawkDoveActionResponse(BaseModel):
     action: Literal["hawk", "dove"]
 
 
+# Built once, shared by every prompt
+GAME_PROMPT = SystemMessage(game_prompt_hawk_dove)
+
 class HawkDoveGame(BaseGameStructure):
     """
     Structured class for the Hawk-Dove game.
@@ -49,7 +52,7 @@ class HawkDoveGame(BaseGameStructure):
 
     @property
     def GAME_PROMPT(self):
-        return SystemMessage(game_prompt_hawk_dove)
+        return GAME_PROMPT
 
     @property
     def payoff_matrix(self):
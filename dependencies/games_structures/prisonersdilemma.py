@@ -32,6 +32,9 @@ class PrisonersDilemmaActionResponse(BaseModel):
     action: Literal["cooperate", "defect"]
 
 
+# Built once, shared by every prompt
+GAME_PROMPT = HumanMessage(game_description)
+
 class PrisonersDilemmaGame(BaseGameStructure):
     """
     Structured class for the Prisoner's Dilemma game.
@@ -46,7 +49,7 @@ class PrisonersDilemmaGame(BaseGameStructure):
 
     @property
     def GAME_PROMPT(self):
-        return HumanMessage(game_description)
+        return GAME_PROMPT
     
     @property
     def payoff_matrix(self):
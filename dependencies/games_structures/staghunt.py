@@ -31,6 +31,9 @@ class StagHuntActionResponse(BaseModel):
     """
     action: Literal["stag", "hare"]
 
+# Built once, shared by every prompt
+GAME_PROMPT = SystemMessage(game_description)
+
 class StagHuntGame(BaseGameStructure):
     """
     Structured class for the Stag Hunt game.
@@ -45,7 +48,7 @@ class StagHuntGame(BaseGameStructure):
 
     @property
     def GAME_PROMPT(self):
-        return SystemMessage(game_description)
+        return GAME_PROMPT
 
     @property
     def payoff_matrix(self):
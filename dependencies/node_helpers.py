@@ -8,6 +8,7 @@
 
 import json
 
+from functools import lru_cache
 from games_structures.base_game import BaseGameStructure, GameState
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from pydantic import BaseModel
@@ -121,11 +122,13 @@ def get_answer_format(game_structure: BaseGameStructure):
     Args:
         game_structure (BaseGameStructure): The game structure object
     Returns:
-        AnswerFormat: The answer format for the game
+        AnswerFormat: The answer format for the game (one class per action type, created once)
     """
     action_response_cls = game_structure.ActionResponse
-    action_type = action_response_cls.__annotations__["action"]
+    return _answer_format(action_response_cls.__annotations__["action"])
 
+@lru_cache(maxsize=None)
+def _answer_format(action_type):
     class AnswerFormat(BaseModel):
         analysis: str
         answer: action_type
@@ -142,7 +145,10 @@ def get_question_prompt(game_structure):
         str: The question prompt string.
     """
     action_response_cls = game_structure.ActionResponse
-    action_type = action_response_cls.__annotations__["action"]
+    return _question_prompt(action_response_cls.__annotations__["action"])
+
+@lru_cache(maxsize=None)
+def _question_prompt(action_type):
     action_1, action_2 = get_args(action_type)
     return (
         f"You have to assess the intent of the person using the message that will be given. "
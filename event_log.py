@@ -0,0 +1,197 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Append-only JSONL event log of game progress, and a CLI that tails it
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# Path of the event log used by every game of the process (and of its worker processes)
+EVENT_LOG_ENV = "MBTI_EVENT_LOG"
+
+
+class EventLog:
+    """
+    Append-only JSONL event log shared by threads and processes.
+
+    Each event is written as one line with a single `os.write` on a file opened with O_APPEND,
+    so lines of concurrent writers never interleave and no Python buffer needs flushing.
+    Events: game_started, round_completed, retry and game_finished (see run_regulated_game).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def emit(self, event: str, **fields):
+        """
+        Append one event with a timestamp and the writer's pid.
+        """
+        record = {"ts": round(time.time(), 3), "pid": os.getpid(), "event": event, **fields}
+        os.write(self._fd, (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode())
+
+    def close(self):
+        os.close(self._fd)
+
+
+_event_logs: dict[str, EventLog] = {}
+_event_logs_lock = threading.Lock()
+
+
+def get_event_log(path: str = None) -> Optional[EventLog]:
+    """
+    The process-wide event log at `path` (default: MBTI_EVENT_LOG), or None if no path is set.
+    """
+    path = path or os.getenv(EVENT_LOG_ENV)
+    if not path:
+        return None
+    with _event_logs_lock:
+        if path not in _event_logs:
+            _event_logs[path] = EventLog(path)
+        return _event_logs[path]
+
+
+def read_events(path: str, offset: int = 0) -> tuple[list, int]:
+    """
+    Read the complete events appended after byte `offset`.
+
+    Returns:
+        tuple: (events, offset after the last complete line)
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+    end = data.rfind(b"\n") + 1  # a line being written is read on the next call
+    events = []
+    for line in data[:end].splitlines():
+        try:
+            events.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return events, offset + end
+
+
+class ProgressTracker:
+    """
+    Sweep progress folded from the event stream: games, rounds, retries, cost and per-cell state.
+    """
+
+    def __init__(self, window_seconds: float = 300.0):
+        self.window_seconds = window_seconds
+        self.games = {}  # game_id -> {"cell", "rounds", "total_rounds", "status"}
+        self.cells = {}  # cell -> {"games", "finished", "failed", "rounds", "total_rounds"}
+        self.retries = 0
+        self.cost_usd = 0.0
+        self.first_ts = None
+        self.finish_times = deque()
+        self.round_times = deque()
+
+    def _cell(self, name: str) -> dict:
+        if name not in self.cells:
+            self.cells[name] = {"games": 0, "finished": 0, "failed": 0, "rounds": 0, "total_rounds": 0}
+        return self.cells[name]
+
+    def add(self, event: dict):
+        ts = event.get("ts", time.time())
+        if self.first_ts is None:
+            self.first_ts = ts
+        kind = event.get("event")
+        game = self.games.get(event.get("game_id"))
+        if kind == "game_started":
+            game = self.games[event["game_id"]] = {
+                "cell": event.get("cell") or event["game_id"],
+                "rounds": 0,
+                "total_rounds": event.get("total_rounds", 0),
+                "status": "running",
+            }
+            cell = self._cell(game["cell"])
+            cell["games"] += 1
+            cell["total_rounds"] += game["total_rounds"]
+        elif game is None:
+            return  # started before the part of the log being read
+        elif kind == "round_completed":
+            game["rounds"] += 1
+            self._cell(game["cell"])["rounds"] += 1
+            self.round_times.append(ts)
+        elif kind == "retry":
+            self.retries += 1
+        elif kind == "game_finished":
+            game["status"] = event.get("status", "ok")
+            self._cell(game["cell"])["failed" if game["status"] == "failed" else "finished"] += 1
+            self.cost_usd += event.get("cost_usd") or 0.0
+            self.finish_times.append(ts)
+
+    def rate(self, times: deque, now: float) -> float:
+        """
+        Events per minute over the sliding window.
+        """
+        while times and times[0] < now - self.window_seconds:
+            times.popleft()
+        span = min(self.window_seconds, max(now - (self.first_ts or now), 1e-9))
+        return 60.0 * len(times) / span
+
+    def render(self, total_games: int = None, cells: int = 10, now: float = None) -> str:
+        now = now or time.time()
+        finished = sum(g["status"] == "ok" for g in self.games.values())
+        failed = sum(g["status"] == "failed" for g in self.games.values())
+        running = sum(g["status"] == "running" for g in self.games.values())
+        games_per_minute = self.rate(self.finish_times, now)
+        rounds_per_minute = self.rate(self.round_times, now)
+        total = total_games or len(self.games)
+        remaining = max(total - finished - failed, 0)
+        eta = f"{remaining / games_per_minute:.1f} min" if games_per_minute > 0 else "n/a"
+
+        lines = [
+            f"games {finished + failed}/{total} ({finished} ok, {failed} failed, {running} running)  "
+            f"retries {self.retries}  cost ${self.cost_usd:.4f}",
+            f"throughput {games_per_minute:.2f} games/min, {rounds_per_minute:.1f} rounds/min  ETA {eta}",
+        ]
+        active = [(name, c) for name, c in self.cells.items() if c["finished"] + c["failed"] < c["games"]]
+        for name, cell in active[:cells]:
+            lines.append(f"  {name}: round {cell['rounds']}/{cell['total_rounds']}, "
+                         f"{cell['finished']}/{cell['games']} games finished")
+        if len(active) > cells:
+            lines.append(f"  ... {len(active) - cells} more active cells")
+        return "\n".join(lines)
+
+
+def tail(args):
+    tracker = ProgressTracker(window_seconds=args.window)
+    offset = 0
+    while True:
+        events, offset = read_events(args.path, offset)
+        for event in events:
+            tracker.add(event)
+        print(tracker.render(args.total_games, args.cells), flush=True)
+        done = tracker.games and all(g["status"] != "running" for g in tracker.games.values())
+        if args.once or (done and args.total_games and len(tracker.games) >= args.total_games):
+            return
+        print()
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail a game event log and show sweep progress")
+    parser.add_argument("path", type=str, help="Event log written via --event_log / MBTI_EVENT_LOG")
+    parser.add_argument("--total_games", type=int, required=False,
+                       help="Games in the sweep, for the ETA (default: games started so far)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between refreshes")
+    parser.add_argument("--window", type=float, default=300.0,
+                       help="Seconds of history used for the throughput")
+    parser.add_argument("--cells", type=int, default=10, help="Active cells to list")
+    parser.add_argument("--once", action="store_true", help="Print the progress once and exit")
+    tail(parser.parse_args())
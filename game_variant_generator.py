@@ -6,6 +6,7 @@
 #
 # Game Variant Generator - Converts regulator responses into playable game structures
 
+import logging
 import sys
 import os
 
@@ -20,6 +21,8 @@ from pydantic import BaseModel
 from typing import Literal, Type
 from regulator_agent import GameVariantResponse
 
+logger = logging.getLogger(__name__)
+
 
 class VariantGameStructure(BaseGameStructure):
     """
@@ -39,6 +42,8 @@ class VariantGameStructure(BaseGameStructure):
         self._base_game = base_game
         self._variant = variant
         self._variant_description = variant.variant_description
+        # Built once and shared by every prompt of the games playing this variant
+        self._game_prompt = HumanMessage(self._variant_description)
         
         # Parse payoff matrix from JSON string and convert string keys to tuples
         try:
@@ -72,8 +77,7 @@ class VariantGameStructure(BaseGameStructure):
                     
         except (json.JSONDecodeError, TypeError, ValueError) as e:
             # Fallback to base game payoff if parsing fails
-            print(f"Warning: Failed to parse variant payoff matrix: {e}")
-            print("Falling back to base game payoff matrix.")
+            logger.warning("Failed to parse variant payoff matrix: %s. Falling back to base game payoff matrix", e)
             self._variant_payoff = None
     
     @property
@@ -88,7 +92,7 @@ class VariantGameStructure(BaseGameStructure):
     @property
     def GAME_PROMPT(self) -> HumanMessage:
         """Return the variant description as the game prompt."""
-        return HumanMessage(self._variant_description)
+        return self._game_prompt
     
     @property
     def payoff_matrix(self) -> dict:
@@ -186,3 +190,23 @@ class GameVariantGenerator:
                 return False, f"Missing payoff for action combinations: {missing_keys}"
         
         return True, ""
+    
+    @staticmethod
+    def base_game_variant(base_game: BaseGameStructure) -> GameVariantResponse:
+        """
+        Describe the unmodified base game as a variant response, for games played without a regulator.
+        
+        Args:
+            base_game (BaseGameStructure): The base game
+        
+        Returns:
+            GameVariantResponse: The base game prompt and payoff matrix
+        """
+        import json
+        base_prompt = base_game.GAME_PROMPT.content if hasattr(base_game.GAME_PROMPT, 'content') else str(base_game.GAME_PROMPT)
+        return GameVariantResponse(
+            variant_description=base_prompt,
+            variant_payoff_matrix=json.dumps({f"{a},{b}": list(v) for (a, b), v in base_game.payoff_matrix.items()}),
+            complexity_level="low",
+            reasoning="Base game (no regulator variant)"
+        )
@@ -0,0 +1,243 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Shared HTTP transport of all model clients: one keep-alive connection pool per process
+# (HTTP/2 when available), with pool statistics
+
+import importlib
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (defaults in HttpPoolSettings); MBTI_HTTP2=0 disables HTTP/2
+HTTP2_ENV = "MBTI_HTTP2"
+HTTP_MAX_CONNECTIONS_ENV = "MBTI_HTTP_MAX_CONNECTIONS"
+HTTP_MAX_KEEPALIVE_ENV = "MBTI_HTTP_MAX_KEEPALIVE"
+HTTP_KEEPALIVE_EXPIRY_ENV = "MBTI_HTTP_KEEPALIVE_EXPIRY"
+
+
+@dataclass
+class HttpPoolSettings:
+    """
+    Connection pool of the shared clients.
+    """
+    http2: bool = True                    # Multiplex requests over few connections (needs the h2 package)
+    max_connections: int = 200            # Upper bound on open connections (requests beyond it wait)
+    max_keepalive_connections: int = 100  # Idle connections kept open for reuse
+    keepalive_expiry: float = 60.0        # Seconds an idle connection is kept
+
+    @classmethod
+    def from_env(cls) -> "HttpPoolSettings":
+        defaults = cls()
+        return cls(
+            http2=os.getenv(HTTP2_ENV, "1").lower() not in ("0", "false", "no"),
+            max_connections=int(os.getenv(HTTP_MAX_CONNECTIONS_ENV) or defaults.max_connections),
+            max_keepalive_connections=int(os.getenv(HTTP_MAX_KEEPALIVE_ENV) or defaults.max_keepalive_connections),
+            keepalive_expiry=float(os.getenv(HTTP_KEEPALIVE_EXPIRY_ENV) or defaults.keepalive_expiry),
+        )
+
+
+def _httpx():
+    """
+    The httpx module the installed openai SDK is built on; shared clients must be instances of
+    its Client classes.
+    """
+    import openai
+
+    return importlib.import_module(openai.DefaultHttpxClient.__mro__[1].__module__.split(".")[0])
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class PoolStats:
+    """
+    Request and connection counters of one shared client, fed by the transport and by the
+    connection pool's trace events.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0           # Requests waiting for their response headers
+        self.max_in_flight = 0
+        self.connections_opened = 0  # TCP connects; every other request reused a pooled connection
+        self.tls_handshakes = 0
+        self.http2_requests = 0
+        self._pool = None
+
+    def reset(self):
+        with self._lock:
+            self.requests = self.errors = self.max_in_flight = 0
+            self.connections_opened = self.tls_handshakes = self.http2_requests = 0
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self, failed: bool):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += failed
+
+    def trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+        elif event_name == "http2.send_request_headers.started":
+            with self._lock:
+                self.http2_requests += 1
+
+    async def atrace(self, event_name: str, info: dict):
+        self.trace(event_name, info)
+
+    def snapshot(self) -> dict:
+        connections = list(getattr(self._pool, "connections", []))
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "connections_opened": self.connections_opened,
+                "tls_handshakes": self.tls_handshakes,
+                "http2_requests": self.http2_requests,
+                "reuse_rate": 1 - self.connections_opened / self.requests if self.requests else None,
+                "open_connections": len(connections),
+                "idle_connections": sum(connection.is_idle() for connection in connections),
+            }
+
+
+@lru_cache(maxsize=None)
+def _transport_classes() -> tuple:
+    """
+    Sync and async transports that count requests and subscribe to the pool's trace events.
+    """
+    httpx = _httpx()
+
+    class InstrumentedTransport(httpx.HTTPTransport):
+        def __init__(self, stats: PoolStats, **kwargs):
+            super().__init__(**kwargs)
+            self.stats = stats
+            stats._pool = self._pool
+
+        def handle_request(self, request):
+            request.extensions["trace"] = self.stats.trace
+            self.stats.started()
+            failed = True
+            try:
+                response = super().handle_request(request)
+                failed = False
+                return response
+            finally:
+                self.stats.finished(failed)
+
+    class AsyncInstrumentedTransport(httpx.AsyncHTTPTransport):
+        def __init__(self, stats: PoolStats, **kwargs):
+            super().__init__(**kwargs)
+            self.stats = stats
+            stats._pool = self._pool
+
+        async def handle_async_request(self, request):
+            request.extensions["trace"] = self.stats.atrace
+            self.stats.started()
+            failed = True
+            try:
+                response = await super().handle_async_request(request)
+                failed = False
+                return response
+            finally:
+                self.stats.finished(failed)
+
+    return InstrumentedTransport, AsyncInstrumentedTransport
+
+
+_clients = {}  # ("sync" | "async", pid) -> (client, PoolStats)
+_clients_lock = threading.Lock()
+
+
+def _get_client(kind: str, settings: HttpPoolSettings = None):
+    # Keyed by pid: a forked worker must not use connections opened by its parent
+    key = (kind, os.getpid())
+    with _clients_lock:
+        if key not in _clients:
+            import openai
+
+            settings = settings or HttpPoolSettings.from_env()
+            http2 = settings.http2 and http2_available()
+            if settings.http2 and not http2 and kind == "sync":
+                logger.warning("HTTP/2 needs the h2 package (pip install 'httpx[http2]'); using HTTP/1.1 keep-alive")
+            limits = _httpx().Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            )
+            stats = PoolStats()
+            transport_class, async_transport_class = _transport_classes()
+            if kind == "sync":
+                client = openai.DefaultHttpxClient(transport=transport_class(stats, http2=http2, limits=limits))
+            else:
+                client = openai.DefaultAsyncHttpxClient(
+                    transport=async_transport_class(stats, http2=http2, limits=limits)
+                )
+            _clients[key] = (client, stats)
+            logger.debug("Shared %s HTTP client: http2=%s, %s", kind, http2, limits)
+        return _clients[key][0]
+
+
+def get_http_client(settings: HttpPoolSettings = None):
+    """
+    The process-wide sync HTTP client shared by every model client (players, judge, regulator).
+
+    Args:
+        settings (HttpPoolSettings, optional): Pool configuration used when the client is
+            created (default: from the MBTI_HTTP* environment variables)
+    """
+    return _get_client("sync", settings)
+
+
+def get_async_http_client(settings: HttpPoolSettings = None):
+    """
+    The process-wide async HTTP client, used by the model clients' async calls (ainvoke,
+    abatch). Its connections belong to the event loop that opened them, so all async games of
+    a process should run on one loop.
+    """
+    return _get_client("async", settings)
+
+
+def http_pool_stats() -> dict:
+    """
+    Pool statistics of this process's shared clients, keyed by "sync" / "async".
+    """
+    pid = os.getpid()
+    with _clients_lock:
+        return {kind: stats.snapshot() for (kind, client_pid), (_, stats) in _clients.items() if client_pid == pid}
+
+
+def reset_http_pool_stats():
+    """
+    Zero the counters of this process's shared clients (the pooled connections stay open).
+    """
+    pid = os.getpid()
+    with _clients_lock:
+        for (_, client_pid), (_, stats) in _clients.items():
+            if client_pid == pid:
+                stats.reset()
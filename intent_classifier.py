@@ -0,0 +1,403 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Local intent classifier cascade (rules, then naive Bayes) run before the LLM judge
+
+import argparse
+import ast
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Path of a trained classifier (see `python intent_classifier.py train`); unset disables the cascade
+INTENT_CLASSIFIER_ENV = "MBTI_INTENT_CLASSIFIER"
+# Share of locally classified messages that are also sent to the LLM judge to measure agreement
+INTENT_AUDIT_RATE_ENV = "MBTI_INTENT_AUDIT_RATE"
+DEFAULT_AUDIT_RATE = 0.05
+
+# Analyses written by the cascade start with this, so they are never used as training labels
+LOCAL_ANALYSIS_PREFIX = "Local classifier"
+
+STAGES = ("rule", "model")
+
+# First-person commitments: "I will cooperate", "I'm going to choose stag", "my move is B"
+_COMMITMENT = (
+    r"(?:\bI(?:'ll| will| am going to|'m going to| intend to| plan to| am planning to|'m planning to"
+    r"| choose to| want to| shall| am choosing|'m choosing| choose| pick| am picking|'m picking)"
+    r"|\bmy (?:choice|move|action|decision|plan) (?:is|will be))"
+)
+_NEGATION = re.compile(r"\b(?:not|never|no)\b|n't\b", re.IGNORECASE)
+# Judge analyses that hedge do not make reliable training labels
+_HEDGE = re.compile(r"\b(?:unclear|ambiguous|uncertain|not clear|no clear|neutral|mixed)\b", re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z0-9_']+")
+
+
+def _action_pattern(action: str) -> str:
+    # Single-letter actions ("A", "B") only match as written, not the article "a"
+    return rf"(?-i:{re.escape(action)})" if len(action) == 1 else re.escape(action)
+
+
+@lru_cache(maxsize=None)
+def _rule_pattern(actions: tuple) -> re.Pattern:
+    group = "|".join(f"(?P<a{i}>{_action_pattern(action)})" for i, action in enumerate(actions))
+    return re.compile(rf"{_COMMITMENT}(?:\s+[\w']+){{0,3}}?\s+(?:{group})\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def _action_token_pattern(actions: tuple) -> re.Pattern:
+    group = "|".join(f"(?P<a{i}>{_action_pattern(action)})" for i, action in enumerate(actions))
+    return re.compile(rf"\b(?:{group})\b", re.IGNORECASE)
+
+
+def rule_intent(actions: tuple, message: str) -> Optional[int]:
+    """
+    Index of the action the message commits to, or None if it states no single, unnegated intent.
+    """
+    found = set()
+    for match in _rule_pattern(actions).finditer(message):
+        if _NEGATION.search(match.group(0)):
+            return None
+        found.add(next(int(name[1:]) for name, value in match.groupdict().items() if value))
+    return found.pop() if len(found) == 1 else None
+
+
+def tokenize(actions: tuple, message: str) -> list:
+    """
+    Unigrams and bigrams, with the game's action names replaced by their position
+    (__a0__, __a1__) so that the wording around them is shared across games.
+    """
+    text = _action_token_pattern(actions).sub(
+        lambda m: next(f" __a{name[1:]}__ " for name, value in m.groupdict().items() if value), message
+    )
+    words = _TOKEN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class NaiveBayesIntent:
+    """
+    Multinomial naive Bayes over message n-grams for one action set (fit / predict_proba like
+    scikit-learn's MultinomialNB, without the dependency).
+    """
+
+    def __init__(self, actions: tuple, alpha: float = 1.0):
+        self.actions = actions
+        self.alpha = alpha
+        self.class_counts = [0] * len(actions)
+        self.token_counts = [Counter() for _ in actions]
+        self.token_totals = [0] * len(actions)
+        self.vocabulary = set()
+
+    def fit(self, messages: list, labels: list) -> "NaiveBayesIntent":
+        for message, label in zip(messages, labels):
+            tokens = tokenize(self.actions, message)
+            self.class_counts[label] += 1
+            self.token_counts[label].update(tokens)
+            self.token_totals[label] += len(tokens)
+            self.vocabulary.update(tokens)
+        return self
+
+    @property
+    def n_examples(self) -> int:
+        return sum(self.class_counts)
+
+    def predict_proba(self, message: str) -> list:
+        tokens = [token for token in tokenize(self.actions, message) if token in self.vocabulary]
+        n_classes, vocabulary_size = len(self.actions), len(self.vocabulary)
+        log_scores = []
+        for label in range(n_classes):
+            prior = (self.class_counts[label] + self.alpha) / (self.n_examples + n_classes * self.alpha)
+            denominator = self.token_totals[label] + self.alpha * vocabulary_size
+            log_scores.append(math.log(prior) + sum(
+                math.log((self.token_counts[label][token] + self.alpha) / denominator) for token in tokens
+            ))
+        top = max(log_scores)
+        weights = [math.exp(score - top) for score in log_scores]
+        return [weight / sum(weights) for weight in weights]
+
+    def to_dict(self) -> dict:
+        return {
+            "actions": list(self.actions),
+            "alpha": self.alpha,
+            "class_counts": self.class_counts,
+            "token_counts": [dict(counts) for counts in self.token_counts],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "NaiveBayesIntent":
+        model = cls(tuple(data["actions"]), data["alpha"])
+        model.class_counts = data["class_counts"]
+        model.token_counts = [Counter(counts) for counts in data["token_counts"]]
+        model.token_totals = [sum(counts.values()) for counts in model.token_counts]
+        model.vocabulary = set().union(*model.token_counts)
+        return model
+
+
+@dataclass
+class LocalDecision:
+    stage: str
+    answer: str
+    confidence: float
+
+    @property
+    def analysis(self) -> str:
+        return (f"{LOCAL_ANALYSIS_PREFIX} ({self.stage}, {self.confidence:.0%}): "
+                f"the message suggests the player is looking to {self.answer}.")
+
+
+class IntentCascade:
+    """
+    Decides the intent of a message locally when it can: first by explicit first-person
+    commitments ("I will cooperate"), then by the naive Bayes model of the game's action set
+    if its posterior reaches the threshold. Everything else goes to the LLM judge.
+
+    A share of the local decisions (audit rate) is sent to the LLM judge as well, and the
+    agreement of each stage with the LLM is counted.
+    """
+
+    def __init__(self, models: dict = None, threshold: float = 0.9, min_examples: int = 50,
+                 audit_rate: float = DEFAULT_AUDIT_RATE, seed: int = 0):
+        self.models = models or {}  # action tuple -> NaiveBayesIntent
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.audit_rate = audit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {stage: Counter() for stage in (*STAGES, "llm")}
+
+    def classify(self, actions: tuple, message: str) -> Optional[LocalDecision]:
+        index = rule_intent(actions, message)
+        if index is not None:
+            return LocalDecision("rule", actions[index], 1.0)
+        model = self.models.get(tuple(actions))
+        if model is not None and model.n_examples >= self.min_examples:
+            probabilities = model.predict_proba(message)
+            confidence = max(probabilities)
+            if confidence >= self.threshold:
+                return LocalDecision("model", actions[probabilities.index(confidence)], confidence)
+        return None
+
+    def decide(self, actions: tuple, message: str) -> tuple:
+        """
+        The local decision for a message and whether it must still be sent to the LLM judge.
+
+        Returns:
+            tuple: (LocalDecision or None, audit) - the LLM judge is needed if the decision is
+                None or audit is True; report its answer with `record_llm`
+        """
+        decision = self.classify(actions, message)
+        with self._lock:
+            if decision is None:
+                self.counts["llm"]["decided"] += 1
+                return None, False
+            self.counts[decision.stage]["decided"] += 1
+            audit = self._rng.random() < self.audit_rate
+            if audit:
+                self.counts[decision.stage]["audited"] += 1
+            return decision, audit
+
+    def record_llm(self, decision: LocalDecision, llm_answer: str):
+        with self._lock:
+            self.counts[decision.stage]["agreed"] += decision.answer == llm_answer
+
+    def stats(self) -> dict:
+        """
+        Per stage: messages decided, their share, and the agreement rate of audited decisions.
+        """
+        with self._lock:
+            total = sum(counts["decided"] for counts in self.counts.values()) or 1
+            return {
+                stage: {
+                    "decided": counts["decided"],
+                    "share": counts["decided"] / total,
+                    "audited": counts["audited"],
+                    "agreement": counts["agreed"] / counts["audited"] if counts["audited"] else None,
+                }
+                for stage, counts in self.counts.items()
+            }
+
+    def log_stats(self):
+        for stage, entry in self.stats().items():
+            agreement = f"{entry['agreement']:.1%}" if entry["agreement"] is not None else "n/a"
+            logger.info("Intent cascade %s: %d messages (%.1f%%), agreement with the LLM judge %s (%d audited)",
+                        stage, entry["decided"], 100 * entry["share"], agreement, entry["audited"])
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "threshold": self.threshold,
+                "min_examples": self.min_examples,
+                "models": [model.to_dict() for model in self.models.values()],
+            }, f)
+
+    @classmethod
+    def load(cls, path: str, audit_rate: float = None) -> "IntentCascade":
+        with open(path) as f:
+            data = json.load(f)
+        models = [NaiveBayesIntent.from_dict(model) for model in data["models"]]
+        return cls({model.actions: model for model in models}, data["threshold"], data["min_examples"],
+                   DEFAULT_AUDIT_RATE if audit_rate is None else audit_rate)
+
+
+_cascade = None
+_cascade_lock = threading.Lock()
+
+
+def get_intent_cascade() -> Optional[IntentCascade]:
+    """
+    The process-wide cascade loaded from MBTI_INTENT_CLASSIFIER, or None if it is not set.
+    """
+    global _cascade
+    path = os.getenv(INTENT_CLASSIFIER_ENV)
+    if not path:
+        return None
+    with _cascade_lock:
+        if _cascade is None:
+            audit_rate = os.getenv(INTENT_AUDIT_RATE_ENV)
+            _cascade = IntentCascade.load(path, float(audit_rate) if audit_rate else None)
+            logger.info("Intent classifier %s: %d action sets, threshold %.2f",
+                        path, len(_cascade.models), _cascade.threshold)
+        return _cascade
+
+
+@lru_cache(maxsize=None)
+def game_actions(game_name: str) -> tuple:
+    from typing import get_args
+
+    # run_regulated_game puts dependencies/ on sys.path, where node_helpers lives
+    from run_regulated_game import load_game_structure_from_registry
+
+    game = load_game_structure_from_registry(game_name)
+    return get_args(game.ActionResponse.__annotations__["action"])
+
+
+def _as_list(value) -> list:
+    # CSV rows store lists as their repr
+    return ast.literal_eval(value) if isinstance(value, str) else list(value)
+
+
+def load_judged_messages(paths: list) -> list:
+    """
+    (game_id, actions, message, LLM answer) of every judged message in result CSVs or Parquet
+    datasets.
+
+    Messages judged by the cascade itself and messages whose analysis hedges are left out.
+    """
+    from parquet_store import read_results_frame
+
+    examples = []
+    for path in paths:
+        df = read_results_frame(path)
+        game_column = "base_game_name" if "base_game_name" in df.columns else "game_name"
+        for row_index, row in df.iterrows():
+            try:
+                actions = game_actions(row[game_column])
+            except Exception:
+                continue
+            game_id = str(row["game_id"]) if "game_id" in df.columns else f"{path}:{row_index}"
+            for agent in ("agent_1", "agent_2"):
+                messages = _as_list(row[f"{agent}_messages"])
+                intents = _as_list(row[f"intent_{agent}"])
+                analyses = _as_list(row[f"analysis_{agent}"])
+                for message, intent, analysis in zip(messages, intents, analyses):
+                    if intent not in actions or str(analysis).startswith(LOCAL_ANALYSIS_PREFIX):
+                        continue
+                    if _HEDGE.search(str(analysis)):
+                        continue
+                    examples.append((game_id, actions, str(message), intent))
+    return examples
+
+
+def train(examples: list, threshold: float, min_examples: int) -> IntentCascade:
+    by_actions = {}
+    for _, actions, message, intent in examples:
+        by_actions.setdefault(actions, ([], []))
+        by_actions[actions][0].append(message)
+        by_actions[actions][1].append(actions.index(intent))
+    models = {actions: NaiveBayesIntent(actions).fit(messages, labels)
+              for actions, (messages, labels) in by_actions.items()}
+    return IntentCascade(models, threshold, min_examples)
+
+
+def evaluate(cascade: IntentCascade, examples: list) -> dict:
+    """
+    Coverage and agreement with the LLM judge of each stage on judged messages.
+    """
+    counts = {stage: Counter() for stage in (*STAGES, "llm")}
+    for _, actions, message, intent in examples:
+        decision = cascade.classify(actions, message)
+        stage = decision.stage if decision else "llm"
+        counts[stage]["decided"] += 1
+        counts[stage]["agreed"] += decision is None or decision.answer == intent
+    total = len(examples) or 1
+    report = {stage: {"decided": c["decided"], "share": c["decided"] / total,
+                      "agreement": c["agreed"] / c["decided"] if c["decided"] else None}
+              for stage, c in counts.items()}
+    local = sum(counts[stage]["decided"] for stage in STAGES)
+    report["llm_calls_avoided"] = local / total
+    report["overall_agreement"] = sum(c["agreed"] for c in counts.values()) / total
+    return report
+
+
+def print_report(report: dict, n_examples: int):
+    print(f"{n_examples} held-out messages")
+    for stage in (*STAGES, "llm"):
+        entry = report[stage]
+        agreement = f"{entry['agreement']:.1%}" if entry["agreement"] is not None else "n/a"
+        label = "LLM judge" if stage == "llm" else f"{stage} stage"
+        print(f"  {label:<12} {entry['decided']:>7} messages ({entry['share']:6.1%})  agreement {agreement}")
+    print(f"  LLM calls avoided {report['llm_calls_avoided']:.1%}, "
+          f"labels agreeing with the LLM judge {report['overall_agreement']:.1%}")
+
+
+def main(args):
+    examples = load_judged_messages(args.results)
+    if args.command == "evaluate":
+        cascade = IntentCascade.load(args.model)
+        print_report(evaluate(cascade, examples), len(examples))
+        return
+
+    # Hold out whole games, so messages of one game are never on both sides of the split
+    def held_out(example):
+        return zlib.crc32(example[0].encode()) % 1000 < args.test_fraction * 1000
+
+    train_examples = [e for e in examples if not held_out(e)]
+    test_examples = [e for e in examples if held_out(e)]
+    print(f"Training on {len(train_examples)} judged messages, evaluating on {len(test_examples)}")
+    print_report(evaluate(train(train_examples, args.threshold, args.min_examples), test_examples),
+                 len(test_examples))
+
+    cascade = train(examples, args.threshold, args.min_examples)
+    cascade.save(args.model)
+    print(f"✓ Classifier for {len(cascade.models)} action sets saved to {args.model} "
+          f"(use it with {INTENT_CLASSIFIER_ENV}={args.model})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and evaluate the local intent classifier cascade")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("results", type=str, nargs="+", help="Result CSVs judged by the LLM")
+    parser.add_argument("--model", type=str, default="data/intent_classifier.json")
+    parser.add_argument("--threshold", type=float, default=0.9,
+                       help="Minimum naive Bayes posterior for a local decision")
+    parser.add_argument("--min_examples", type=int, default=50,
+                       help="Judged messages an action set needs before its model is used")
+    parser.add_argument("--test_fraction", type=float, default=0.2,
+                       help="Share of games held out to report the agreement before saving")
+    main(parser.parse_args())
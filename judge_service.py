@@ -0,0 +1,303 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Cross-game intent judging: messages of concurrent games are collected for a short window and
+# judged by one multi-item structured call
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, get_args
+
+from pydantic import create_model
+
+from intent_classifier import get_intent_cascade
+from models import get_structured_model
+from request_executor import get_executor, model_key
+
+logger = logging.getLogger(__name__)
+
+# Messages judged per call (1 judges every message on its own, as before) and the seconds a
+# judge call waits for further messages before it is sent
+JUDGE_BATCH_SIZE_ENV = "MBTI_JUDGE_BATCH_SIZE"
+JUDGE_WINDOW_ENV = "MBTI_JUDGE_WINDOW"
+DEFAULT_JUDGE_BATCH_SIZE = 20
+DEFAULT_JUDGE_WINDOW = 0.05
+
+
+@lru_cache(maxsize=None)
+def batch_answer_format(action_type) -> type:
+    """
+    Response schema of a multi-item judge call for one action type: indexed analyses and answers.
+    """
+    item = create_model("IndexedAnswer", index=(int, ...), analysis=(str, ...), answer=(action_type, ...))
+    return create_model("BatchAnswerFormat", answers=(List[item], ...))
+
+
+@lru_cache(maxsize=None)
+def batch_question_prompt(action_type) -> str:
+    """
+    Multi-item version of node_helpers.get_question_prompt.
+    """
+    action_1, action_2 = get_args(action_type)
+    return (
+        f"You have to assess the intent of the persons using the messages that will be given, "
+        f"each written by a different person and marked with an index in brackets. "
+        f"For each message, first, do a one sentence analysis of the message, "
+        f"if it seems like the person is looking to {action_1} or {action_2}. "
+        f"Answer every message once, with its index."
+    )
+
+
+def batch_prompt(action_type, messages: list) -> str:
+    lines = [f"[{index}] {' '.join(str(message).split())}" for index, message in enumerate(messages)]
+    return batch_question_prompt(action_type) + "\n\n" + "\n".join(lines)
+
+
+@dataclass
+class JudgeItem:
+    """
+    One message waiting to be judged, with the game's callbacks and retry hook.
+    """
+    message: str
+    action_type: Any
+    answer_format: type
+    question: str
+    callbacks: Any = None
+    on_retry: Optional[Callable[[dict], None]] = None
+    future: Future = field(default_factory=Future)
+
+
+def _usage_handlers(callbacks) -> list:
+    """
+    The OpenAI callback handlers (token and cost counters) among a game's callbacks.
+    """
+    from langchain_community.callbacks.openai_info import OpenAICallbackHandler
+
+    handlers = getattr(callbacks, "handlers", callbacks) or []
+    return [handler for handler in handlers if isinstance(handler, OpenAICallbackHandler)]
+
+
+class JudgeService:
+    """
+    Judges the intent of messages for all games of the process that share a judge model.
+
+    Messages the local intent cascade (intent_classifier) decides confidently are answered
+    right away. The others are queued; a dispatcher thread collects them for `window`
+    seconds (or until `batch_size` are waiting), groups them by the game's action type and
+    sends each group as one call whose prompt lists the messages as "[i] message" and whose
+    response holds one indexed answer per message. Results are routed back through futures.
+    Items the response misses or answers invalidly, and all items of a call that fails to
+    parse, are judged again with the single-message call of the judge node. The tokens of a
+    multi-item call are split evenly over the games of its items.
+    """
+
+    def __init__(self, model, batch_size: int = None, window: float = None, max_workers: int = 16):
+        self.model = model
+        self.key = model_key(model)
+        self.batch_size = batch_size or int(os.getenv(JUDGE_BATCH_SIZE_ENV, DEFAULT_JUDGE_BATCH_SIZE))
+        self.window = window if window is not None else float(os.getenv(JUDGE_WINDOW_ENV, DEFAULT_JUDGE_WINDOW))
+        self._queue = queue.SimpleQueue()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="judge")
+        self._dispatcher = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    def submit(self, game_structure, message: str, callbacks=None, on_retry=None) -> Future:
+        """
+        Queue a message of a game for judging.
+
+        Args:
+            game_structure (BaseGameStructure): The game the message belongs to
+            message (str): The message to judge
+            callbacks: The game's callbacks (config["callbacks"]), credited with the tokens
+            on_retry (Callable, optional): The game's retry hook
+
+        Returns:
+            Future: Resolves to the game's AnswerFormat (analysis, answer)
+        """
+        from node_helpers import get_answer_format, get_question_prompt
+
+        action_type = game_structure.ActionResponse.__annotations__["action"]
+        item = JudgeItem(message, action_type, get_answer_format(game_structure),
+                         get_question_prompt(game_structure), callbacks, on_retry)
+        cascade = get_intent_cascade()
+        if cascade is not None:
+            decision, audit = cascade.decide(get_args(action_type), message)
+            if decision is not None and not audit:
+                item.future.set_result(item.answer_format(analysis=decision.analysis, answer=decision.answer))
+                return item.future
+            if decision is not None:
+                item.future.add_done_callback(
+                    lambda future: future.exception() or cascade.record_llm(decision, future.result().answer)
+                )
+        if self.batch_size <= 1:
+            self._judge_single(item)
+            return item.future
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="judge-dispatcher", daemon=True)
+                self._dispatcher.start()
+        self._queue.put(item)
+        return item.future
+
+    def _dispatch(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            groups = {}
+            for item in items:
+                groups.setdefault(item.action_type, []).append(item)
+            for group in groups.values():
+                self._pool.submit(self._judge_group, group)
+
+    def _judge_group(self, items: list):
+        if len(items) == 1:
+            self._judge_single(items[0])
+            return
+        action_type = items[0].action_type
+        schema = batch_answer_format(action_type)
+        prompt = batch_prompt(action_type, [item.message for item in items])
+
+        def on_retry(retry):
+            for item in items:
+                if item.on_retry:
+                    item.on_retry(retry)
+
+        answers = {}
+        try:
+            response = get_executor().call(
+                self.key,
+                lambda: get_structured_model(self.model, schema, include_raw=True).invoke(prompt),
+                description=f"intent analysis ({len(items)} messages)", on_retry=on_retry,
+            )
+            self._credit_usage(items, response["raw"])
+            answers = self._parse_answers(response, items)
+        except Exception as e:
+            logger.warning("Multi-item intent analysis failed (%s: %s); judging %d messages one by one",
+                           type(e).__name__, e, len(items))
+        with self._lock:
+            self.calls += 1
+            self.items += len(items)
+            self.fallbacks += len(items) - len(answers)
+        for index, item in enumerate(items):
+            if index in answers:
+                item.future.set_result(answers[index])
+            else:
+                self._judge_single(item)
+
+    @staticmethod
+    def _parse_answers(response: dict, items: list) -> dict:
+        """
+        Valid answers by item index; each answer is validated on its own, so one bad item does
+        not discard the others.
+        """
+        parsed = response["parsed"]
+        if parsed is not None:
+            raw_answers = [answer.model_dump() for answer in parsed.answers]
+        else:
+            try:
+                raw_answers = json.loads(response["raw"].content).get("answers", [])
+            except (TypeError, ValueError, AttributeError):
+                return {}
+        answers = {}
+        for raw_answer in raw_answers:
+            try:
+                index = int(raw_answer["index"])
+                if 0 <= index < len(items) and index not in answers:
+                    answers[index] = items[index].answer_format.model_validate(
+                        {"analysis": raw_answer["analysis"], "answer": raw_answer["answer"]}
+                    )
+            except Exception:
+                continue
+        return answers
+
+    def _credit_usage(self, items: list, raw):
+        """
+        Split the tokens of a multi-item call evenly over the games of its items.
+
+        The shares go straight to the handlers' token and cost counters: the call is not a
+        request of any one game, so `successful_requests` counts only the games' own calls.
+        """
+        from usage_handler import add_usage
+
+        usage = getattr(raw, "usage_metadata", None)
+        if not usage:
+            return
+        model_name = (raw.response_metadata or {}).get("model_name") or self.key
+        n = len(items)
+        for index, item in enumerate(items):
+            input_tokens = usage["input_tokens"] // n + (index < usage["input_tokens"] % n)
+            output_tokens = usage["output_tokens"] // n + (index < usage["output_tokens"] % n)
+            for handler in _usage_handlers(item.callbacks):
+                add_usage(handler, model_name, input_tokens, output_tokens)
+
+    def _judge_single(self, item: JudgeItem):
+        """
+        The judge node's single-message call, under the game's callbacks.
+        """
+        try:
+            response = get_executor().call(
+                self.key,
+                lambda: get_structured_model(self.model, item.answer_format).invoke(
+                    f"{item.question} : {item.message}", config={"callbacks": item.callbacks}
+                ),
+                description="intent analysis", on_retry=item.on_retry,
+            )
+        except Exception as e:
+            item.future.set_exception(e)
+        else:
+            item.future.set_result(response)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"calls": self.calls, "items": self.items, "fallbacks": self.fallbacks,
+                     "batch_size": self.batch_size, "window": self.window}
+        cascade = get_intent_cascade()
+        if cascade is not None:
+            stats["cascade"] = cascade.stats()
+        return stats
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info("Intent judging: %d messages in %d multi-item calls, %d judged one by one after a failure",
+                    stats["items"], stats["calls"], stats["fallbacks"])
+        cascade = get_intent_cascade()
+        if cascade is not None:
+            cascade.log_stats()
+
+
+_services: dict[int, JudgeService] = {}
+_services_lock = threading.Lock()
+
+
+def get_judge_service(model) -> JudgeService:
+    """
+    The process-wide judge service of a judge model client. Keyed by the client, not the model
+    name: a new client (other endpoint or timeout, see get_cached_model) gets its own service.
+    """
+    # The service keeps the client referenced, so its id is not reused by another object
+    key = id(model)
+    with _services_lock:
+        if key not in _services:
+            _services[key] = JudgeService(model)
+        return _services[key]
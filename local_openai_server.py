@@ -0,0 +1,640 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Local OpenAI-compatible stand-in server for offline load testing
+
+import argparse
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Canned player messages, chosen deterministically from the prompt so runs are reproducible
+PLAYER_MESSAGES = [
+    "Let's both choose the option that benefits us together this round.",
+    "I will stick to the mutually beneficial choice if you do the same.",
+    "I'm keeping my options open this round, let's see how it goes.",
+    "Trust has to be earned; I'll decide based on what you did last round.",
+    "I intend to look after my own score this round.",
+]
+
+# Base payoff matrices are rendered by RegulatorAgent as Python dict reprs:
+# {('cooperate', 'cooperate'): (3, 3), ...}
+PAYOFF_ENTRY_PATTERN = re.compile(r"\('([^']+)', '([^']+)'\): \((-?\d+), (-?\d+)\)")
+GAME_NAME_PATTERN = re.compile(r"designing a variant of the game: (\S+)")
+ITEM_INDEX_PATTERN = re.compile(r"^\[(\d+)\]", re.MULTILINE)
+
+
+@dataclass
+class StandInSettings:
+    """
+    Behaviour of the stand-in server.
+    """
+    # Latency distribution: "fixed:s", "uniform:lo,hi", "lognormal:median,sigma" or "exponential:mean" (seconds)
+    latency: str = "fixed:0"
+    # Extra latency per completion token (seconds), to model generation speed
+    per_token_latency: float = 0.0
+    # Token accounting reported in `usage`
+    chars_per_token: float = 4.0
+    completion_tokens: Optional[int] = None  # Fixed completion token count (None = derived from content)
+    # Length of generated regulator variant descriptions (characters)
+    variant_chars: int = 1500
+    # Fault injection (probabilities per request)
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    drop_rate: float = 0.0
+    stall_rate: float = 0.0
+    stall_seconds: float = 120.0
+    # Emulated provider capacity: requests beyond this many in flight get a 429 (0 = unlimited)
+    max_concurrency: int = 0
+    requests_per_minute: int = 0  # Advertised in x-ratelimit-* headers (0 = not sent)
+    # Batch API (/v1/files, /v1/batches): seconds until a batch completes, per-item failure
+    # probability, and whether the endpoints exist at all (to exercise client fallbacks)
+    batch_latency: float = 0.0
+    batch_error_rate: float = 0.0
+    batch_api: bool = True
+    seed: int = 42
+
+
+@dataclass
+class StandInStats:
+    """
+    Counters collected by the stand-in server.
+    """
+    requests: int = 0
+    ok: int = 0
+    rate_limited: int = 0
+    dropped: int = 0
+    stalled: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    max_in_flight: int = 0
+    batches: int = 0
+    batch_requests: int = 0
+    by_kind: dict = field(default_factory=dict)
+    by_model: dict = field(default_factory=dict)   # {model: [prompt_tokens, completion_tokens]}
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """
+    Sample a latency in seconds from a distribution spec such as "lognormal:0.3,0.5".
+
+    Args:
+        spec (str): The distribution spec
+        rng (random.Random): The random generator
+    Returns:
+        float: The sampled latency in seconds
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] or [0.0]
+    if kind == "fixed":
+        return max(values[0], 0.0)
+    if kind == "uniform":
+        return rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        return median * math.exp(rng.gauss(0.0, sigma)) if median > 0 else 0.0
+    if kind == "exponential":
+        return rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def messages_to_text(messages: list) -> str:
+    """
+    Flatten chat messages (string or content-part format) into plain text.
+    """
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+def classify_schema(schema: dict) -> str:
+    """
+    Name the kind of call a response schema belongs to, for per-kind statistics.
+    """
+    properties = set((schema or {}).get("properties", {}))
+    if "variant_payoff_matrix" in properties:
+        return "regulator"
+    if "answers" in properties:
+        return "judge_batch"
+    if "answer" in properties:
+        return "judge"
+    if "action" in properties:
+        return "player_action"
+    if "message" in properties:
+        return "player_message"
+    return "other"
+
+
+class ResponseGenerator:
+    """
+    Produces schema-valid structured outputs for the prompts used in this project.
+    """
+
+    def __init__(self, settings: StandInSettings):
+        self.settings = settings
+
+    def generate(self, schema: dict, prompt_text: str, rng: random.Random) -> dict:
+        """
+        Generate an object that validates against a JSON schema, using the prompt for domain hints.
+
+        Args:
+            schema (dict): The JSON schema of the expected response
+            prompt_text (str): The flattened prompt
+            rng (random.Random): The random generator
+        Returns:
+            dict: The generated response object
+        """
+        defs = schema.get("$defs", {})
+        value = self._value(schema, defs, "", rng)
+        if isinstance(value, dict):
+            self._apply_domain_hints(value, schema, defs, prompt_text, rng)
+        return value
+
+    def _resolve(self, schema: dict, defs: dict) -> dict:
+        ref = schema.get("$ref")
+        if ref:
+            return self._resolve(defs[ref.split("/")[-1]], defs)
+        return schema
+
+    def _value(self, schema: dict, defs: dict, name: str, rng: random.Random):
+        schema = self._resolve(schema, defs)
+        if "const" in schema:
+            return schema["const"]
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        for key in ("anyOf", "oneOf"):
+            if key in schema:
+                options = [o for o in schema[key] if self._resolve(o, defs).get("type") != "null"]
+                return self._value(options[0] if options else schema[key][0], defs, name, rng)
+        schema_type = schema.get("type", "object" if "properties" in schema else "string")
+        if isinstance(schema_type, list):
+            schema_type = next((t for t in schema_type if t != "null"), "string")
+        if schema_type == "object":
+            return {
+                prop: self._value(prop_schema, defs, prop, rng)
+                for prop, prop_schema in schema.get("properties", {}).items()
+            }
+        if schema_type == "array":
+            count = max(schema.get("minItems", 1), 1)
+            return [self._value(schema.get("items", {}), defs, name, rng) for _ in range(count)]
+        if schema_type == "integer":
+            return int(schema.get("minimum", 0))
+        if schema_type == "number":
+            return float(schema.get("minimum", 0.0))
+        if schema_type == "boolean":
+            return rng.random() < 0.5
+        if schema_type == "null":
+            return None
+        return f"Stand-in {name or 'text'}."
+
+    def _apply_domain_hints(self, value: dict, schema: dict, defs: dict, prompt_text: str, rng: random.Random):
+        schema = self._resolve(schema, defs)
+        if "message" in value and "action" not in value:
+            value["message"] = rng.choice(PLAYER_MESSAGES)
+        if "answer" in value and "analysis" in value:
+            value["analysis"] = f"The message suggests the player is looking to {value['answer']}."
+        if "answers" in value:
+            # Multi-item judge requests index their items as "[i] message"
+            indices = [int(i) for i in ITEM_INDEX_PATTERN.findall(prompt_text)] or [0]
+            item_schema = self._resolve(self._resolve(schema["properties"]["answers"], defs).get("items", {}), defs)
+            answers = []
+            for index in indices:
+                item = self._value(item_schema, defs, "", rng)
+                item["index"] = index
+                if "answer" in item and "analysis" in item:
+                    item["analysis"] = f"The message suggests the player is looking to {item['answer']}."
+                answers.append(item)
+            value["answers"] = answers
+        if "variant_payoff_matrix" in value:
+            game_match = GAME_NAME_PATTERN.search(prompt_text)
+            game_name = game_match.group(1) if game_match else "game"
+            entries = PAYOFF_ENTRY_PATTERN.findall(prompt_text)
+            payoff = {f"{a1},{a2}": [int(p1), int(p2)] for a1, a2, p1, p2 in entries}
+            value["variant_payoff_matrix"] = json.dumps(payoff)
+            value["variant_description"] = self._variant_description(game_name, rng)
+            value["reasoning"] = (
+                f"This stand-in variant of {game_name} adds reputation effects so that "
+                f"trusting and self-interested personalities diverge."
+            )
+
+    def _variant_description(self, game_name: str, rng: random.Random) -> str:
+        sentence = (
+            "Each round your reputation is visible to the other player and decays when you betray their trust. "
+            "Payoffs follow the matrix below, but past behaviour shapes what the other player expects of you. "
+        )
+        header = f"**You are a player in a repeated variant of {game_name} with communication.**\n"
+        body = sentence * max(1, (self.settings.variant_chars - len(header)) // len(sentence))
+        return header + body[:max(0, self.settings.variant_chars - len(header))]
+
+
+class LocalOpenAIServer:
+    """
+    A threaded HTTP server implementing `POST /v1/chat/completions` with structured outputs,
+    plus a minimal Batch API (`/v1/files`, `/v1/batches`) that answers each line of a batch
+    input file like a chat completion.
+
+    Besides the OpenAI endpoints it serves `GET /stats` and `POST /stats/reset` for benchmarks.
+    """
+
+    def __init__(self, settings: StandInSettings = None, host: str = "127.0.0.1", port: int = 0):
+        self.settings = settings or StandInSettings()
+        self.generator = ResponseGenerator(self.settings)
+        self._rng = random.Random(self.settings.seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = StandInStats()
+        self._files = {}    # file id -> {"object": file metadata, "content": bytes}
+        self._batches = {}  # batch id -> batch object
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "LocalOpenAIServer":
+        """
+        Serve in a background thread and return self.
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = asdict(self._stats)
+            stats["by_kind"] = dict(stats["by_kind"])
+            stats["by_model"] = {model: list(tokens) for model, tokens in stats["by_model"].items()}
+            return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = StandInStats()
+
+    def _record_usage(self, response: dict, kind: str):
+        """
+        Add a served completion to the token counters (the caller holds the lock).
+        """
+        usage = response["usage"]
+        self._stats.prompt_tokens += usage["prompt_tokens"]
+        self._stats.completion_tokens += usage["completion_tokens"]
+        self._stats.by_kind[kind] = self._stats.by_kind.get(kind, 0) + 1
+        tokens = self._stats.by_model.setdefault(response["model"], [0, 0])
+        tokens[0] += usage["prompt_tokens"]
+        tokens[1] += usage["completion_tokens"]
+
+    def _draw(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                setattr(self._stats, key, getattr(self._stats, key) + value)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass  # Keep load tests quiet
+
+            def do_GET(self):
+                path = self.path.rstrip("/")
+                if path == "/stats":
+                    return self._send_json(200, server.stats())
+                if path == "/v1/models":
+                    return self._send_json(200, {"object": "list", "data": []})
+                if server.settings.batch_api and path.startswith(("/v1/files/", "/v1/batches/")):
+                    return server._handle_batch_api_get(self, path)
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if self.path.rstrip("/") == "/stats/reset":
+                    server.reset_stats()
+                    return self._send_json(200, {"ok": True})
+                if server.settings.batch_api and self.path.rstrip("/") == "/v1/files":
+                    return server._handle_file_upload(self, raw)
+                if server.settings.batch_api and self.path.rstrip("/") == "/v1/batches":
+                    return server._handle_batch_create(self, json.loads(raw or b"{}"))
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    return self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                server._handle_chat_completion(self, json.loads(raw or b"{}"))
+
+            def _send_bytes(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, status: int, payload: dict, headers: dict = None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def _rate_limit_headers(self, remaining: int) -> dict:
+        settings = self.settings
+        headers = {"Retry-After": f"{settings.retry_after:g}"}
+        if settings.requests_per_minute:
+            headers.update({
+                "x-ratelimit-limit-requests": str(settings.requests_per_minute),
+                "x-ratelimit-remaining-requests": str(max(remaining, 0)),
+                "x-ratelimit-reset-requests": f"{settings.retry_after:g}s",
+            })
+        return headers
+
+    def _handle_chat_completion(self, handler, request: dict):
+        settings = self.settings
+        with self._lock:
+            self._stats.requests += 1
+            self._in_flight += 1
+            self._stats.max_in_flight = max(self._stats.max_in_flight, self._in_flight)
+            over_capacity = settings.max_concurrency and self._in_flight > settings.max_concurrency
+            remaining = settings.max_concurrency - self._in_flight if settings.max_concurrency else 1
+        try:
+            if over_capacity or self._draw() < settings.rate_limit_rate:
+                self._count(rate_limited=1)
+                return handler._send_json(429, {
+                    "error": {"message": "Rate limit exceeded, please try again later.",
+                              "type": "rate_limit_error", "code": 429}
+                }, headers=self._rate_limit_headers(0 if over_capacity else remaining))
+
+            if self._draw() < settings.drop_rate:
+                self._count(dropped=1)
+                # Close the socket without sending a response
+                handler.close_connection = True
+                handler.connection.shutdown(socket.SHUT_RDWR)
+                return
+
+            if self._draw() < settings.stall_rate:
+                self._count(stalled=1)
+                time.sleep(settings.stall_seconds)
+
+            response, kind = self._build_completion(request)
+            completion_tokens = response["usage"]["completion_tokens"]
+            with self._lock:
+                delay = sample_latency(settings.latency, self._rng)
+            time.sleep(delay + settings.per_token_latency * completion_tokens)
+
+            with self._lock:
+                self._stats.ok += 1
+                self._record_usage(response, kind)
+            handler._send_json(200, response, headers=self._rate_limit_headers(remaining) if settings.requests_per_minute else None)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up (timeout or hedged request won elsewhere)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _store_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_object = {
+            "id": f"file-{uuid.uuid4().hex[:24]}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self._lock:
+            self._files[file_object["id"]] = {"object": file_object, "content": content}
+        return file_object
+
+    def _handle_file_upload(self, handler, raw: bytes):
+        from email.parser import BytesParser
+        from email.policy import HTTP
+
+        # multipart/form-data with a "purpose" field and a "file" part
+        content_type = handler.headers.get("Content-Type", "")
+        form = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + raw
+        )
+        fields, content, filename = {}, b"", "upload.jsonl"
+        for part in form.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                content = part.get_payload(decode=True) or b""
+                filename = part.get_filename() or filename
+            else:
+                fields[name] = (part.get_payload(decode=True) or b"").decode()
+        handler._send_json(200, self._store_file(content, filename, fields.get("purpose", "batch")))
+
+    def _handle_batch_create(self, handler, request: dict):
+        input_file = self._files.get(request.get("input_file_id"))
+        if input_file is None:
+            return handler._send_json(404, {"error": {"message": "Unknown input_file_id"}})
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "object": "batch",
+            "endpoint": request.get("endpoint", "/v1/chat/completions"),
+            "input_file_id": request["input_file_id"],
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "in_progress",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": request.get("metadata"),
+        }
+        with self._lock:
+            self._batches[batch["id"]] = batch
+            self._stats.batches += 1
+        threading.Thread(target=self._process_batch, args=(batch, input_file["content"]), daemon=True).start()
+        handler._send_json(200, batch)
+
+    def _process_batch(self, batch: dict, content: bytes):
+        """
+        Answer every line of a batch input file, then publish output and error files.
+        """
+        started = time.monotonic()
+        outputs, errors = [], []
+        for line in content.decode().splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if self._draw() < self.settings.batch_error_rate:
+                errors.append({
+                    "id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": item.get("custom_id"),
+                    "response": None,
+                    "error": {"code": "server_error", "message": "Stand-in batch item failure"},
+                })
+                continue
+            response, kind = self._build_completion(item.get("body", {}))
+            with self._lock:
+                self._stats.batch_requests += 1
+                self._record_usage(response, kind)
+            outputs.append({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": item.get("custom_id"),
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": response},
+                "error": None,
+            })
+        time.sleep(max(0.0, self.settings.batch_latency - (time.monotonic() - started)))
+
+        def jsonl(records):
+            return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+        output_file = self._store_file(jsonl(outputs), f"{batch['id']}_output.jsonl", "batch_output")
+        error_file = self._store_file(jsonl(errors), f"{batch['id']}_error.jsonl", "batch_output") if errors else None
+        with self._lock:
+            batch.update({
+                "status": "completed",
+                "output_file_id": output_file["id"],
+                "error_file_id": error_file["id"] if error_file else None,
+                "completed_at": int(time.time()),
+                "request_counts": {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)},
+            })
+
+    def _handle_batch_api_get(self, handler, path: str):
+        parts = path.split("/")  # ["", "v1", "files" | "batches", id, ("content")]
+        with self._lock:
+            if parts[2] == "batches":
+                batch = self._batches.get(parts[3])
+                payload = dict(batch) if batch else None
+            else:
+                stored = self._files.get(parts[3])
+                payload = stored["object"] if stored else None
+        if payload is None:
+            return handler._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+        if parts[2] == "files" and len(parts) > 4 and parts[4] == "content":
+            return handler._send_bytes(200, self._files[parts[3]]["content"], "application/octet-stream")
+        handler._send_json(200, payload)
+
+    def _build_completion(self, request: dict) -> tuple[dict, str]:
+        settings = self.settings
+        messages = request.get("messages", [])
+        prompt_text = messages_to_text(messages)
+        # Seed per prompt so identical prompts get identical answers (temperature 0 behaviour)
+        rng = random.Random(zlib.crc32(prompt_text.encode()) ^ settings.seed)
+
+        response_format = request.get("response_format") or {}
+        tools = request.get("tools") or []
+        tool_calls = None
+        if response_format.get("type") == "json_schema":
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            content = json.dumps(self.generator.generate(schema, prompt_text, rng))
+        elif tools:
+            function = tools[0].get("function", {})
+            schema = function.get("parameters", {})
+            arguments = json.dumps(self.generator.generate(schema, prompt_text, rng))
+            tool_calls = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                "function": {"name": function.get("name", "tool"), "arguments": arguments},
+            }]
+            content = None
+        elif response_format.get("type") == "json_object":
+            schema = {"properties": {"message": {"type": "string"}}}
+            content = json.dumps(self.generator.generate(schema, prompt_text, rng))
+        else:
+            schema = {}
+            content = rng.choice(PLAYER_MESSAGES)
+
+        prompt_tokens = max(1, math.ceil(len(prompt_text) / settings.chars_per_token))
+        generated = content if content is not None else tool_calls[0]["function"]["arguments"]
+        completion_tokens = settings.completion_tokens or max(1, math.ceil(len(generated) / settings.chars_per_token))
+
+        message = {"role": "assistant", "content": content, "refusal": None}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        response = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stand-in"),
+            "system_fingerprint": "fp_local_standin",
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "logprobs": None,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        return response, classify_schema(schema)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a local OpenAI-compatible stand-in server (set MBTI_API_BASE to its /v1 URL)"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--latency", type=str, default="fixed:0",
+                       help='Latency distribution, e.g. "fixed:0.2", "uniform:0.1,0.5", "lognormal:0.3,0.5", "exponential:0.3"')
+    parser.add_argument("--per_token_latency", type=float, default=0.0,
+                       help="Extra seconds per completion token")
+    parser.add_argument("--chars_per_token", type=float, default=4.0)
+    parser.add_argument("--completion_tokens", type=int, required=False,
+                       help="Report a fixed completion token count")
+    parser.add_argument("--variant_chars", type=int, default=1500,
+                       help="Length of generated variant descriptions")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0,
+                       help="Probability of a 429 response")
+    parser.add_argument("--retry_after", type=float, default=1.0,
+                       help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--drop_rate", type=float, default=0.0,
+                       help="Probability of closing the connection without a response")
+    parser.add_argument("--stall_rate", type=float, default=0.0,
+                       help="Probability of stalling a request for --stall_seconds")
+    parser.add_argument("--stall_seconds", type=float, default=120.0)
+    parser.add_argument("--max_concurrency", type=int, default=0,
+                       help="Emulated provider capacity (0 = unlimited)")
+    parser.add_argument("--requests_per_minute", type=int, default=0,
+                       help="Advertise x-ratelimit-* headers with this limit")
+    parser.add_argument("--batch_latency", type=float, default=0.0,
+                       help="Seconds until a Batch API job completes")
+    parser.add_argument("--batch_error_rate", type=float, default=0.0,
+                       help="Probability of a failed item in a Batch API job")
+    parser.add_argument("--no_batch_api", dest="batch_api", action="store_false",
+                       help="Answer the Batch API endpoints with 404")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    settings = StandInSettings(**{k: v for k, v in vars(args).items() if k not in ("host", "port")})
+    server = LocalOpenAIServer(settings, host=args.host, port=args.port)
+    print(f"🧪 Local stand-in server listening on {server.base_url}", flush=True)
+    print(f"   export MBTI_API_BASE={server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
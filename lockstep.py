@@ -0,0 +1,654 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Lockstep execution: advance many games round by round, submitting every phase as Batch API jobs
+
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from compact_state import AGENTS, CompactGame, MessageStore
+from logging_setup import setup_logging
+from sweep import SweepCell, SweepSpec
+
+logger = logging.getLogger(__name__)
+
+# Batch endpoint, if it differs from the chat endpoint (OpenRouter has no Batch API)
+BATCH_API_BASE_ENV = "MBTI_BATCH_API_BASE"
+BATCH_API_KEY_ENV = "MBTI_BATCH_API_KEY"
+
+# OpenAI Batch API limit on the requests of one input file (all for the same model)
+MAX_BATCH_REQUESTS = 50_000
+# Batch jobs are billed at half the price of synchronous calls
+BATCH_PRICE_FACTOR = 0.5
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# A 20-round game with long messages and analyses stays well below 1 MiB
+DEFAULT_MAX_GAME_BYTES = 1024 * 1024
+DEFAULT_MAX_GAMES_IN_FLIGHT = 10_000
+
+
+@dataclass
+class PhaseRequest:
+    """
+    One structured-output chat completion of a lockstep phase.
+    """
+    custom_id: str
+    model: Any        # Cached ChatOpenAI client (models.get_cached_model)
+    messages: Any     # Chat messages, or a string sent as one user message
+    schema: type      # Pydantic class of the expected response
+
+
+@dataclass
+class PhaseResult:
+    """
+    Parsed response (or error) of one request, with its token usage.
+    """
+    parsed: Any = None
+    error: Optional[Exception] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    batched: bool = False
+
+
+def split_usage(result: PhaseResult, n: int) -> list:
+    """
+    Split the tokens of a result shared by `n` games (a unit's variant) evenly, remainders first.
+    """
+    prompt_tokens, prompt_remainder = divmod(result.prompt_tokens, n)
+    completion_tokens, completion_remainder = divmod(result.completion_tokens, n)
+    return [
+        replace(result, prompt_tokens=prompt_tokens + (index < prompt_remainder),
+                completion_tokens=completion_tokens + (index < completion_remainder))
+        for index in range(n)
+    ]
+
+
+class BatchJobError(RuntimeError):
+    """
+    A Batch API job or one of its items did not produce a usable response.
+    """
+
+
+def request_body(request: PhaseRequest) -> dict:
+    """
+    Chat-completions body equivalent to `model.with_structured_output(schema, method="json_schema")`.
+    """
+    from langchain_core.messages import convert_to_openai_messages
+    from langchain_core.utils.function_calling import convert_to_openai_function
+
+    function = convert_to_openai_function(request.schema)
+    json_schema = {"name": function["name"], "schema": function["parameters"]}
+    if function.get("description"):
+        json_schema["description"] = function["description"]
+    if isinstance(request.messages, str):
+        messages = [{"role": "user", "content": request.messages}]
+    else:
+        messages = convert_to_openai_messages(request.messages)
+    model = request.model
+    return {
+        "model": model.model_name,
+        "messages": messages,
+        "temperature": model.temperature,
+        "seed": model.seed,
+        "response_format": {"type": "json_schema", "json_schema": json_schema},
+    }
+
+
+def batch_api_unusable(error: Exception) -> bool:
+    """
+    Whether a Batch API error will recur on every phase: no Batch API at the endpoint (404),
+    rejected credentials (401/403) or none configured.
+    """
+    if getattr(error, "status_code", None) in (401, 403, 404):
+        return True
+    import openai
+
+    # The client raises the bare OpenAIError when no API key is configured
+    return type(error) is openai.OpenAIError
+
+
+class BatchSubmitter:
+    """
+    Runs the requests of one phase: as Batch API jobs (one per model, split at the file limit),
+    falling back to direct calls through the shared request executor for every request the
+    batch did not answer (endpoint missing, job failed or expired, item failed or unparsable).
+    """
+
+    def __init__(self, use_batch_api: bool = True, batch_api_base: str = None,
+                 poll_interval: float = 10.0, timeout: float = 24 * 3600, fallback_concurrency: int = 16):
+        self.use_batch_api = use_batch_api
+        self.batch_api_base = batch_api_base or os.getenv(BATCH_API_BASE_ENV)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.fallback_concurrency = fallback_concurrency
+        self._client = None
+
+    def _batch_client(self, model):
+        if not self.batch_api_base:
+            return model.root_client  # Same endpoint and key as the chat calls
+        if self._client is None:
+            import openai
+
+            from http_pool import get_http_client
+
+            self._client = openai.OpenAI(
+                base_url=self.batch_api_base,
+                api_key=os.getenv(BATCH_API_KEY_ENV) or os.getenv("OPENAI_API_KEY"),
+                http_client=get_http_client(),
+            )
+        return self._client
+
+    def submit(self, requests: list, description: str) -> dict:
+        """
+        Run all requests and return their results keyed by custom_id.
+        """
+        from request_executor import model_key
+
+        results = {}
+        if self.use_batch_api and requests:
+            by_model = {}
+            for request in requests:
+                by_model.setdefault(model_key(request.model), []).append(request)
+            jobs = [
+                group[start:start + MAX_BATCH_REQUESTS]
+                for group in by_model.values()
+                for start in range(0, len(group), MAX_BATCH_REQUESTS)
+            ]
+            with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+                for job_results in pool.map(lambda job: self._run_batch(job, description), jobs):
+                    results.update(job_results)
+
+        missing = [request for request in requests
+                   if request.custom_id not in results or results[request.custom_id].error]
+        if missing:
+            if self.use_batch_api:
+                logger.warning("%s: %d of %d requests fall back to direct calls",
+                               description, len(missing), len(requests))
+            with ThreadPoolExecutor(max_workers=self.fallback_concurrency) as pool:
+                for request, result in zip(missing, pool.map(lambda r: self._direct(r, description), missing)):
+                    results[request.custom_id] = result
+        return results
+
+    def _run_batch(self, requests: list, description: str) -> dict:
+        """
+        Submit one Batch API job and collect what it answered; on any job-level error return
+        nothing, so every request falls back to a direct call.
+        """
+        by_id = {request.custom_id: request for request in requests}
+        try:
+            client = self._batch_client(requests[0].model)
+            lines = "".join(
+                json.dumps({"custom_id": r.custom_id, "method": "POST", "url": "/v1/chat/completions",
+                            "body": request_body(r)}) + "\n"
+                for r in requests
+            )
+            input_file = client.files.create(file=("lockstep.jsonl", lines.encode()), purpose="batch")
+            batch = client.batches.create(
+                input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h",
+                metadata={"description": description},
+            )
+            logger.info("%s: submitted batch %s with %d requests", description, batch.id, len(requests))
+            deadline = time.monotonic() + self.timeout
+            while batch.status not in BATCH_TERMINAL_STATUSES:
+                if time.monotonic() > deadline:
+                    client.batches.cancel(batch.id)
+                    raise BatchJobError(f"batch {batch.id} did not finish within {self.timeout:.0f}s")
+                time.sleep(self.poll_interval)
+                batch = client.batches.retrieve(batch.id)
+            if batch.status != "completed":
+                logger.warning("%s: batch %s ended as %s", description, batch.id, batch.status)
+            # Expired batches still return the items they completed
+            output = client.files.content(batch.output_file_id).text if batch.output_file_id else ""
+        except Exception as e:
+            if batch_api_unusable(e):
+                # Call directly from now on instead of failing and falling back on every phase
+                logger.error("%s: Batch API unusable, disabled for this run (%s: %s)",
+                             description, type(e).__name__, e)
+                self.use_batch_api = False
+            else:
+                logger.warning("%s: Batch API unavailable (%s: %s)", description, type(e).__name__, e)
+            return {}
+
+        results = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            request = by_id.get(item.get("custom_id"))
+            if request is not None:
+                results[request.custom_id] = self._parse_item(request, item)
+        return results
+
+    @staticmethod
+    def _parse_item(request: PhaseRequest, item: dict) -> PhaseResult:
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            return PhaseResult(error=BatchJobError(f"batch item failed: {item.get('error')}"))
+        body = response["body"]
+        usage = body.get("usage") or {}
+        try:
+            parsed = request.schema.model_validate_json(body["choices"][0]["message"]["content"])
+        except Exception as e:
+            return PhaseResult(error=e)
+        return PhaseResult(parsed, None, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), True)
+
+    @staticmethod
+    def _direct(request: PhaseRequest, description: str) -> PhaseResult:
+        from models import get_structured_model
+        from request_executor import get_executor, model_key
+
+        structured = get_structured_model(request.model, request.schema, include_raw=True)
+        try:
+            response = get_executor().call(
+                model_key(request.model), lambda: structured.invoke(request.messages), description=description
+            )
+        except Exception as e:
+            return PhaseResult(error=e)
+        if response["parsed"] is None:
+            return PhaseResult(error=response.get("parsing_error") or BatchJobError("empty response"))
+        usage = response["raw"].usage_metadata or {}
+        return PhaseResult(response["parsed"], None, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+
+
+class GameUsage:
+    """
+    Token and cost totals of one lockstep game (the attributes of a callback handler that the
+    event reporter reads).
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.successful_requests = 0
+        self.total_cost = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, model_name: str, result: PhaseResult, prices):
+        self.prompt_tokens += result.prompt_tokens
+        self.completion_tokens += result.completion_tokens
+        self.successful_requests += 1
+        try:
+            cost = prices.cost({model_name: (result.prompt_tokens, result.completion_tokens)})
+        except ValueError:
+            cost = 0.0  # Model missing from the price table
+        self.total_cost += cost * (BATCH_PRICE_FACTOR if result.batched else 1.0)
+
+
+@dataclass
+class LockstepGame:
+    """
+    One game advanced by the lockstep scheduler.
+    """
+    index: int
+    cell: SweepCell
+    record: CompactGame
+    structure: Any
+    models: dict
+    intent_model: Any
+    setup: dict
+    tags: dict
+    report: Callable[[dict], None]
+    game_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    usage: GameUsage = field(default_factory=GameUsage)
+    started: float = field(default_factory=time.monotonic)
+    error: Optional[Exception] = None
+
+    @property
+    def active(self) -> bool:
+        return self.error is None and not self.record.finished
+
+
+def apply_judgement(game: LockstepGame, agent: str, judgement):
+    game.record.add_judgement(agent, judgement.answer, judgement.analysis)
+
+
+class LockstepScheduler:
+    """
+    Plays many games in lockstep: every phase of a round (messages, actions, intent judging)
+    is collected from all active games and submitted together, then the results are
+    scattered back into each game's state. Prompts, payoffs and result rows are the same as
+    in the per-game graph (run_regulated_game), whose agent_1 -> agent_2 ordering inside a
+    phase only exists for rate limiting: agent_2 never sees agent_1's answer of the same phase.
+
+    Games are held as CompactGame records sharing one MessageStore. A game whose record grows
+    beyond `max_game_bytes` is failed, and at most `max_games_in_flight` games are played at once
+    (the units are played in consecutive chunks).
+    """
+
+    def __init__(self, submitter: BatchSubmitter, file_path: str, event_log=None,
+                 max_game_bytes: int = DEFAULT_MAX_GAME_BYTES, max_games_in_flight: int = DEFAULT_MAX_GAMES_IN_FLIGHT):
+        from cost_budget import PriceTable
+        from event_log import get_event_log
+
+        self.submitter = submitter
+        self.file_path = file_path
+        self.event_log = event_log or get_event_log()
+        self.prices = PriceTable()
+        self.store = MessageStore()
+        self.max_game_bytes = max_game_bytes
+        self.max_games_in_flight = max_games_in_flight
+
+    def run(self, units: list) -> list:
+        """
+        Play every cell of the units (single cells or mirrored pairs sharing one variant).
+
+        Returns:
+            list[LockstepGame]: All games; failed ones have `error` set
+        """
+        games, chunk = [], []
+        for unit in units:
+            if chunk and sum(len(u) for u in chunk) + len(unit) > self.max_games_in_flight:
+                games += self._run_chunk(chunk, offset=len(games))
+                chunk = []
+            chunk.append(unit)
+        if chunk:
+            games += self._run_chunk(chunk, offset=len(games))
+        return games
+
+    def _run_chunk(self, units: list, offset: int) -> list:
+        games = self.start_games(units, offset)
+        round_number = 0
+        while True:
+            active = [game for game in games if game.active]
+            if not active:
+                break
+            round_number += 1
+            logger.info("Round %d: %d active games", round_number, len(active))
+            for prompt_type in ("message", "action"):
+                self._play_phase([game for game in active if game.error is None], prompt_type, round_number)
+            self._judge_phase([game for game in active if game.error is None], round_number)
+            for game in active:
+                if game.error is None:
+                    self._update(game)
+            self._check_memory(active, round_number)
+            self._finish([game for game in active if not game.active])
+        return games
+
+    def _check_memory(self, games: list, round_number: int):
+        """
+        Fail the games whose record exceeds the per-game bound and log the state footprint.
+        """
+        sizes = [(game.record.nbytes(), game) for game in games if game.error is None]
+        for nbytes, game in sizes:
+            if nbytes > self.max_game_bytes:
+                game.error = MemoryError(f"game state of {nbytes / 1024:.0f} KiB exceeds the bound of "
+                                         f"{self.max_game_bytes / 1024:.0f} KiB")
+        if sizes:
+            logger.info("Round %d state: %d games, largest %.1f KiB, %d stored texts (%.1f MiB)",
+                        round_number, len(sizes), max(sizes, key=lambda s: s[0])[0] / 1024,
+                        len(self.store), self.store.nbytes() / 2**20)
+
+    def _run(self, requests: list, description: str) -> dict:
+        started = time.monotonic()
+        results = self.submitter.submit(requests, description)
+        logger.info("%s: %d requests in %.1fs", description, len(requests), time.monotonic() - started)
+        return results
+
+    def start_games(self, units: list, offset: int = 0) -> list:
+        """
+        Generate one variant per unit (as one batch phase) and create the initial game records.
+
+        The variant call's tokens and cost are split over the games of its unit. Base-game units
+        play the base game without a variant call.
+        """
+        from typing import get_args
+
+        from config import BASE_VARIANT_TYPE, INTENT_MODEL_ID
+        from game_variant_generator import GameVariantGenerator
+        from models import get_cached_model
+        from regulator_agent import GameVariantResponse, RegulatorAgent
+        from run_regulated_game import (
+            game_reporter, game_started_event, load_game_structure_from_registry, prepare_variant_game,
+        )
+
+        requests, base_games = {}, []
+        for index, unit in enumerate(units):
+            cell = unit[0]
+            base_game = load_game_structure_from_registry(cell.game_name)
+            base_games.append(base_game)
+            if cell.variant_type != BASE_VARIANT_TYPE:
+                requests[index] = PhaseRequest(
+                    f"u{index}-variant", get_cached_model(cell.regulator_model),
+                    RegulatorAgent.variant_prompt(base_game, cell.variant_type), GameVariantResponse,
+                )
+        results = self._run(list(requests.values()), "variants") if requests else {}
+
+        intent_model = get_cached_model(INTENT_MODEL_ID)
+        games = []
+        for index, (unit, base_game) in enumerate(zip(units, base_games)):
+            request = requests.get(index)
+            if request is None:
+                variant_response, shares = GameVariantGenerator.base_game_variant(base_game), [None] * len(unit)
+            else:
+                result = results[request.custom_id]
+                if result.error is not None:
+                    logger.error("Variant for %s failed: %s: %s", " / ".join(c.key for c in unit),
+                                 type(result.error).__name__, result.error)
+                    continue
+                variant_response, shares = result.parsed, split_usage(result, len(unit))
+            variant_game = prepare_variant_game(base_game, variant_response)
+            actions = get_args(variant_game.ActionResponse.__annotations__["action"])
+            for cell, share in zip(unit, shares):
+                tags = {"cell_key": cell.key, "replicate": cell.replicate}
+                if len(unit) > 1:
+                    tags.update({"pair_key": cell.pair_key, "seating": cell.seating})
+                game = LockstepGame(
+                    index=offset + len(games),
+                    cell=cell,
+                    record=CompactGame(cell.personality_1, cell.personality_2, cell.rounds, actions,
+                                       variant_response, cell.regulator_model, self.store),
+                    structure=variant_game,
+                    models={"agent_1": get_cached_model(cell.player_model_1),
+                            "agent_2": get_cached_model(cell.player_model_2)},
+                    intent_model=intent_model,
+                    setup={
+                        "game_name": variant_game.game_name,
+                        "base_game_name": cell.game_name,
+                        "variant_type": cell.variant_type,
+                        "regulator_model": cell.regulator_model,
+                        "model_provider_1": None,
+                        "model_name_1": cell.player_model_1,
+                        "model_provider_2": None,
+                        "model_name_2": cell.player_model_2,
+                        "payoff_matrix": variant_game.payoff_matrix,
+                    },
+                    tags=tags,
+                    report=None,
+                )
+                if share is not None:
+                    game.usage.add(request.model.model_name, share, self.prices)
+                game.report = game_reporter(game.game_id, game.usage, None, self.event_log)
+                game.report(game_started_event(cell.personality_1, cell.personality_2, cell.game_name,
+                                               cell.variant_type, cell.rounds, tags))
+                games.append(game)
+        return games
+
+    def _scatter(self, requests: list, results: dict, games: dict, apply: Callable):
+        """
+        Apply each result to its game (fn(game, agent, parsed)); a failed request fails its game.
+        """
+        for request in requests:
+            game, agent = games[request.custom_id]
+            if game.error is not None:
+                continue
+            result = results[request.custom_id]
+            if result.error is not None:
+                game.error = result.error
+                continue
+            game.usage.add(request.model.model_name, result, self.prices)
+            apply(game, agent, result.parsed)
+
+    def _play_phase(self, games: list, prompt_type: str, round_number: int):
+        from run_regulated_game import get_agent_annotated_prompt
+
+        requests, owners = [], {}
+        for game in games:
+            Structure = game.structure.MessageResponse if prompt_type == "message" else game.structure.ActionResponse
+            view = game.record.view()
+            for agent in AGENTS:
+                prompt = get_agent_annotated_prompt(agent, view, prompt_type, game.structure).prompt
+                custom_id = f"g{game.index}-{agent}-{prompt_type}-r{game.record.current_round}"
+                requests.append(PhaseRequest(custom_id, game.models[agent], prompt, Structure))
+                owners[custom_id] = (game, agent)
+
+        def apply(game, agent, parsed):
+            if prompt_type == "message":
+                game.record.add_message(agent, parsed.message)
+            else:
+                game.record.add_action(agent, parsed.action)
+
+        results = self._run(requests, f"round {round_number} {prompt_type}s")
+        self._scatter(requests, results, owners, apply)
+
+    def _judge_phase(self, games: list, round_number: int):
+        from typing import get_args
+
+        from intent_classifier import get_intent_cascade
+        from run_regulated_game import get_answer_format, get_question_prompt
+
+        cascade = get_intent_cascade()
+        requests, owners, audits = [], {}, {}
+        for game in games:
+            question, answer_format = get_question_prompt(game.structure), get_answer_format(game.structure)
+            actions = get_args(game.structure.ActionResponse.__annotations__["action"])
+            for agent in AGENTS:
+                message = game.record.last_message(agent)
+                decision, audit = cascade.decide(actions, message) if cascade else (None, False)
+                if decision is not None and not audit:
+                    apply_judgement(game, agent, answer_format(analysis=decision.analysis, answer=decision.answer))
+                    continue
+                custom_id = f"g{game.index}-{agent}-judge-r{game.record.current_round}"
+                requests.append(PhaseRequest(custom_id, game.intent_model, f"{question} : {message}", answer_format))
+                owners[custom_id] = (game, agent)
+                if decision is not None:
+                    audits[custom_id] = decision
+
+        results = self._run(requests, f"round {round_number} judging")
+        self._scatter(requests, results, owners, apply_judgement)
+        for custom_id, decision in audits.items():
+            if results[custom_id].error is None:
+                cascade.record_llm(decision, results[custom_id].parsed.answer)
+
+    def _update(self, game: LockstepGame):
+        record = game.record
+        actions = record.last_actions()
+        score_1, score_2 = game.structure.payoff_matrix[actions]
+        game.report({"event": "round_completed", "round": record.current_round,
+                     "actions": list(actions), "scores": [score_1, score_2]})
+        record.complete_round(score_1, score_2)
+
+    def _finish(self, games: list):
+        from run_regulated_game import game_finished_event, save_game_results
+
+        finished = []
+        for game in games:
+            if game.error is not None:
+                logger.error("Game %s (%s) failed: %s: %s", game.game_id[:8], game.cell.key,
+                             type(game.error).__name__, game.error)
+                game.report(game_finished_event(game.error, game.usage, game.started))
+                game.record.release()
+                continue
+            state = game.record.to_state()
+            state.update({
+                "game_id": game.game_id,
+                "total_tokens": game.usage.total_tokens,
+                "total_cost_USD": game.usage.total_cost,
+            })
+            game.report(game_finished_event(state, game.usage, game.started))
+            finished.append((state, game.setup, game.tags))
+            game.record.release()
+        if finished and self.file_path:
+            save_game_results(self.file_path, finished)
+
+
+def main(args):
+    from intent_classifier import get_intent_cascade
+    from parquet_store import results_path
+
+    setup_logging()
+    if args.api_base:
+        os.environ["MBTI_API_BASE"] = args.api_base
+    if args.event_log:
+        from event_log import EVENT_LOG_ENV
+
+        os.environ[EVENT_LOG_ENV] = args.event_log
+
+    spec = SweepSpec.from_file(args.spec)
+    units = spec.units()
+    if args.resume:
+        from cost_budget import completed_cell_keys
+
+        done = completed_cell_keys(args.resume)
+        units = [[cell for cell in unit if cell.key not in done] for unit in units]
+        units = [unit for unit in units if unit]
+        print(f"Skipping {len(done)} cells already in {', '.join(args.resume)}")
+    n_cells = sum(len(unit) for unit in units)
+    mode = "direct calls" if args.direct else "Batch API"
+    print(f"Lockstep sweep {args.spec}: {n_cells} games in {len(units)} units via {mode}", flush=True)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    date_string = datetime.now().strftime("%y%m%d")
+    file_path = results_path(os.path.join(args.output_dir, f"{date_string}_regulated_lockstep.csv"))
+    submitter = BatchSubmitter(
+        use_batch_api=not args.direct, batch_api_base=args.batch_api_base,
+        poll_interval=args.poll_interval, timeout=args.batch_timeout,
+        fallback_concurrency=args.fallback_concurrency,
+    )
+    started = time.monotonic()
+    scheduler = LockstepScheduler(submitter, file_path, max_game_bytes=args.max_game_kib * 1024,
+                                  max_games_in_flight=args.max_games_in_flight)
+    games = scheduler.run(units)
+    cascade = get_intent_cascade()
+    if cascade is not None:
+        cascade.log_stats()
+
+    failed = [game.cell.key for game in games if game.error is not None]
+    failed += [cell.key for cell in (c for unit in units for c in unit)
+               if cell.key not in {game.cell.key for game in games}]
+    cost = sum(game.usage.total_cost for game in games)
+    print(f"✓ {n_cells - len(failed)} games completed, {len(failed)} failed in "
+          f"{time.monotonic() - started:.1f}s, ${cost:.4f} -> {file_path}")
+    for key in failed[:20]:
+        print(f"  failed: {key}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Play a sweep in lockstep, submitting each round phase of all games as Batch API jobs"
+    )
+    parser.add_argument("spec", type=str, help="Path to the sweep spec (see sweeps/)")
+    parser.add_argument("--output_dir", type=str, default="data/outputs")
+    parser.add_argument("--direct", action="store_true",
+                       help="Skip the Batch API and send each phase as concurrent direct calls")
+    parser.add_argument("--batch_api_base", type=str, required=False,
+                       help="Batch API endpoint if it differs from the chat endpoint (or MBTI_BATCH_API_BASE)")
+    parser.add_argument("--poll_interval", type=float, default=10.0, help="Seconds between batch status polls")
+    parser.add_argument("--batch_timeout", type=float, default=24 * 3600,
+                       help="Cancel a batch (and call directly) after this many seconds")
+    parser.add_argument("--fallback_concurrency", type=int, default=16,
+                       help="Threads for direct calls of requests a batch did not answer")
+    parser.add_argument("--max_game_kib", type=int, default=DEFAULT_MAX_GAME_BYTES // 1024,
+                       help="Fail a game whose state (record plus referenced texts) exceeds this size")
+    parser.add_argument("--max_games_in_flight", type=int, default=DEFAULT_MAX_GAMES_IN_FLIGHT,
+                       help="Play the sweep in chunks of at most this many concurrent games")
+    parser.add_argument("--resume", type=str, nargs="+", required=False,
+                       help="Result CSVs whose cells are skipped")
+    parser.add_argument("--event_log", type=str, required=False,
+                       help="Append game events to this JSONL file (follow with event_log.py)")
+    parser.add_argument("--api_base", type=str, required=False,
+                       help="OpenAI-compatible endpoint (default: OpenRouter, or MBTI_API_BASE)")
+    main(parser.parse_args())
@@ -0,0 +1,171 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Non-blocking logging: a QueueHandler on the hot path, a QueueListener thread doing the I/O,
+# and per-game context (game id, round, agent) carried in a context variable
+
+import atexit
+import contextlib
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+from contextvars import ContextVar
+
+# Log level of every entry point and of its worker processes (default INFO)
+LOG_LEVEL_ENV = "MBTI_LOG_LEVEL"
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s%(context)s: %(message)s"
+
+# Context of the game being played by the current thread / task
+_log_context: ContextVar[dict] = ContextVar("mbti_log_context", default={})
+
+# API keys (sk-..., sk-or-v1-...) never reach a log line, not even as a prefix
+_SECRET_PATTERN = re.compile(r"sk-[A-Za-z0-9_\-]{4,}")
+
+_listener = None
+_listener_pid = None
+
+
+def set_log_context(**fields):
+    """
+    Add fields (game_id, round, agent) to the log context of the current thread / task.
+
+    LangGraph runs every node in a copy of the caller's context, so a node can set its own
+    round and agent without affecting other nodes or games.
+    """
+    _log_context.set({**_log_context.get(), **fields})
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """
+    Log context for the duration of a with-block (e.g. one game).
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Attach the game context to each record and redact API keys.
+
+    Runs on the producing thread (attached to the QueueHandler), where the context is known.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        record.game_id = context.get("game_id")
+        record.round = context.get("round")
+        record.agent = context.get("agent")
+        parts = []
+        if record.game_id:
+            parts.append(f"game={record.game_id[:8]}")
+        if record.round is not None:
+            parts.append(f"round={record.round}")
+        if record.agent:
+            parts.append(f"agent={record.agent}")
+        record.context = f" [{' '.join(parts)}]" if parts else ""
+        message = record.getMessage()
+        if "sk-" in message:
+            record.msg, record.args = _SECRET_PATTERN.sub("sk-***", message), None
+        return True
+
+
+class _CurrentStderrHandler(logging.StreamHandler):
+    """
+    Writes to whatever sys.stderr is when the record is emitted, so workers that redirect
+    stderr into their log file also receive their log records there.
+    """
+
+    def __init__(self):
+        super().__init__(sys.stderr)
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def setup_logging(level: str = None, log_file: str = None):
+    """
+    Route all records through a queue to a listener thread that writes them to stderr
+    (and optionally a file).
+
+    Safe to call again, e.g. at the start of every worker process: a process forked from a
+    configured parent gets a fresh queue and listener (the parent's listener thread does not
+    survive the fork).
+
+    Args:
+        level (str, optional): Log level name (default: MBTI_LOG_LEVEL, or INFO)
+        log_file (str, optional): Also append the records to this file
+    """
+    global _listener, _listener_pid
+    level = (level or os.getenv(LOG_LEVEL_ENV) or "INFO").upper()
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+
+    handlers = [_CurrentStderrHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    formatter = logging.Formatter(LOG_FORMAT, datefmt="%H:%M:%S")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # Per-request client logs are noise at INFO
+    for name in ("httpx", "httpcore", "httpx2", "httpcore2", "openai"):
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+    if _listener_pid is None:
+        atexit.register(stop_logging)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener_pid = os.getpid()
+    _listener.start()
+
+
+def stop_logging():
+    """
+    Write out the queued records and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener = None
+
+
+@contextlib.contextmanager
+def worker_logging(log_path: str):
+    """
+    Send a worker's stdout, stderr and log records to its own log file.
+
+    The listener is stopped (and its queue written out) before the file is closed, since
+    worker processes exit without running atexit handlers.
+    """
+    with open(log_path, "a", buffering=1) as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        setup_logging()
+        try:
+            yield
+        finally:
+            stop_logging()
@@ -9,14 +9,28 @@
 import argparse
 import json
 from datetime import datetime
-from run_regulated_game import run_regulated_game
 
 
 def main(args):
     """
     Main function to run regulated game experiments.
     """
+    # Imported here so that `main.py --help` does not pay for langchain/langgraph/pandas
+    from run_regulated_game import run_regulated_game
+    from logging_setup import setup_logging
+    from parquet_store import results_path
     import sys
+    import os
+    
+    setup_logging(args.log_level)
+    if args.api_base:
+        # Picked up by models.get_api_base() for every model created in this process
+        os.environ["MBTI_API_BASE"] = args.api_base
+    if args.request_timeout:
+        os.environ["MBTI_REQUEST_TIMEOUT"] = str(args.request_timeout)
+    if args.hedge:
+        from request_executor import ExecutorSettings, configure_executor
+        configure_executor(ExecutorSettings(hedge=True))
     sys.stdout.flush()  # 确保输出立即刷新
     
     print("🚀 程序开始运行...", flush=True)
@@ -24,10 +38,9 @@ def main(args):
     date_string = datetime.now().strftime("%y%m%d")
     output_dir = "data/outputs/"
     base_game_state_path = f"{date_string}_regulated"
-    game_state_path = output_dir + f"{base_game_state_path}.csv"
+    game_state_path = results_path(output_dir + f"{base_game_state_path}.csv")
     
     # Ensure output directory exists
-    import os
     os.makedirs(output_dir, exist_ok=True)
     
     print("=" * 80, flush=True)
@@ -39,6 +52,8 @@ def main(args):
     print(f"Base Game: {args.game_name}", flush=True)
     print(f"Variant Type: {args.variant_type}", flush=True)
     print(f"Rounds: {args.rounds}", flush=True)
+    if args.api_base:
+        print(f"API Base: {args.api_base}", flush=True)
     print("=" * 80, flush=True)
     print("⏳ 正在初始化游戏...", flush=True)
     
@@ -81,7 +96,7 @@ if __name__ == "__main__":
         personality_choices = ["INTJ", "ENFP", "ESTJ", "ISFP", "ENTP", "ISFJ", "ESTP", "INFJ", "INTP", "ESFP", "ENTJ", "INFP", "ESFJ", "ISTP", "ENFJ", "ISTJ", "NONE", "EXPERT"]
     
     game_names = ["prisoners_dilemma", "stag_hunt", "generic", "chicken", "coordination", "hawk_dove", "deadlock", "battle_of_sexes"]
-    variant_types = ["complex", "contextual", "multi_stage"]
+    variant_types = ["complex", "contextual", "multi_stage", "base"]
     
     parser = argparse.ArgumentParser(
         description="Run regulated game experiments with regulator agent generating variants"
@@ -123,8 +138,23 @@ if __name__ == "__main__":
                        help="Base game to play", 
                        required=True)
     parser.add_argument("--variant_type", choices=variant_types, 
-                       help="Type of variant to generate", 
+                       help="Type of variant to generate ('base' plays the unmodified base game)", 
                        default="complex")
     
+    
+    # Endpoint settings
+    parser.add_argument("--api_base", type=str, 
+                       help="OpenAI-compatible endpoint (default: OpenRouter, or MBTI_API_BASE), "
+                            "e.g. http://127.0.0.1:8008/v1 for local_openai_server.py", 
+                       required=False)
+    parser.add_argument("--request_timeout", type=float, 
+                       help="Per-request client timeout in seconds (default 60)", 
+                       required=False)
+    parser.add_argument("--hedge", action="store_true", 
+                       help="Send a duplicate request when a call exceeds the observed p95 latency")
+    parser.add_argument("--log_level", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                       help="Log level (default: MBTI_LOG_LEVEL, or INFO; DEBUG shows every round)",
+                       required=False)
+    
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,372 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Streaming lexical features of player messages and variant descriptions: length, lexicon
+# counts, sentiment and hashed n-gram vectors, written to the columnar store
+
+import argparse
+import ast
+import glob
+import logging
+import os
+import time
+import zlib
+
+import numpy as np
+
+from parquet_store import PARQUET_SUFFIX, dataset_files, is_parquet
+
+logger = logging.getLogger(__name__)
+
+AGENTS = ("agent_1", "agent_2")
+# Columns copied from each game to each of its feature rows (when the input has them)
+GAME_COLUMNS = ("game_id", "cell_key", "game_name", "variant_type", "regulator_model")
+
+DEFAULT_HASH_BITS = 18
+DEFAULT_BATCH_SIZE = 1_000  # Games per batch; bounds memory (about 250 MiB at ~30 words per message)
+
+LEXICONS = {
+    "hedge": (
+        "maybe", "perhaps", "might", "possibly", "probably", "likely", "unlikely", "unsure",
+        "uncertain", "seems", "seem", "somewhat", "guess", "suppose", "depends", "consider",
+        "considering", "could", "may", "hopefully", "wonder", "unclear", "tentatively",
+    ),
+    "commitment": (
+        "will", "i'll", "we'll", "promise", "commit", "committed", "commitment", "guarantee",
+        "definitely", "certainly", "absolutely", "surely", "always", "pledge", "vow", "must",
+        "intend", "firmly", "count", "assure", "rely", "word",
+    ),
+    "cooperation": (
+        "cooperate", "cooperation", "cooperating", "cooperative", "together", "trust", "mutual",
+        "mutually", "both", "share", "fair", "team", "partner", "partnership", "collaborate",
+        "collaboration", "we", "us", "our", "benefit", "win-win", "jointly", "agree", "agreement",
+        "reciprocate", "coordinate", "stag",
+    ),
+    "threat": (
+        "defect", "defecting", "defection", "punish", "punishment", "retaliate", "retaliation",
+        "betray", "betrayal", "revenge", "consequences", "consequence", "warn", "warning", "threat",
+        "otherwise", "exploit", "exploited", "regret", "pay", "lose", "tit-for-tat", "hare",
+    ),
+}
+
+# Small valence lexicon (AFINN-style weights in -3..3)
+SENTIMENT = {
+    "good": 2, "great": 3, "excellent": 3, "happy": 3, "glad": 3, "pleased": 3, "hope": 2,
+    "trust": 1, "fair": 2, "benefit": 2, "best": 3, "better": 2, "win": 3, "gain": 2,
+    "thanks": 2, "thank": 2, "appreciate": 2, "positive": 2, "friendly": 2, "safe": 1,
+    "reward": 2, "success": 2, "successful": 3, "like": 2, "love": 3, "agree": 1, "honest": 2,
+    "bad": -3, "worse": -3, "worst": -3, "lose": -3, "loss": -3, "risk": -2, "risky": -2,
+    "betray": -3, "betrayal": -3, "punish": -2, "punishment": -2, "regret": -2, "sorry": -1,
+    "unfair": -2, "fear": -2, "afraid": -2, "worried": -3, "suspicious": -2, "distrust": -3,
+    "exploit": -2, "threat": -2, "harm": -2, "hurt": -2, "angry": -3, "disappointed": -2,
+    "selfish": -3, "greedy": -2, "cheat": -3, "danger": -2, "dangerous": -2,
+}
+
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+_BIGRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_MIX_MULTIPLIER = np.uint64(0xBF58476D1CE4E5B9)
+
+
+def token_hashes(data: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    64-bit polynomial hashes of many byte strings at once: token i is data[starts[i]:ends[i]]
+    (non-empty) and hashes to sum((byte_j + 1) * M^(len - 1 - j)) mod 2^64.
+    """
+    lengths = ends - starts
+    if not len(lengths):
+        return np.zeros(0, dtype=np.uint64)
+    first = np.cumsum(lengths) - lengths  # Where each token starts among the gathered bytes
+    positions = np.arange(int(lengths.sum())) + np.repeat(starts - first, lengths)
+    exponents = np.repeat(ends, lengths) - 1 - positions
+    with np.errstate(over="ignore"):
+        powers = np.cumprod(np.full(int(lengths.max()), _HASH_MULTIPLIER, dtype=np.uint64))
+        powers = np.concatenate([np.ones(1, dtype=np.uint64), powers[:-1]])
+        terms = (data[positions].astype(np.uint64) + np.uint64(1)) * powers[exponents]
+        return np.add.reduceat(terms, first)
+
+
+def _string_hashes(words) -> np.ndarray:
+    encoded = [word.encode("utf-8") for word in words]
+    lengths = np.array([len(word) for word in encoded])
+    ends = np.cumsum(lengths)
+    return token_hashes(np.frombuffer(b"".join(encoded), dtype=np.uint8), ends - lengths, ends)
+
+
+def _lexicon_table() -> tuple:
+    """
+    One sorted table over all lexicon words: (hashes, lexicon membership bits, valence).
+    """
+    words = sorted({*SENTIMENT, *(word for words in LEXICONS.values() for word in words)})
+    members = np.array([sum(1 << bit for bit, lexicon in enumerate(LEXICONS.values()) if word in lexicon)
+                        for word in words], dtype=np.uint8)
+    valences = np.array([SENTIMENT.get(word, 0) for word in words], dtype=np.float64)
+    hashes = _string_hashes(words)
+    order = np.argsort(hashes)
+    return hashes[order], members[order], valences[order]
+
+
+def _byte_table(characters: str) -> np.ndarray:
+    table = np.zeros(256, dtype=bool)
+    table[list(characters.encode())] = True
+    return table
+
+
+# Tokens are runs of these bytes, lowercased: [a-z0-9_'] as intent_classifier.tokenize (any
+# non-ASCII character separates tokens)
+_TOKEN_BYTES = _byte_table("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_'")
+_UPPER_BYTES = _byte_table("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+
+def tokenize(texts) -> tuple:
+    """
+    Token boundaries of an Arrow string array, found directly in its UTF-8 buffer.
+
+    Returns:
+        tuple: (lowercased bytes, token starts, token ends, index of each token's text)
+    """
+    _, offsets, data = texts.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int32)[texts.offset:texts.offset + len(texts) + 1]
+    data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+    data = data[offsets[0]:offsets[-1]]
+    offsets = offsets - offsets[0]
+    in_token = _TOKEN_BYTES[data]
+    # A token never continues across the end of a text
+    continues = np.concatenate([[False], in_token[:-1]])
+    continues[offsets[:-1][offsets[:-1] < len(data)]] = False
+    starts = np.flatnonzero(in_token & ~continues)
+    continued = np.concatenate([(in_token & continues)[1:], [False]])
+    ends = np.flatnonzero(in_token & ~continued) + 1
+    parent = np.searchsorted(offsets, starts, side="right") - 1
+    lowered = data | (_UPPER_BYTES[data].astype(np.uint8) << 5)
+    return lowered, starts, ends, parent
+
+
+def feature_schema():
+    import pyarrow as pa
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        pa.field("game_id", pa.string()),
+        pa.field("cell_key", pa.string()),
+        pa.field("game_name", category),
+        pa.field("variant_type", category),
+        pa.field("regulator_model", category),
+        pa.field("source", category),  # agent_1, agent_2 or variant
+        pa.field("personality", category),  # The speaker (null for variant descriptions)
+        pa.field("round", pa.int16()),
+        pa.field("n_chars", pa.int32()),
+        pa.field("n_tokens", pa.int32()),
+        *(pa.field(name, pa.int32()) for name in LEXICONS),
+        pa.field("sentiment", pa.float32()),  # Sum of token valences
+        pa.field("ngram_buckets", pa.list_(pa.int32())),  # Hashed unigrams and bigrams, sparse
+        pa.field("ngram_counts", pa.list_(pa.int32())),
+    ])
+
+
+class FeatureExtractor:
+    """
+    Turns batches of result rows into feature rows (one per message and one per variant
+    description), fully vectorized over the batch: texts are tokenized and hashed in numpy on
+    their UTF-8 buffer, lexicons are matched by hash and n-grams are bucketed into 2^hash_bits
+    dimensions.
+    """
+
+    def __init__(self, hash_bits: int = DEFAULT_HASH_BITS):
+        self.hash_bits = hash_bits
+        self.lexicon_hashes, self.lexicon_members, self.valences = _lexicon_table()
+        self.schema = feature_schema()
+
+    def _texts(self, batch):
+        """
+        All texts of a batch with, for each, the game row, source, speaker and round.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        names = batch.schema.names
+        texts, rows, sources, personalities, rounds = [], [], [], [], []
+        for index, agent in enumerate(AGENTS):
+            column = f"{agent}_messages"
+            if column not in names:
+                continue
+            messages = batch.column(column)
+            lengths = pc.fill_null(pc.list_value_length(messages), 0).to_numpy()
+            row = np.repeat(np.arange(len(batch)), lengths)
+            starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            texts.append(pc.list_flatten(messages))
+            rows.append(row)
+            rounds.append(np.arange(len(row)) - starts + 1)
+            sources.append(np.full(len(row), index))
+            personality = f"personality_{index + 1}"
+            speaker = batch.column(personality) if personality in names else pa.nulls(len(batch), pa.string())
+            personalities.append(pc.take(pc.cast(speaker, pa.string()), pa.array(row)))
+        if "variant_description" in names:
+            descriptions = batch.column("variant_description")
+            row = np.flatnonzero(pc.is_valid(descriptions).to_numpy(zero_copy_only=False))
+            texts.append(pc.take(descriptions, pa.array(row)))
+            rows.append(row)
+            rounds.append(np.zeros(len(row), dtype=np.int64))
+            sources.append(np.full(len(row), len(AGENTS)))
+            personalities.append(pa.nulls(len(row), pa.string()))
+        if not texts:
+            return None
+        texts = pc.fill_null(pa.concat_arrays([pc.cast(text, pa.string()) for text in texts]), "")
+        return (texts, np.concatenate(rows), np.concatenate(sources),
+                pa.concat_arrays(personalities), np.concatenate(rounds))
+
+    def _ngrams(self, parent: np.ndarray, hashes: np.ndarray, n_texts: int) -> tuple:
+        import pyarrow as pa
+
+        same_text = parent[1:] == parent[:-1]
+        with np.errstate(over="ignore"):
+            bigrams = hashes[:-1][same_text] * _BIGRAM_MULTIPLIER + hashes[1:][same_text]
+            grams = np.concatenate([hashes, bigrams]) * _MIX_MULTIPLIER
+        buckets = (grams >> np.uint64(64 - self.hash_bits)).astype(np.int64)
+        owners = np.concatenate([parent, parent[:-1][same_text]])
+        keys, counts = np.unique(owners << self.hash_bits | buckets, return_counts=True)
+        offsets = np.zeros(n_texts + 1, dtype=np.int32)
+        np.cumsum(np.bincount(keys >> self.hash_bits, minlength=n_texts), out=offsets[1:])
+        bucket_values = (keys & ((1 << self.hash_bits) - 1)).astype(np.int32)
+        return (pa.ListArray.from_arrays(pa.array(offsets), pa.array(bucket_values)),
+                pa.ListArray.from_arrays(pa.array(offsets), pa.array(counts.astype(np.int32))))
+
+    def transform(self, batch):
+        """
+        Feature rows of a RecordBatch of result rows, as a RecordBatch in `feature_schema()`
+        (None if the batch has no texts).
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        found = self._texts(batch)
+        if found is None or not len(found[0]):
+            return None
+        texts, rows, sources, personalities, rounds = found
+        n_texts = len(texts)
+
+        data, starts, ends, parent = tokenize(texts)
+        hashes = token_hashes(data, starts, ends)
+
+        columns = {}
+        for column in GAME_COLUMNS:
+            values = batch.column(column) if column in batch.schema.names else pa.nulls(len(batch), pa.string())
+            columns[column] = pc.take(pc.cast(values, pa.string()), pa.array(rows))
+        columns["source"] = pc.take(pa.array([*AGENTS, "variant"]), pa.array(sources))
+        columns["personality"] = personalities
+        columns["round"] = pa.array(rounds.astype(np.int16), mask=sources == len(AGENTS))
+        columns["n_chars"] = pc.cast(pc.utf8_length(texts), pa.int32())
+        columns["n_tokens"] = pa.array(np.bincount(parent, minlength=n_texts).astype(np.int32))
+        position = np.minimum(np.searchsorted(self.lexicon_hashes, hashes), len(self.lexicon_hashes) - 1)
+        hits = self.lexicon_hashes[position] == hashes
+        hit_parent, members = parent[hits], self.lexicon_members[position[hits]]
+        for bit, name in enumerate(LEXICONS):
+            found = (members >> bit & 1).astype(bool)
+            columns[name] = pa.array(np.bincount(hit_parent[found], minlength=n_texts).astype(np.int32))
+        columns["sentiment"] = pa.array(
+            np.bincount(hit_parent, weights=self.valences[position[hits]], minlength=n_texts).astype(np.float32)
+        )
+        columns["ngram_buckets"], columns["ngram_counts"] = self._ngrams(parent, hashes, n_texts)
+
+        arrays = [pc.cast(columns[field.name], field.type) for field in self.schema]
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+def _input_columns(names: list) -> list:
+    wanted = [*GAME_COLUMNS, "personality_1", "personality_2", "variant_description",
+              *(f"{agent}_messages" for agent in AGENTS)]
+    return [column for column in wanted if column in names]
+
+
+def _legacy_messages(value) -> list:
+    if not isinstance(value, str) or not value:
+        return []
+    return [str(message) for message in ast.literal_eval(value)]
+
+
+def iter_batches(path: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Stream the message columns of a Parquet dataset (or a legacy result CSV) as RecordBatches
+    of at most `batch_size` games; only the current batch is held in memory.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if is_parquet(path):
+        for file in dataset_files(path):
+            parquet_file = pq.ParquetFile(file, memory_map=True)
+            columns = _input_columns(parquet_file.schema_arrow.names)
+            yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+        return
+
+    import pandas as pd
+
+    header = pd.read_csv(path, nrows=0).columns
+    columns = _input_columns(list(header))
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=batch_size, dtype=str):
+        arrays = {}
+        for column in columns:
+            if column.endswith("_messages"):
+                arrays[column] = pa.array([_legacy_messages(value) for value in chunk[column]],
+                                          type=pa.list_(pa.string()))
+            else:
+                arrays[column] = pa.array(chunk[column].where(chunk[column].notna(), None), type=pa.string())
+        yield pa.RecordBatch.from_pydict(arrays)
+
+
+def _part_path(output: str, path: str) -> str:
+    # A fixed part name per input makes re-running the extraction replace, not duplicate, its rows
+    stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    return os.path.join(output, f"part-{stem}-{zlib.crc32(os.path.abspath(path).encode()):08x}.parquet")
+
+
+def extract(path: str, output: str, extractor: FeatureExtractor, batch_size: int = DEFAULT_BATCH_SIZE) -> tuple:
+    """
+    Write the features of all texts of one result dataset or CSV to its part file in the
+    Parquet dataset `output`, one row group per input batch.
+
+    Returns:
+        tuple: (part file, number of games, number of feature rows)
+    """
+    import pyarrow.parquet as pq
+
+    os.makedirs(output, exist_ok=True)
+    part = _part_path(output, path)
+    games = rows = 0
+    started = time.monotonic()
+    with pq.ParquetWriter(part + ".tmp", extractor.schema, compression="zstd") as writer:
+        for batch in iter_batches(path, batch_size):
+            games += len(batch)
+            features = extractor.transform(batch)
+            if features is not None:
+                writer.write_batch(features)
+                rows += len(features)
+            logger.debug("%s: %d games, %d texts (%.1fs)", path, games, rows, time.monotonic() - started)
+    # Written under a temporary name so readers never see a partial file
+    os.replace(part + ".tmp", part)
+    return part, games, rows
+
+
+def main(args):
+    from logging_setup import setup_logging
+
+    setup_logging()
+    paths = sorted({path for pattern in args.results for path in (glob.glob(pattern) or [pattern])})
+    extractor = FeatureExtractor(args.hash_bits)
+    for path in paths:
+        started = time.monotonic()
+        part, games, rows = extract(path, args.output, extractor, args.batch_size)
+        elapsed = time.monotonic() - started
+        print(f"{path}: {games} games, {rows} texts -> {part} ({elapsed:.1f}s, {rows / max(elapsed, 1e-9):,.0f} texts/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract lexical features of messages and variant descriptions")
+    parser.add_argument("results", nargs="+", help="Parquet datasets or legacy result CSVs (glob patterns allowed)")
+    parser.add_argument("--output", type=str, default="data/analysis/message_features" + PARQUET_SUFFIX,
+                        help="Feature dataset directory (one part file per input, replaced on re-runs)")
+    parser.add_argument("--hash_bits", type=int, default=DEFAULT_HASH_BITS,
+                        help="Hashed n-gram vectors have 2^hash_bits dimensions")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE, help="Games per streamed batch")
+    main(parser.parse_args())
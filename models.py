@@ -10,33 +10,114 @@
 import logging
 import os
 import sys
+import threading
+from functools import lru_cache
 
 # Independent project - load .env from current directory only
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
-from dotenv import load_dotenv
-from langchain.chat_models import init_chat_model
+# Set once the .env file has been loaded; importing this module has no side effects
+_ENV_LOADED = False
 
-# Load .env from current directory only (independent project)
-current_env_path = os.path.join(current_dir, '.env')
+OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
 
-if os.path.exists(current_env_path):
-    load_dotenv(current_env_path, override=True)
-    print(f"✓ Loaded .env from current directory: {current_env_path}")
-else:
-    # Fallback to system environment variables
-    load_dotenv()
-    print("⚠️ No .env file found, using system environment variables")
+# Override the chat-completions endpoint, e.g. http://127.0.0.1:8008/v1 for local_openai_server.py
+API_BASE_ENV = "MBTI_API_BASE"
+# Key sent to a non-OpenRouter endpoint (the local stand-in accepts any key)
+API_KEY_ENV = "MBTI_API_KEY"
+# Per-request client timeout in seconds (default 60)
+REQUEST_TIMEOUT_ENV = "MBTI_REQUEST_TIMEOUT"
+
+logger = logging.getLogger(__name__)
+
+
+def load_environment() -> None:
+    """
+    Load the project .env file (or fall back to the system environment) once per process.
+    Called lazily by get_model_by_id_and_provider so that importing this module stays cheap.
+    """
+    global _ENV_LOADED
+    if _ENV_LOADED:
+        return
+    from dotenv import load_dotenv
+
+    # Load .env from current directory only (independent project)
+    current_env_path = os.path.join(current_dir, '.env')
+
+    if os.path.exists(current_env_path):
+        load_dotenv(current_env_path, override=True)
+        logger.info("Loaded .env from current directory: %s", current_env_path)
+    else:
+        # Fallback to system environment variables
+        load_dotenv()
+        logger.info("No .env file found, using system environment variables")
+    _ENV_LOADED = True
+
+
+def get_api_base() -> str:
+    """
+    Return the chat-completions endpoint: MBTI_API_BASE if set, OpenRouter otherwise.
+    """
+    load_environment()
+    return (os.getenv(API_BASE_ENV) or OPENROUTER_API_BASE).rstrip("/")
+
+
+@lru_cache(maxsize=None)
+def _get_cached_model(model_id: str, provider: str, api_base: str, timeout: str):
+    return get_model_by_id_and_provider(model_id, provider=provider)
+
+
+def get_cached_model(model_id: str, provider: str = None):
+    """
+    Shared model client for (model, provider, endpoint, timeout), created once per process.
+    
+    Chat model clients are thread-safe, so all games of a process can share one client (and its
+    connection pool) instead of constructing a new one per game.
+    
+    Args:
+        model_id (str): The model ID (e.g., "gpt-4o", "gpt-4o-mini")
+        provider (str, optional): The model provider
+    
+    Returns:
+        Model instance
+    """
+    return _get_cached_model(model_id, provider, get_api_base(), os.getenv(REQUEST_TIMEOUT_ENV))
+
+
+_structured_models = {}  # (id(model), schema, method, include_raw) -> (model, runnable)
+_structured_models_lock = threading.Lock()
+
+
+def get_structured_model(model, schema, method: str = "json_schema", include_raw: bool = False):
+    """
+    `model.with_structured_output(schema, method=method, include_raw=include_raw)`, bound once
+    per model and schema and reused by every call (the runnable holds no per-call state).
+    
+    Args:
+        model: Model client (see get_cached_model)
+        schema: Pydantic class of the expected response
+        method (str): Structured-output method ("json_schema" works with OpenRouter)
+        include_raw (bool): Return {"raw", "parsed", "parsing_error"} instead of the parsed object
+    
+    Returns:
+        Runnable: The structured-output runnable
+    """
+    key = (id(model), schema, method, include_raw)
+    with _structured_models_lock:
+        if key not in _structured_models:
+            # Keeping the model referenced keeps its id from being reused by another object
+            _structured_models[key] = (model, model.with_structured_output(
+                schema, method=method, include_raw=include_raw
+            ))
+        return _structured_models[key][1]
 
-# Set all env vars to have the same name automatically
-for k, v in os.environ.items():
-    os.environ[k] = v
 
 def get_model_by_id_and_provider(model_id: str, provider: str = None):
     """
     Get a model by ID and provider.
     Uses OpenRouter API if OPENROUTER_API_KEY is set.
-    FORCES use of OpenRouter - no fallback to OpenAI.
+    FORCES use of OpenRouter - no fallback to OpenAI - unless MBTI_API_BASE selects
+    another OpenAI-compatible endpoint (e.g. the local stand-in server).
     
     Args:
         model_id (str): The model ID (e.g., "gpt-4o", "gpt-4o-mini")
@@ -45,30 +126,35 @@ def get_model_by_id_and_provider(model_id: str, provider: str = None):
     Returns:
         Model instance
     """
+    api_base = get_api_base()
+    is_openrouter = api_base == OPENROUTER_API_BASE
+    
     # Check if OpenRouter API key is available
     openrouter_key = os.getenv("OPENROUTER_API_KEY", "")
+    if not is_openrouter:
+        # Custom endpoints do not need an OpenRouter key
+        openrouter_key = os.getenv(API_KEY_ENV) or openrouter_key or "sk-local-standin"
     
     # Use OpenRouter if key exists and is valid
     use_openrouter = openrouter_key and openrouter_key.strip() and openrouter_key.startswith("sk-or-v1")
     
-    if not use_openrouter:
+    if is_openrouter and not use_openrouter:
+        # Never include (a prefix of) the key itself in the message
         raise ValueError(
-            f"OPENROUTER_API_KEY is not set or invalid. "
-            f"Current value: {openrouter_key[:20] if openrouter_key else 'Not set'}... "
+            f"OPENROUTER_API_KEY is {'invalid' if openrouter_key else 'not set'}. "
             f"Please set a valid OpenRouter API key (starts with 'sk-or-v1-') in your .env file."
         )
     
-    # Debug: Print OpenRouter key prefix
-    print(f"🔑 Using OpenRouter key: {openrouter_key[:20]}...")
-    
     properties = {
         "temperature": 0,
-        "max_retries": 5,  # Increased retries for rate limit handling
-        "timeout": 60  # Add timeout
+        "max_retries": 0,  # Retries are owned by request_executor (AIMD + Retry-After aware backoff)
+        # Single client timeout (seconds); slow tails are cut by request_executor hedging instead
+        "timeout": float(os.getenv(REQUEST_TIMEOUT_ENV) or 60)
     }
     
     # Force use OpenRouter (no fallback)
     from langchain_openai import ChatOpenAI
+    from http_pool import get_async_http_client, get_http_client
     
     # Convert model_id to OpenRouter format
     # If model_id doesn't have a provider prefix, check if it's OpenAI format
@@ -80,7 +166,7 @@ def get_model_by_id_and_provider(model_id: str, provider: str = None):
         # Already in OpenRouter format (e.g., "meta-llama/llama-3.1-8b-instruct")
         openrouter_model = model_id
     
-    print(f"🌐 Using OpenRouter API - Model: {openrouter_model}")
+    logger.info("Using %s - Model: %s", "OpenRouter API" if is_openrouter else api_base, openrouter_model)
     
     # CRITICAL: Explicitly prevent OpenAI fallback by temporarily removing OpenAI key
     # This is essential because ChatOpenAI may check environment variables during initialization
@@ -103,13 +189,15 @@ def get_model_by_id_and_provider(model_id: str, provider: str = None):
         model = ChatOpenAI(
             model=openrouter_model,
             openai_api_key=openrouter_key,  # Use OpenRouter key explicitly
-            openai_api_base="https://openrouter.ai/api/v1",  # Force OpenRouter endpoint
+            openai_api_base=api_base,  # Force OpenRouter endpoint (or MBTI_API_BASE)
             openai_organization=None,  # Explicitly set to None to prevent OpenAI org usage
             temperature=properties["temperature"],
             max_retries=properties["max_retries"],
             timeout=properties["timeout"],
-            request_timeout=120,  # Increase request timeout for long-running requests
             seed=42,  # Seed for reproducibility
+            # One keep-alive (HTTP/2) connection pool per process, shared by all models
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
             default_headers={
                 "HTTP-Referer": "https://github.com/your-repo/MBTI-Regulator-Experiment",
                 "X-Title": "MBTI Regulator Experiment",
@@ -124,7 +212,7 @@ def get_model_by_id_and_provider(model_id: str, provider: str = None):
         
         # CRITICAL: Verify the model is using OpenRouter IMMEDIATELY after creation
         # This must happen BEFORE environment variables are restored in finally block
-        expected_base_url = "https://openrouter.ai/api/v1"
+        expected_base_url = api_base
         actual_base_url = model.openai_api_base
         
         # CRITICAL: Check the underlying client's base_url and API key FIRST
@@ -137,11 +225,8 @@ def get_model_by_id_and_provider(model_id: str, provider: str = None):
             if hasattr(model.client._client, 'api_key'):
                 actual_api_key = str(model.client._client.api_key)
             
-            # Debug output
-            print(f"🔍 Model verification:")
-            print(f"   openai_api_base: {actual_base_url}")
-            print(f"   client._client.base_url: {client_base_url}")
-            print(f"   client._client.api_key prefix: {actual_api_key[:20] if actual_api_key else 'N/A'}...")
+            logger.debug("Model verification: openai_api_base=%s, client base_url=%s",
+                         actual_base_url, client_base_url)
             
             # Verify base_url
             if client_base_url != expected_base_url:
@@ -152,34 +237,14 @@ def get_model_by_id_and_provider(model_id: str, provider: str = None):
                 )
             
             # CRITICAL: Verify API key is OpenRouter key (not OpenAI key)
-            if actual_api_key and not actual_api_key.startswith('sk-or-v1-'):
-                # Try to fix it by recreating the client with correct configuration
-                print(f"⚠️ Warning: Model using wrong API key ({actual_api_key[:20]}...), recreating client...")
-                from openai import OpenAI
-                model.client._client = OpenAI(
-                    api_key=openrouter_key,
-                    base_url="https://openrouter.ai/api/v1",
-                    default_headers={
-                        "HTTP-Referer": "https://github.com/your-repo/MBTI-Regulator-Experiment",
-                        "X-Title": "MBTI Regulator Experiment"
-                    }
-                )
-                # Re-verify after recreation
-                actual_api_key_after = str(model.client._client.api_key)
-                client_base_url_after = str(model.client._client.base_url).rstrip('/')
-                if not actual_api_key_after.startswith('sk-or-v1-') or client_base_url_after != expected_base_url:
-                    raise ValueError(
-                        f"❌ Failed to recreate client with OpenRouter! "
-                        f"API key prefix: {actual_api_key_after[:20]}..., "
-                        f"Base URL: {client_base_url_after}"
-                    )
-                print(f"✅ Client recreated successfully with OpenRouter")
+            if is_openrouter and actual_api_key and not actual_api_key.startswith('sk-or-v1-'):
+                raise ValueError("❌ Model client is not using an OpenRouter API key!")
             
             # Explicitly set organization to None
             if hasattr(model.client._client, 'organization'):
                 model.client._client.organization = None
             
-            print(f"✅ Model verified: Using OpenRouter correctly")
+            logger.debug("Model verified: using %s", client_base_url)
         else:
             raise ValueError("❌ Model client structure is invalid! Cannot verify OpenRouter usage.")
         
@@ -0,0 +1,364 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Columnar result store: game results as typed, nested Parquet columns (pyarrow, optional),
+# the converter for legacy result CSVs and zero-copy Arrow exports
+
+import argparse
+import ast
+import glob
+import logging
+import math
+import os
+import time
+import uuid
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# "parquet" makes every result writer store its ".csv" results in the sibling ".parquet" dataset
+RESULTS_FORMAT_ENV = "MBTI_RESULTS_FORMAT"
+
+PARQUET_SUFFIX = ".parquet"
+
+SETUP_COLUMNS = ("game_name", "base_game_name", "variant_type", "regulator_model",
+                 "model_provider_1", "model_name_1", "model_provider_2", "model_name_2")
+# Tags set by the sweep runners; any other tag goes to the `extra_tags` map column
+TAG_COLUMNS = ("cell_key", "replicate", "pair_key", "seating", "worker_id", "tournament")
+# Per-round list columns of each game
+LIST_COLUMNS = tuple(
+    column
+    for agent in ("agent_1", "agent_2")
+    for column in (f"{agent}_scores", f"{agent}_messages", f"{agent}_actions",
+                   f"intent_{agent}", f"truthful_{agent}", f"analysis_{agent}")
+)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("The Parquet result store needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+@lru_cache(maxsize=None)
+def result_schema():
+    """
+    Arrow schema of one result row per game. Categorical strings (setup, personalities,
+    actions, intents) are dictionary encoded; per-round values are lists; the payoff table the
+    game was played with is a list of (action_1, action_2, payoff_1, payoff_2) structs.
+    """
+    pa = _pyarrow()
+    category = pa.dictionary(pa.int32(), pa.string())
+    action = pa.dictionary(pa.int8(), pa.string())
+    per_agent = []
+    for agent in ("agent_1", "agent_2"):
+        per_agent += [
+            pa.field(f"{agent}_scores", pa.list_(pa.int32())),
+            pa.field(f"{agent}_messages", pa.list_(pa.string())),
+            pa.field(f"{agent}_actions", pa.list_(action)),
+            pa.field(f"intent_{agent}", pa.list_(action)),
+            pa.field(f"truthful_{agent}", pa.list_(pa.bool_())),
+            pa.field(f"analysis_{agent}", pa.list_(pa.string())),
+        ]
+    return pa.schema([
+        *(pa.field(column, category) for column in SETUP_COLUMNS),
+        pa.field("game_id", pa.string()),
+        pa.field("personality_1", category),
+        pa.field("personality_2", category),
+        pa.field("total_rounds", pa.int32()),
+        *per_agent,
+        pa.field("total_tokens", pa.int64()),
+        pa.field("total_cost_USD", pa.float64()),
+        pa.field("variant_complexity", category),
+        pa.field("variant_description", pa.string()),
+        pa.field("variant_reasoning", pa.string()),
+        pa.field("payoff_matrix", pa.list_(pa.struct([
+            pa.field("action_1", action),
+            pa.field("action_2", action),
+            pa.field("payoff_1", pa.int32()),
+            pa.field("payoff_2", pa.int32()),
+        ]))),
+        pa.field("cell_key", pa.string()),
+        pa.field("replicate", pa.int32()),
+        pa.field("pair_key", pa.string()),
+        pa.field("seating", category),
+        pa.field("worker_id", category),
+        pa.field("tournament", category),
+        pa.field("extra_tags", pa.map_(pa.string(), pa.string())),
+    ])
+
+
+def results_path(file_path: str) -> str:
+    """
+    Where results meant for `file_path` are stored: the sibling ".parquet" dataset of a ".csv"
+    path when MBTI_RESULTS_FORMAT=parquet, the path itself otherwise.
+    """
+    if os.getenv(RESULTS_FORMAT_ENV, "csv").lower() == "parquet" and file_path.endswith(".csv"):
+        return file_path[:-len(".csv")] + PARQUET_SUFFIX
+    return file_path
+
+
+def is_parquet(path: str) -> bool:
+    return path.endswith(PARQUET_SUFFIX) or path.endswith(PARQUET_SUFFIX + os.sep)
+
+
+def _payoff_entries(payoff_matrix: dict) -> list:
+    if not payoff_matrix:
+        return None
+    return [
+        {"action_1": actions[0], "action_2": actions[1], "payoff_1": payoffs[0], "payoff_2": payoffs[1]}
+        for actions, payoffs in payoff_matrix.items()
+        if isinstance(actions, tuple) and len(actions) == 2
+    ]
+
+
+def result_record(end_state: dict, setup: dict, tags: dict = None) -> dict:
+    """
+    The result row of one game for the Parquet store: full texts (no quote rewriting or
+    truncation) and the payoff table the game was played with (setup["payoff_matrix"]).
+    """
+    tags = dict(tags or {})
+    record = {column: setup.get(column) for column in SETUP_COLUMNS}
+    record.update({
+        "game_id": end_state.get("game_id"),
+        "personality_1": end_state["personality_key_1"],
+        "personality_2": end_state["personality_key_2"],
+        "total_rounds": end_state["total_rounds"],
+        "total_tokens": end_state.get("total_tokens"),
+        "total_cost_USD": end_state.get("total_cost_USD"),
+        "variant_complexity": end_state.get("variant_complexity"),
+        "variant_description": end_state.get("variant_description"),
+        "variant_reasoning": end_state.get("variant_reasoning"),
+        "payoff_matrix": _payoff_entries(setup.get("payoff_matrix")),
+    })
+    for column in LIST_COLUMNS:
+        record[column] = list(end_state[column])
+    for column in TAG_COLUMNS:
+        record[column] = tags.pop(column, None)
+    record["extra_tags"] = {key: str(value) for key, value in tags.items()} or None
+    return record
+
+
+def records_to_table(records: list):
+    return _pyarrow().Table.from_pylist(records, schema=result_schema())
+
+
+def write_results(path: str, results: list):
+    """
+    Add the result rows of several games to the Parquet dataset at `path` (a directory), as one
+    new part file. Writers never rewrite existing parts, so threads and processes can share a
+    dataset; `compact` merges the parts.
+
+    Args:
+        path (str): Dataset directory (ending in .parquet)
+        results (list): (end_state, setup, tags) of each game, as in run_regulated_game.save_game_results
+    """
+    import pyarrow.parquet as pq
+
+    table = records_to_table([result_record(end_state, setup, tags) for end_state, setup, tags in results])
+    os.makedirs(path, exist_ok=True)
+    part = os.path.join(path, f"part-{time.strftime('%y%m%d%H%M%S')}-{uuid.uuid4().hex[:12]}.parquet")
+    # Written under a temporary name so readers never see a partial file
+    pq.write_table(table, part + ".tmp", compression="zstd")
+    os.replace(part + ".tmp", part)
+    return part
+
+
+def dataset_files(path: str) -> list:
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.parquet")))
+    return [path]
+
+
+def read_results(paths, columns: list = None):
+    """
+    Read one or more result datasets (directories or single .parquet files) as an Arrow table.
+
+    Args:
+        paths (str | list): Dataset paths
+        columns (list, optional): Columns to read (default: all)
+    """
+    import pyarrow.parquet as pq
+
+    pa = _pyarrow()
+    paths = [paths] if isinstance(paths, str) else paths
+    files = [file for path in paths for file in dataset_files(path)]
+    tables = [pq.read_table(file, columns=columns, memory_map=True) for file in files]
+    if not tables:
+        empty = result_schema().empty_table()
+        return empty.select(columns) if columns else empty
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def read_results_frame(path: str, columns: list = None):
+    """
+    Result rows of a CSV file or a Parquet dataset as a pandas DataFrame. Parquet list columns
+    come back as arrays; CSV list columns stay the repr strings of the legacy format.
+    """
+    import pandas as pd
+
+    if is_parquet(path):
+        return read_results(path, columns).to_pandas()
+    return pd.read_csv(path, usecols=columns)
+
+
+def compact(path: str) -> int:
+    """
+    Merge the part files of a dataset into one part.
+
+    Returns:
+        int: Number of rows
+    """
+    import pyarrow.parquet as pq
+
+    files = dataset_files(path)
+    if len(files) <= 1:
+        return read_results(path).num_rows
+    table = read_results(path).combine_chunks()
+    merged = os.path.join(path, f"part-{time.strftime('%y%m%d%H%M%S')}-{uuid.uuid4().hex[:12]}.parquet")
+    pq.write_table(table, merged + ".tmp", compression="zstd")
+    os.replace(merged + ".tmp", merged)
+    for file in files:
+        os.remove(file)
+    return table.num_rows
+
+
+def export_arrow(paths, output_path: str) -> int:
+    """
+    Write datasets to one uncompressed Arrow IPC file, which `open_arrow` memory-maps without
+    copying or decoding (Parquet pages always have to be decoded).
+    """
+    pa = _pyarrow()
+    table = read_results(paths)
+    with pa.OSFile(output_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return table.num_rows
+
+
+def open_arrow(path: str):
+    """
+    Memory-map an Arrow IPC file written by `export_arrow` as a table (zero-copy).
+    """
+    pa = _pyarrow()
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _legacy_list(value) -> list:
+    if _missing(value):
+        return []
+    return list(ast.literal_eval(value)) if isinstance(value, str) else list(value)
+
+
+def _legacy_int(value):
+    return None if _missing(value) else int(value)
+
+
+# Row-level columns of legacy CSVs besides the setup and list columns; the rest are tags
+_LEGACY_COLUMNS = ("game_id", "personality_1", "personality_2", "variant_complexity", "total_rounds",
+                   "total_tokens", "total_cost_USD", "variant_reasoning")
+
+
+def legacy_csv_records(csv_path: str) -> list:
+    """
+    Parse a legacy result CSV (lists stored as Python reprs) into result records.
+
+    What the CSV never stored stays null: the variant description and payoff table, the part of
+    the variant reasoning beyond 500 characters and the double quotes in messages (rewritten
+    to single quotes).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    records = []
+    for _, row in df.iterrows():
+        row = {key: (None if _missing(value) else value) for key, value in row.items()}
+        end_state = {
+            "game_id": row.get("game_id"),
+            "personality_key_1": row.get("personality_1"),
+            "personality_key_2": row.get("personality_2"),
+            "total_rounds": _legacy_int(row.get("total_rounds")),
+            "total_tokens": _legacy_int(row.get("total_tokens")),
+            "total_cost_USD": row.get("total_cost_USD"),
+            "variant_complexity": row.get("variant_complexity"),
+            "variant_reasoning": row.get("variant_reasoning"),
+        }
+        for column in LIST_COLUMNS:
+            end_state[column] = _legacy_list(row.get(column))
+        for agent in ("agent_1", "agent_2"):
+            end_state[f"{agent}_scores"] = [int(score) for score in end_state[f"{agent}_scores"]]
+        known = {*_LEGACY_COLUMNS, *SETUP_COLUMNS, *LIST_COLUMNS}
+        tags = {key: value for key, value in row.items() if key not in known and value is not None}
+        if "replicate" in tags:
+            tags["replicate"] = int(tags["replicate"])
+        records.append(result_record(end_state, {column: row.get(column) for column in SETUP_COLUMNS}, tags))
+    return records
+
+
+def convert_csv(csv_path: str, output_dir: str = None) -> tuple:
+    """
+    Convert one legacy result CSV into the Parquet dataset of the same name.
+
+    Returns:
+        tuple: (dataset path, number of rows)
+    """
+    import pyarrow.parquet as pq
+
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    dataset = os.path.join(output_dir or os.path.dirname(csv_path), stem + PARQUET_SUFFIX)
+    table = records_to_table(legacy_csv_records(csv_path))
+    os.makedirs(dataset, exist_ok=True)
+    # A fixed part name makes re-running the conversion replace, not duplicate, the rows
+    part = os.path.join(dataset, f"part-csv-{stem}.parquet")
+    pq.write_table(table, part + ".tmp", compression="zstd")
+    os.replace(part + ".tmp", part)
+    return dataset, table.num_rows
+
+
+def main(args):
+    from logging_setup import setup_logging
+
+    setup_logging()
+    if args.command == "convert":
+        paths = sorted({path for pattern in args.csv for path in glob.glob(pattern)})
+        total = 0
+        for path in paths:
+            started = time.monotonic()
+            dataset, rows = convert_csv(path, args.output_dir)
+            total += rows
+            print(f"{path}: {rows} rows -> {dataset} ({time.monotonic() - started:.1f}s)")
+        print(f"Converted {len(paths)} files, {total} rows")
+    elif args.command == "compact":
+        for path in args.dataset:
+            print(f"{path}: {compact(path)} rows in one part")
+    elif args.command == "export-arrow":
+        rows = export_arrow(args.dataset, args.output)
+        print(f"{rows} rows -> {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert, compact and export Parquet result datasets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert legacy result CSVs to Parquet datasets")
+    convert_parser.add_argument("csv", nargs="+", help="CSV paths or glob patterns, e.g. 'data/outputs/*_regulated*.csv'")
+    convert_parser.add_argument("--output_dir", type=str, required=False,
+                                help="Where to put the datasets (default: next to each CSV)")
+
+    compact_parser = subparsers.add_parser("compact", help="Merge the part files of datasets")
+    compact_parser.add_argument("dataset", nargs="+")
+
+    arrow_parser = subparsers.add_parser("export-arrow",
+                                         help="Write datasets to one Arrow IPC file for zero-copy memory-mapped reads")
+    arrow_parser.add_argument("dataset", nargs="+")
+    arrow_parser.add_argument("--output", type=str, required=True)
+
+    main(parser.parse_args())
@@ -6,6 +6,7 @@
 #
 # Regulator Agent for generating game variants
 
+import logging
 import sys
 import os
 
@@ -17,9 +18,12 @@ sys.path.insert(0, dependencies_dir)
 from langchain_core.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel
 from typing import Literal
-from models import get_model_by_id_and_provider
+from models import get_cached_model, get_structured_model
+from request_executor import get_executor, model_key
 from games_structures.base_game import BaseGameStructure
 
+logger = logging.getLogger(__name__)
+
 
 class GameVariantResponse(BaseModel):
     """
@@ -52,12 +56,13 @@ class RegulatorAgent:
             model_id (str): The model ID to use (e.g., "gpt-4o")
             model_provider (str, optional): The model provider
         """
-        self.model = get_model_by_id_and_provider(model_id, provider=model_provider)
+        self.model = get_cached_model(model_id, provider=model_provider)
     
     def generate_game_variant(
         self, 
         base_game: BaseGameStructure,
-        variant_type: Literal["complex", "contextual", "multi_stage"] = "complex"
+        variant_type: Literal["complex", "contextual", "multi_stage"] = "complex",
+        callbacks: list = None
     ) -> GameVariantResponse:
         """
         Generate a game variant based on the base game structure.
@@ -68,84 +73,49 @@ class RegulatorAgent:
                 - "complex": Add complexity to the game mechanics
                 - "contextual": Add contextual information or framing
                 - "multi_stage": Create a multi-stage variant
+            callbacks (list, optional): Callback handlers of the call (e.g. the
+                OpenAICallbackHandler that charges its cost to the games playing the variant)
         
         Returns:
             GameVariantResponse: The generated game variant
         """
-        base_prompt = base_game.GAME_PROMPT.content if hasattr(base_game.GAME_PROMPT, 'content') else str(base_game.GAME_PROMPT)
-        base_payoff = base_game.payoff_matrix
+        regulator_prompt = self.variant_prompt(base_game, variant_type)
+        
+        logger.debug("Regulator: calling %s", model_key(self.model))
+        
+        # Retries, backoff and concurrency are handled by the shared request executor
+        executor = get_executor()
+        return executor.call(
+            model_key(self.model),
+            # Use json_schema method for OpenRouter compatibility
+            lambda: get_structured_model(self.model, GameVariantResponse, method="json_schema").invoke(
+                regulator_prompt, config={"callbacks": callbacks} if callbacks else None
+            ),
+            description="regulator"
+        )
+    
+    @classmethod
+    def variant_prompt(cls, base_game: BaseGameStructure, variant_type: str) -> list:
+        """
+        Build the regulator prompt asking for a variant of `base_game`.
+        
+        Args:
+            base_game (BaseGameStructure): The base game structure
+            variant_type (str): Type of variant to generate
         
-        regulator_prompt = self._build_regulator_prompt(
+        Returns:
+            list: List of messages for the regulator agent
+        """
+        base_prompt = base_game.GAME_PROMPT.content if hasattr(base_game.GAME_PROMPT, 'content') else str(base_game.GAME_PROMPT)
+        return cls.build_regulator_prompt(
             base_prompt, 
-            base_payoff, 
+            base_game.payoff_matrix, 
             base_game.game_name,
             variant_type
         )
-        
-        # Use function_calling method to avoid schema validation issues with dict types
-        import time
-        from openai import RateLimitError, APIConnectionError
-        try:
-            from httpx import RemoteProtocolError
-        except ImportError:
-            RemoteProtocolError = Exception
-        
-        max_retries = 5
-        retry_delay = 2  # 快速重试延迟
-        
-        # 移除初始等待，直接调用API
-        import time
-        import sys
-        sys.stdout.flush()
-        print("🚀 Regulator: 直接调用API...", flush=True)
-        
-        for attempt in range(max_retries):
-            try:
-                # Use json_schema method for OpenRouter compatibility
-                response = self.model.with_structured_output(
-                    GameVariantResponse, 
-                    method="json_schema"
-                ).invoke(regulator_prompt)
-                return response
-            except Exception as e:
-                # Handle different types of errors
-                error_str = str(e).lower()
-                error_type = type(e).__name__
-                
-                # Check for rate limit errors
-                is_rate_limit = ("rate limit" in error_str or "429" in error_str or 
-                               isinstance(e, RateLimitError) or "too many requests" in error_str)
-                
-                # Check for connection errors (network issues, server disconnects)
-                is_connection_error = (isinstance(e, (APIConnectionError, RemoteProtocolError)) or
-                                     "connection" in error_str or "disconnected" in error_str or
-                                     "server disconnected" in error_str or "timeout" in error_str)
-                
-                if (is_rate_limit or is_connection_error) and attempt < max_retries - 1:
-                    error_msg = str(e)
-                    
-                    # For rate limits, try to extract wait time
-                    if is_rate_limit and "try again in" in error_msg.lower():
-                        import re
-                        wait_match = re.search(r'(\d+)s', error_msg)
-                        if wait_match:
-                            retry_delay = int(wait_match.group(1)) + 2
-                    elif is_connection_error:
-                        # For connection errors, use exponential backoff
-                        retry_delay = min(10 * (2 ** attempt), 60)  # Max 60 seconds
-                    
-                    if is_rate_limit:
-                        print(f"Rate limit reached in regulator. Waiting {retry_delay} seconds before retry {attempt + 1}/{max_retries}...")
-                    else:
-                        print(f"Connection error in regulator ({error_type}). Waiting {retry_delay} seconds before retry {attempt + 1}/{max_retries}...")
-                    
-                    time.sleep(retry_delay)
-                else:
-                    print(f"Error in regulator after {attempt + 1} attempts: {error_type}: {str(e)}")
-                    raise
     
-    def _build_regulator_prompt(
-        self, 
+    @staticmethod
+    def build_regulator_prompt(
         base_prompt: str, 
         base_payoff: dict,
         game_name: str,
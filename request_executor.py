@@ -0,0 +1,511 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Shared request executor: per-model AIMD concurrency, header-aware jittered backoff, metrics
+
+import contextvars
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+DURATION_PART_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+@dataclass
+class ExecutorSettings:
+    """
+    Retry and concurrency settings shared by every model call.
+    """
+    max_attempts: int = 6
+    base_delay: float = 1.0      # First backoff step (seconds), doubled per attempt
+    max_delay: float = 60.0      # Cap for a single backoff
+    initial_concurrency: float = 4.0
+    min_concurrency: float = 1.0
+    max_concurrency: float = 64.0
+    additive_increase: float = 1.0       # Added to the limit after `limit` consecutive successes
+    multiplicative_decrease: float = 0.5  # Limit factor applied on a rate limit
+    latency_window: int = 512    # Latency samples kept per model for percentiles
+    # Hedging: after the observed latency quantile, send a duplicate and take the first response
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_multiplier: float = 1.0
+    hedge_min_delay: float = 1.0     # Never hedge earlier than this (seconds)
+    hedge_min_samples: int = 20      # Latency samples needed before hedging starts
+    hedge_workers: int = 64
+    # Circuit breaker: open when the error rate over the last `breaker_window` calls spikes
+    breaker_window: int = 20
+    breaker_min_calls: int = 10
+    breaker_error_rate: float = 0.5
+    breaker_cooldown: float = 30.0   # Seconds dispatch stays paused before a half-open probe
+    breaker_fail_fast: bool = False  # Raise CircuitOpenError instead of waiting out the cooldown
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised when a model's circuit breaker is open and the executor is configured to fail fast.
+    """
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parse durations used in rate-limit headers ("2", "1.5s", "20ms", "6m0s") into seconds.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART_PATTERN.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def retry_after_from_headers(headers) -> Optional[float]:
+    """
+    Read the server's requested wait from Retry-After / retry-after-ms / x-ratelimit-* headers.
+
+    Args:
+        headers (Mapping): Response headers (case-insensitive mapping from httpx)
+    Returns:
+        Optional[float]: Seconds to wait, or None if the headers give no hint
+    """
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        seconds = parse_duration(retry_after_ms)
+        if seconds is not None:
+            return seconds / 1000
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        seconds = parse_duration(retry_after)
+        if seconds is None:
+            # HTTP-date form
+            try:
+                seconds = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = None
+        if seconds is not None:
+            return max(seconds, 0.0)
+    for kind in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+        if remaining is not None and str(remaining).strip() in ("0", "0.0"):
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if reset is not None:
+                return reset
+    return None
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Classify an exception raised by a model call.
+
+    Returns:
+        str: "rate_limit", "transient" (worth retrying) or "fatal"
+    """
+    import httpx
+    import openai
+
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            return "rate_limit"
+        if error.status_code in (408, 409) or error.status_code >= 500:
+            return "transient"
+        return "fatal"
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        # Includes APITimeoutError, RemoteProtocolError and dropped connections
+        return "transient"
+    return "fatal"
+
+
+def model_key(model) -> str:
+    """
+    Name used to group calls of one model for concurrency control and metrics.
+    """
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit for one model with additive increase / multiplicative decrease.
+
+    The limit grows by `additive_increase` after each window of `limit` successes and is
+    multiplied by `multiplicative_decrease` on a rate limit. A rate limit also pauses dispatch
+    for every caller of the model until the server's Retry-After has elapsed.
+    """
+
+    def __init__(self, settings: ExecutorSettings):
+        self.settings = settings
+        self.limit = settings.initial_concurrency
+        self.in_flight = 0
+        self._successes_in_window = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        """
+        Take a slot only if one is free right now (used for hedged duplicates).
+        """
+        with self._condition:
+            if self._paused_until <= time.monotonic() and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self._successes_in_window += 1
+            if self._successes_in_window >= int(self.limit):
+                self._successes_in_window = 0
+                self.limit = min(self.settings.max_concurrency, self.limit + self.settings.additive_increase)
+                self._condition.notify_all()
+
+    def on_rate_limit(self, pause_seconds: float):
+        with self._condition:
+            self._successes_in_window = 0
+            self.limit = max(self.settings.min_concurrency, self.limit * self.settings.multiplicative_decrease)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause_seconds)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker over a rolling window of call outcomes.
+
+    closed -> open when the error rate reaches `breaker_error_rate`; open -> half_open after
+    `breaker_cooldown`, letting a single probe through; the probe's outcome closes or re-opens it.
+    """
+
+    def __init__(self, settings: ExecutorSettings):
+        self.settings = settings
+        self.state = "closed"
+        self.times_opened = 0
+        self._outcomes = deque(maxlen=settings.breaker_window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._condition = threading.Condition()
+
+    def acquire_permit(self, key: str):
+        """
+        Wait (or fail fast) while the breaker is open; in half_open only one probe may pass.
+        """
+        with self._condition:
+            while True:
+                if self.state == "closed":
+                    return
+                if self.state == "open":
+                    remaining = self._opened_at + self.settings.breaker_cooldown - time.monotonic()
+                    if remaining > 0:
+                        if self.settings.breaker_fail_fast:
+                            raise CircuitOpenError(f"Circuit for {key} is open ({remaining:.0f}s left)")
+                        self._condition.wait(timeout=remaining)
+                        continue
+                    self.state = "half_open"
+                if not self._probe_in_flight:
+                    self._probe_in_flight = True
+                    return
+                if self.settings.breaker_fail_fast:
+                    raise CircuitOpenError(f"Circuit for {key} is half-open and probing")
+                self._condition.wait()
+
+    def record(self, success: Optional[bool]):
+        """
+        Record a call outcome; None (a client-side error) only releases a half-open probe.
+        """
+        with self._condition:
+            if self.state == "half_open":
+                self._probe_in_flight = False
+                if success:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                elif success is False:
+                    self._open()
+                self._condition.notify_all()
+                return
+            if success is None or self.state == "open":
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (len(self._outcomes) >= self.settings.breaker_min_calls
+                    and failures / len(self._outcomes) >= self.settings.breaker_error_rate):
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.times_opened += 1
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+class ModelMetrics:
+    """
+    Counters and a bounded latency window for one model.
+    """
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.transient_errors = 0
+        self.backoff_seconds = 0.0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.latencies = deque(maxlen=window)
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "transient_errors": self.transient_errors,
+            "backoff_seconds": round(self.backoff_seconds, 3),
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "latency_p50": self.latency_quantile(0.50),
+            "latency_p95": self.latency_quantile(0.95),
+        }
+
+
+class RequestExecutor:
+    """
+    Runs model calls with shared retry, backoff and per-model adaptive concurrency.
+    """
+
+    def __init__(self, settings: ExecutorSettings = None):
+        self.settings = settings or ExecutorSettings()
+        self._lock = threading.Lock()
+        self._limiters: dict[str, AIMDLimiter] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._metrics: dict[str, ModelMetrics] = {}
+        self._hedge_pool = None
+
+    def _state(self, key: str) -> tuple[AIMDLimiter, CircuitBreaker, ModelMetrics]:
+        with self._lock:
+            if key not in self._limiters:
+                self._limiters[key] = AIMDLimiter(self.settings)
+                self._breakers[key] = CircuitBreaker(self.settings)
+                self._metrics[key] = ModelMetrics(self.settings.latency_window)
+            return self._limiters[key], self._breakers[key], self._metrics[key]
+
+    def hedge_delay(self, metrics: ModelMetrics) -> Optional[float]:
+        """
+        Seconds to wait for the primary request before hedging, or None if hedging is off.
+        """
+        if not self.settings.hedge or len(metrics.latencies) < self.settings.hedge_min_samples:
+            return None
+        quantile = metrics.latency_quantile(self.settings.hedge_quantile)
+        return max(self.settings.hedge_min_delay, quantile * self.settings.hedge_multiplier)
+
+    def _run_hedged(self, fn: Callable[[], T], delay: float, limiter: AIMDLimiter, metrics: ModelMetrics) -> T:
+        """
+        Run `fn`; if it has not answered after `delay`, send a duplicate and return the first success.
+        The slower request is left to finish in the background and its result is discarded.
+
+        Takes over the caller's limiter slot: it is released when the primary request finishes,
+        which may be after a winning hedge has returned, so the limiter keeps counting it.
+        """
+        try:
+            with self._lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=self.settings.hedge_workers,
+                                                          thread_name_prefix="hedge")
+            # Each request runs in a copy of the caller's context so LangChain callbacks still apply
+            primary = self._hedge_pool.submit(contextvars.copy_context().run, fn)
+        except BaseException:
+            limiter.release()
+            raise
+        primary.add_done_callback(lambda _: limiter.release())
+        done, _ = wait([primary], timeout=delay)
+        if done or not limiter.try_acquire():
+            return primary.result()
+
+        hedge = self._hedge_pool.submit(contextvars.copy_context().run, fn)
+        hedge.add_done_callback(lambda _: limiter.release())
+        with self._lock:
+            metrics.hedges_sent += 1
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            metrics.hedges_won += 1
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def backoff_delay(self, attempt: int, server_hint: Optional[float]) -> float:
+        """
+        Full-jitter exponential backoff, never shorter than the server's requested wait.
+        """
+        ceiling = min(self.settings.max_delay, self.settings.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if server_hint is not None:
+            delay = max(delay, min(server_hint, self.settings.max_delay)) + random.uniform(0, 0.1 * ceiling)
+        return delay
+
+    def call(self, key: str, fn: Callable[[], T], description: str = "model call",
+             on_retry: Callable[[dict], None] = None) -> T:
+        """
+        Invoke `fn` under the model's concurrency limit, retrying rate limits and transient errors.
+
+        Args:
+            key (str): Model key (see model_key)
+            fn (Callable): The call to make, without arguments
+            description (str): Short label used in retry messages
+            on_retry (Callable, optional): Called with a dict describing each retry (kind,
+                attempt, delay), e.g. to write it to the game's event log
+        Returns:
+            The return value of `fn`
+        """
+        limiter, breaker, metrics = self._state(key)
+        max_attempts = self.settings.max_attempts
+        for attempt in range(max_attempts):
+            breaker.acquire_permit(key)
+            limiter.acquire()
+            start = time.monotonic()
+            hedged = False
+            try:
+                delay = self.hedge_delay(metrics)
+                if delay is None:
+                    result = fn()
+                else:
+                    # The primary request's slot is released by _run_hedged once that request finishes
+                    hedged = True
+                    result = self._run_hedged(fn, delay, limiter, metrics)
+            except Exception as e:
+                kind = classify_error(e)
+                breaker.record(None if kind == "fatal" else False)
+                with self._lock:
+                    metrics.calls += 1
+                    if kind == "rate_limit":
+                        metrics.rate_limited += 1
+                    elif kind == "transient":
+                        metrics.transient_errors += 1
+                if kind == "fatal" or attempt == max_attempts - 1:
+                    with self._lock:
+                        metrics.failures += 1
+                    logger.error("Error in %s after %d attempts: %s: %s",
+                                 description, attempt + 1, type(e).__name__, e)
+                    raise
+                response = getattr(e, "response", None)
+                hint = retry_after_from_headers(getattr(response, "headers", None))
+                delay = self.backoff_delay(attempt, hint)
+                if kind == "rate_limit":
+                    limiter.on_rate_limit(hint if hint is not None else delay)
+                    logger.warning("Rate limit reached in %s. Concurrency for %s -> %d. "
+                                   "Waiting %.1f seconds before retry %d/%d",
+                                   description, key, int(limiter.limit), delay, attempt + 1, max_attempts)
+                else:
+                    logger.warning("Connection error in %s (%s). Waiting %.1f seconds before retry %d/%d",
+                                   description, type(e).__name__, delay, attempt + 1, max_attempts)
+                with self._lock:
+                    metrics.retries += 1
+                    metrics.backoff_seconds += delay
+                if on_retry:
+                    on_retry({"model": key, "description": description, "kind": kind,
+                              "attempt": attempt + 1, "delay": round(delay, 3)})
+            else:
+                with self._lock:
+                    metrics.calls += 1
+                    metrics.successes += 1
+                    metrics.latencies.append(time.monotonic() - start)
+                breaker.record(True)
+                limiter.on_success()
+                return result
+            finally:
+                if not hedged:
+                    limiter.release()
+            time.sleep(delay)
+
+    def metrics(self) -> dict:
+        """
+        Snapshot of per-model metrics, including the current concurrency limit.
+        """
+        with self._lock:
+            return {
+                key: {
+                    **self._metrics[key].snapshot(),
+                    "concurrency_limit": int(limiter.limit),
+                    "in_flight": limiter.in_flight,
+                    "circuit_state": self._breakers[key].state,
+                    "circuit_opened": self._breakers[key].times_opened,
+                }
+                for key, limiter in self._limiters.items()
+            }
+
+    def reset_metrics(self):
+        with self._lock:
+            for key in self._metrics:
+                self._metrics[key] = ModelMetrics(self.settings.latency_window)
+
+
+_shared_executor: Optional[RequestExecutor] = None
+_shared_lock = threading.Lock()
+
+
+def get_executor() -> RequestExecutor:
+    """
+    Return the process-wide executor shared by the regulator, players and judge.
+    """
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = RequestExecutor()
+        return _shared_executor
+
+
+def configure_executor(settings: ExecutorSettings) -> RequestExecutor:
+    """
+    Replace the shared executor (e.g. from a sweep or benchmark) and return it.
+    """
+    global _shared_executor
+    with _shared_lock:
+        _shared_executor = RequestExecutor(settings)
+        return _shared_executor
@@ -6,49 +6,47 @@
 #
 # Run games with regulator agent
 
+import logging
 import sys
 import os
+import threading
+import time
+import uuid
+from functools import lru_cache
 
 # Independent project - use local dependencies
 current_dir = os.path.dirname(os.path.abspath(__file__))
 dependencies_dir = os.path.join(current_dir, 'dependencies')
 sys.path.insert(0, dependencies_dir)
 
-import pandas as pd
+# Heavy dependencies (pandas, langgraph, langchain_community, openai) are imported
+# inside the functions that use them so that importing this module stays cheap
 from games_structures.base_game import BaseGameStructure, GameState
-from langchain_community.callbacks.openai_info import OpenAICallbackHandler
-from langgraph.graph import StateGraph, START, END
-from langgraph.types import Command, Send
 from typing import Literal, Callable, TypedDict, Annotated, List
 from operator import add
 
 # Import from local modules
-from models import get_model_by_id_and_provider
-from regulator_agent import RegulatorAgent
+from config import BASE_VARIANT_TYPE, INTENT_MODEL_ID, load_priming
+from models import get_cached_model, get_structured_model
+from regulator_agent import RegulatorAgent, GameVariantResponse
 from game_variant_generator import GameVariantGenerator
+from request_executor import get_executor, model_key
+from judge_service import get_judge_service
+from event_log import EventLog, get_event_log
+from logging_setup import log_context, set_log_context
 
 # Import node helpers from local dependencies
-import json
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 # Import node_helpers module FIRST
 import node_helpers as nh_module
 
-# Fix personality file path BEFORE importing functions that use it
-# Use local dependencies directory
-_priming_path = os.path.join(current_dir, 'dependencies', 'priming', 'priming_without_mention_of_mbti_different_none_with_altruistic_selfish.json')
-
-# Monkey patch get_personality_from_key_prompt BEFORE importing it
+# Monkey patch get_personality_from_key_prompt BEFORE importing it: read the priming prompts
+# from the shared store (loaded once per process) instead of re-reading the file on every prompt
 def _get_personality_from_key_prompt_fixed(personality_key: str) -> SystemMessage:
-    """Get personality prompt with correct path resolution."""
-    if not os.path.exists(_priming_path):
-        raise FileNotFoundError(
-            f"Personality file not found at: {_priming_path}\n"
-            f"Current working directory: {os.getcwd()}\n"
-            f"Script directory: {current_dir}\n"
-            f"Please ensure dependencies are properly set up."
-        )
-    personalities = json.load(open(_priming_path))
+    """Get personality prompt from the shared priming store."""
+    personalities = load_priming()
     if personality_key not in personalities:
         available = list(personalities.keys())[:10]
         raise KeyError(
@@ -69,6 +67,11 @@ from node_helpers import (
     AnnotatedPrompt
 )
 
+logger = logging.getLogger(__name__)
+
+# Serializes read-concat-write of result CSVs between games running in threads
+_results_file_lock = threading.Lock()
+
 
 class RegulatedGameState(GameState):
     """
@@ -78,43 +81,62 @@ class RegulatedGameState(GameState):
     variant_complexity: str
     variant_reasoning: str
     regulator_model: str
+    total_tokens: int       # Set on the returned end state
+    total_cost_USD: float   # Set on the returned end state
 
 
-def send_prompts_node(prompt_type : Literal["message", "action"], GameStructure: BaseGameStructure) -> Callable:
+def game_configurable(models: dict, intent_model, game_structure: BaseGameStructure, **extra) -> dict:
+    """
+    Runtime inputs of the game graph, passed as `config["configurable"]`.
+    
+    Args:
+        models (dict): Player models keyed by "agent_1" / "agent_2"
+        intent_model: Model used to judge the intent of messages
+        game_structure (BaseGameStructure): The (variant) game structure to play
+        **extra: Further per-game entries (game_id, on_round_completed, on_retry)
+    """
+    return {"models": models, "intent_model": intent_model, "game_structure": game_structure, **extra}
+
+
+def send_prompts_node(prompt_type : Literal["message", "action"]) -> Callable:
     """
     Get the function to send the prompts to the agents.
     For 3 RPM limit, we need to send sequentially, not in parallel.
     """
-    def send_prompts(state: RegulatedGameState) -> list[Send]:
+    from langgraph.types import Send
+    
+    def send_prompts(state: RegulatedGameState, config: RunnableConfig) -> list[Send]:
+        GameStructure = config["configurable"]["game_structure"]
         # Return only agent_1 first to ensure sequential execution
         agent_1_annotated_prompt_state = get_agent_annotated_prompt("agent_1", state, prompt_type, GameStructure)
         # 为 message 和 action 都使用带编号的节点名
         return [Send(f"invoke_from_prompt_state_{prompt_type}_1", agent_1_annotated_prompt_state)]
     return send_prompts
 
-def send_second_agent_prompt_node(prompt_type : Literal["message", "action"], GameStructure: BaseGameStructure) -> Callable:
+def send_second_agent_prompt_node(prompt_type : Literal["message", "action"]) -> Callable:
     """
     Send prompt to the second agent after the first one completes.
     """
-    def send_second_prompt(state: RegulatedGameState) -> list[Send]:
+    from langgraph.types import Send
+    
+    def send_second_prompt(state: RegulatedGameState, config: RunnableConfig) -> list[Send]:
+        GameStructure = config["configurable"]["game_structure"]
         agent_2_annotated_prompt_state = get_agent_annotated_prompt("agent_2", state, prompt_type, GameStructure)
         # 为 message 和 action 都使用带编号的节点名
         return [Send(f"invoke_from_prompt_state_{prompt_type}_2", agent_2_annotated_prompt_state)]
     return send_second_prompt
 
 
-def invoke_from_prompt_state_node(models, GameStructure) -> Callable:
+def invoke_from_prompt_state_node() -> Callable:
     """
     Get the function to invoke the model from the prompt state.
     """
-    import time
-    from openai import RateLimitError, APIConnectionError
-    try:
-        from httpx import RemoteProtocolError
-    except ImportError:
-        RemoteProtocolError = Exception
+    from langgraph.types import Command
     
-    def invoke_from_prompt_state(state : AnnotatedPrompt) -> Command:
+    def invoke_from_prompt_state(state : AnnotatedPrompt, config: RunnableConfig) -> Command:
+        set_log_context(game_id=config["configurable"].get("game_id"), agent=state.agent_name)
+        models = config["configurable"]["models"]
+        GameStructure = config["configurable"]["game_structure"]
         json_mode = False
         try:
             for model in models.values():
@@ -129,85 +151,35 @@ def invoke_from_prompt_state_node(models, GameStructure) -> Callable:
         model = models[agent_name]
         Structure = GameStructure.MessageResponse if prompt_type == "message" else GameStructure.ActionResponse
         
-        # 移除延迟，直接调用API进行测试
-        # time.sleep(30)  # 已移除长时间等待
+        def invoke() -> str:
+            if json_mode:
+                response = get_structured_model(model, Structure, method="json_mode", include_raw=True).invoke(prompt)
+                if prompt_type == "message":
+                    return response["parsed"].message
+                return response["parsed"].action
+            # Use json_schema method for better OpenRouter compatibility
+            # OpenRouter has region restrictions with function_calling, so always use json_schema
+            response = get_structured_model(model, Structure, method="json_schema").invoke(prompt)
+            return response.message if prompt_type == "message" else response.action
         
-        # Retry logic for rate limit errors
-        max_retries = 5
-        retry_delay = 2  # 减少重试延迟，快速测试
-        
-        for attempt in range(max_retries):
-            try:
-                if json_mode:
-                    response = model.with_structured_output(Structure, method="json_mode", include_raw=True).invoke(prompt)
-                    message = ""
-                    if prompt_type == "message":
-                        message = response["parsed"].message
-                    else:
-                        message = response["parsed"].action
-                else:
-                    # Use json_schema method for better OpenRouter compatibility
-                    # OpenRouter has region restrictions with function_calling, so always use json_schema
-                    response = model.with_structured_output(Structure, method="json_schema").invoke(prompt)
-                    message = response.message if prompt_type == "message" else response.action
-                print(f"Agent {agent_name} {prompt_type} : {message}")
-                return Command(update = {f"{agent_name}_{prompt_type}s": [message]})
-            except Exception as e:
-                # Handle different types of errors
-                error_str = str(e).lower()
-                error_type = type(e).__name__
-                
-                # Check for rate limit errors
-                is_rate_limit = ("rate limit" in error_str or "429" in error_str or 
-                               isinstance(e, RateLimitError) or "too many requests" in error_str)
-                
-                # Check for connection errors (network issues, server disconnects)
-                is_connection_error = (isinstance(e, (APIConnectionError, RemoteProtocolError)) or
-                                     "connection" in error_str or "disconnected" in error_str or
-                                     "server disconnected" in error_str or "timeout" in error_str)
-                
-                if (is_rate_limit or is_connection_error) and attempt < max_retries - 1:
-                    error_msg = str(e)
-                    
-                    # For rate limits, try to extract wait time
-                    if is_rate_limit and "try again in" in error_msg.lower():
-                        import re
-                        wait_match = re.search(r'(\d+)s', error_msg)
-                        if wait_match:
-                            retry_delay = int(wait_match.group(1)) + 2
-                    elif is_connection_error:
-                        # For connection errors, use exponential backoff
-                        retry_delay = min(20 * (2 ** attempt), 60)  # Max 60 seconds
-                        print(f"Connection error ({error_type}). Retrying with exponential backoff...")
-                    
-                    if is_rate_limit:
-                        print(f"Rate limit reached (OpenRouter/OpenAI). Waiting {retry_delay} seconds before retry {attempt + 1}/{max_retries}...")
-                    else:
-                        print(f"Connection error ({error_type}). Waiting {retry_delay} seconds before retry {attempt + 1}/{max_retries}...")
-                    
-                    time.sleep(retry_delay)
-                else:
-                    # For other errors or max retries reached, raise immediately
-                    print(f"Error after {attempt + 1} attempts: {error_type}: {str(e)}")
-                    raise
-            except Exception as e:
-                # For other errors, raise immediately
-                raise
+        # Retries, backoff and concurrency are handled by the shared request executor
+        message = get_executor().call(model_key(model), invoke, description=f"{agent_name} {prompt_type}",
+                                      on_retry=config["configurable"].get("on_retry"))
+        logger.debug("%s: %s", prompt_type, message)
+        return Command(update = {f"{agent_name}_{prompt_type}s": [message]})
     return invoke_from_prompt_state
 
 
-def judge_intent_node(model, GameStructure) -> Callable:
+def judge_intent_node() -> Callable:
     """
     Get the function to judge the intent of the agents.
     """
-    import time
-    from openai import RateLimitError, APIConnectionError
-    try:
-        from httpx import RemoteProtocolError
-    except ImportError:
-        RemoteProtocolError = Exception
+    from langgraph.types import Command
     
-    def judge_intent(state: RegulatedGameState) -> Command:
+    def judge_intent(state: RegulatedGameState, config: RunnableConfig) -> Command:
+        set_log_context(game_id=config["configurable"].get("game_id"), round=state["current_round"])
+        model = config["configurable"]["intent_model"]
+        GameStructure = config["configurable"]["game_structure"]
         # Check if all required data is available with detailed error message
         agent_1_messages = state.get("agent_1_messages", [])
         agent_2_messages = state.get("agent_2_messages", [])
@@ -215,22 +187,16 @@ def judge_intent_node(model, GameStructure) -> Callable:
         agent_2_actions = state.get("agent_2_actions", [])
         
         if len(agent_1_messages) == 0:
-            print(f"Error: agent_1_messages is empty. State keys: {list(state.keys())}")
+            logger.error("agent_1_messages is empty. State keys: %s", list(state.keys()))
             return Command(update={})
         if len(agent_2_messages) == 0:
-            print(f"Error: agent_2_messages is empty. State keys: {list(state.keys())}")
-            return Command(update={})
-        if len(agent_1_actions) == 0:
-            print(f"Error: agent_1_actions is empty.")
-            print(f"  agent_1_messages length: {len(agent_1_messages)}")
-            print(f"  agent_2_messages length: {len(agent_2_messages)}")
-            print(f"  agent_2_actions length: {len(agent_2_actions)}")
+            logger.error("agent_2_messages is empty. State keys: %s", list(state.keys()))
             return Command(update={})
-        if len(agent_2_actions) == 0:
-            print(f"Error: agent_2_actions is empty.")
-            print(f"  agent_1_messages length: {len(agent_1_messages)}")
-            print(f"  agent_2_messages length: {len(agent_2_messages)}")
-            print(f"  agent_1_actions length: {len(agent_1_actions)}")
+        if len(agent_1_actions) == 0 or len(agent_2_actions) == 0:
+            logger.error(
+                "Missing actions: agent_1_messages=%d, agent_2_messages=%d, agent_1_actions=%d, agent_2_actions=%d",
+                len(agent_1_messages), len(agent_2_messages), len(agent_1_actions), len(agent_2_actions)
+            )
             return Command(update={})
         
         message_1 = agent_1_messages[-1]
@@ -238,85 +204,45 @@ def judge_intent_node(model, GameStructure) -> Callable:
         action_1 = agent_1_actions[-1]
         action_2 = agent_2_actions[-1]
         
-        question = get_question_prompt(GameStructure)
-        answer_format = get_answer_format(GameStructure)
-        
-        # 移除延迟，直接调用API进行测试
-        # time.sleep(30)  # 已移除长时间等待
-        
-        # Retry logic for rate limit errors
-        max_retries = 5
-        retry_delay = 2  # 减少重试延迟，快速测试
+        # Both messages go to the shared judge service, which judges them together with the
+        # messages of other concurrent games in one multi-item call
+        service = get_judge_service(model)
+        futures = [
+            service.submit(GameStructure, message, callbacks=config.get("callbacks"),
+                           on_retry=config["configurable"].get("on_retry"))
+            for message in (message_1, message_2)
+        ]
+        response_1, response_2 = (future.result() for future in futures)
         
-        for attempt in range(max_retries):
-            try:
-                response_1 = model.with_structured_output(answer_format).invoke(
-                    f"{question} : {message_1}"
-                )
-                # 移除延迟，直接调用API进行测试
-                # time.sleep(30)  # 已移除长时间等待
-                response_2 = model.with_structured_output(answer_format).invoke(
-                    f"{question} : {message_2}"
-                )
-                
-                intent_agent_1 = response_1.answer
-                intent_agent_2 = response_2.answer
-                truthful_agent_1 = intent_agent_1 == action_1
-                truthful_agent_2 = intent_agent_2 == action_2
-                analysis_agent_1 = response_1.analysis
-                analysis_agent_2 = response_2.analysis
-                return Command(update = {
-                    "intent_agent_1": [intent_agent_1],
-                    "intent_agent_2": [intent_agent_2],
-                    "truthful_agent_1": [truthful_agent_1],
-                    "truthful_agent_2": [truthful_agent_2],
-                    "analysis_agent_1": [analysis_agent_1],
-                    "analysis_agent_2": [analysis_agent_2]
-                })
-            except Exception as e:
-                # Handle different types of errors
-                error_str = str(e).lower()
-                error_type = type(e).__name__
-                
-                # Check for rate limit errors
-                is_rate_limit = ("rate limit" in error_str or "429" in error_str or 
-                               isinstance(e, RateLimitError) or "too many requests" in error_str)
-                
-                # Check for connection errors (network issues, server disconnects)
-                is_connection_error = (isinstance(e, (APIConnectionError, RemoteProtocolError)) or
-                                     "connection" in error_str or "disconnected" in error_str or
-                                     "server disconnected" in error_str or "timeout" in error_str)
-                
-                if (is_rate_limit or is_connection_error) and attempt < max_retries - 1:
-                    error_msg = str(e)
-                    
-                    # For rate limits, try to extract wait time
-                    if is_rate_limit and "try again in" in error_msg.lower():
-                        import re
-                        wait_match = re.search(r'(\d+)s', error_msg)
-                        if wait_match:
-                            retry_delay = int(wait_match.group(1)) + 2
-                    elif is_connection_error:
-                        # For connection errors, use exponential backoff
-                        retry_delay = min(10 * (2 ** attempt), 60)  # Max 60 seconds
-                    
-                    if is_rate_limit:
-                        print(f"Rate limit reached in intent analysis. Waiting {retry_delay} seconds before retry {attempt + 1}/{max_retries}...")
-                    else:
-                        print(f"Connection error in intent analysis ({error_type}). Waiting {retry_delay} seconds before retry {attempt + 1}/{max_retries}...")
-                    
-                    time.sleep(retry_delay)
-                else:
-                    print(f"Error in intent analysis after {attempt + 1} attempts: {error_type}: {str(e)}")
-                    raise
+        intent_agent_1 = response_1.answer
+        intent_agent_2 = response_2.answer
+        truthful_agent_1 = intent_agent_1 == action_1
+        truthful_agent_2 = intent_agent_2 == action_2
+        analysis_agent_1 = response_1.analysis
+        analysis_agent_2 = response_2.analysis
+        return Command(update = {
+            "intent_agent_1": [intent_agent_1],
+            "intent_agent_2": [intent_agent_2],
+            "truthful_agent_1": [truthful_agent_1],
+            "truthful_agent_2": [truthful_agent_2],
+            "analysis_agent_1": [analysis_agent_1],
+            "analysis_agent_2": [analysis_agent_2]
+        })
     return judge_intent
 
 
-def update_state_node(GameStructure):
+def update_state_node():
     """
     Get the function to update the state of the game.
+    
+    If the run config has `configurable["on_round_completed"]`, it is called with a dict
+    describing each completed round.
     """
-    def update_state(state: RegulatedGameState):
+    from langgraph.types import Command
+    
+    def update_state(state: RegulatedGameState, config: RunnableConfig):
+        set_log_context(game_id=config["configurable"].get("game_id"), round=state["current_round"])
+        GameStructure = config["configurable"]["game_structure"]
         # 使用Command返回状态更新，并在应该结束时直接跳转到END
         agent_1_decision = state["agent_1_actions"][-1]
         agent_2_decision = state["agent_2_actions"][-1]
@@ -325,8 +251,18 @@ def update_state_node(GameStructure):
         # 增加轮次
         new_round = state["current_round"] + 1
         
-        print(f"📊 Round {state['current_round']} completed: Agent 1={agent_1_decision}, Agent 2={agent_2_decision}, Scores: ({score_agent1}, {score_agent2})", flush=True)
-        print(f"   更新后轮次: {new_round}/{state['total_rounds']}", flush=True)
+        logger.debug("Round completed: agent_1=%s, agent_2=%s, scores=(%s, %s), next round %d/%d",
+                     agent_1_decision, agent_2_decision, score_agent1, score_agent2,
+                     new_round, state["total_rounds"])
+        
+        on_round_completed = config.get("configurable", {}).get("on_round_completed")
+        if on_round_completed:
+            on_round_completed({
+                "event": "round_completed",
+                "round": state["current_round"],
+                "actions": [agent_1_decision, agent_2_decision],
+                "scores": [score_agent1, score_agent2],
+            })
         
         state_updates = {
             "agent_1_scores": [score_agent1],
@@ -348,97 +284,109 @@ def should_continue(state: RegulatedGameState) -> bool:
     should = current <= total
     
     if not should:
-        completed_rounds = current - 1
-        print(f"✅ 游戏结束: 已完成 {completed_rounds}/{total} 轮 (current_round={current})", flush=True)
-        return False
-    else:
-        print(f"🔄 继续游戏: 当前轮次 {current}/{total}", flush=True)
-        return True
+        logger.debug("Game over: %d/%d rounds completed", current - 1, total)
+    return should
 
 
-def run_regulated_game(
+def generate_variant(
     regulator_model_id: str,
     regulator_provider: str,
-    player_model_1: str,
-    player_provider_1: str,
-    player_model_2: str,
-    player_provider_2: str,
-    total_rounds: int,
-    personality_key_1: str,
-    personality_key_2: str,
-    base_game_name: str,
+    base_game: BaseGameStructure,
     variant_type: str = "complex",
-    file_path: str = None
-) -> RegulatedGameState:
+    callbacks: list = None
+) -> GameVariantResponse:
     """
-    Run a game with a regulator agent generating variants.
+    Ask the regulator agent for a variant of the base game ("base" plays the base game itself,
+    without a regulator call).
     
     Args:
         regulator_model_id (str): Model ID for regulator (e.g., "gpt-4o")
         regulator_provider (str): Provider for regulator model
-        player_model_1 (str): Model ID for player 1 (e.g., "gpt-4o-mini")
-        player_provider_1 (str): Provider for player 1 model
-        player_model_2 (str): Model ID for player 2
-        player_provider_2 (str): Provider for player 2 model
-        total_rounds (int): Number of rounds to play
-        personality_key_1 (str): MBTI personality for player 1
-        personality_key_2 (str): MBTI personality for player 2
-        base_game_name (str): Name of the base game
+        base_game (BaseGameStructure): The base game structure
         variant_type (str): Type of variant to generate
-        file_path (str): Path to save results
+        callbacks (list, optional): Callback handlers of the regulator call, e.g. an
+            OpenAICallbackHandler whose usage is then split with `variant_usage_shares`
     
     Returns:
-        RegulatedGameState: Final game state
+        GameVariantResponse: The generated variant
     """
-    # Step 1: Load base game
-    base_game = load_game_structure_from_registry(base_game_name)
-    
-    # Step 2: Generate variant using regulator agent
+    if variant_type == BASE_VARIANT_TYPE:
+        logger.info("Playing the unmodified base game %s", base_game.game_name)
+        return GameVariantGenerator.base_game_variant(base_game)
+
     # IMPORTANT: Create regulator BEFORE creating player models
     # This ensures environment variables are correctly set for OpenRouter
-    import sys
-    sys.stdout.flush()
-    print(f"📝 Generating game variant using regulator agent ({regulator_model_id})...", flush=True)
+    logger.info("Generating %s game variant using regulator agent (%s)", variant_type, regulator_model_id)
     
-    # Create regulator FIRST (before any player models)
-    # This ensures OpenAI keys are removed during model creation
     regulator = RegulatorAgent(regulator_model_id, regulator_provider)
-    variant_response = regulator.generate_game_variant(base_game, variant_type)
+    variant_response = regulator.generate_game_variant(base_game, variant_type, callbacks=callbacks)
+    
+    logger.info("Variant generated - Complexity: %s", variant_response.complexity_level)
+    logger.debug("Variant reasoning: %s", variant_response.reasoning[:200])
+    return variant_response
+
+
+def variant_usage_shares(handler, games: int) -> list:
+    """
+    Split the regulator call recorded by `handler` over the `games` games playing its variant,
+    so each game's total_tokens / total_cost_USD (and budgets built on them) include its share.
     
-    print(f"Variant generated - Complexity: {variant_response.complexity_level}")
-    print(f"Reasoning: {variant_response.reasoning[:200]}...")
+    Returns:
+        list: {"total_tokens", "total_cost_USD"} of each game; the tokens sum to the handler's
+    """
+    tokens, remainder = divmod(handler.total_tokens, games)
+    return [
+        {"total_tokens": tokens + (index < remainder), "total_cost_USD": handler.total_cost / games}
+        for index in range(games)
+    ]
+
+
+NO_VARIANT_USAGE = {"total_tokens": 0, "total_cost_USD": 0.0}
+
+
+def prepare_variant_game(base_game: BaseGameStructure, variant_response: GameVariantResponse) -> BaseGameStructure:
+    """
+    Build the variant game structure, falling back to the base game if the variant is invalid.
+    
+    Args:
+        base_game (BaseGameStructure): The base game structure
+        variant_response (GameVariantResponse): The variant generated by the regulator
     
-    # Step 3: Create variant game structure
+    Returns:
+        BaseGameStructure: The variant game, or the base game if validation failed
+    """
     variant_game = GameVariantGenerator.create_variant_game(base_game, variant_response)
     
-    # Step 4: Validate variant
     is_valid, error_msg = GameVariantGenerator.validate_variant(base_game, variant_response)
     if not is_valid:
-        print(f"Warning: Variant validation failed: {error_msg}")
-        print("Falling back to base game...")
-        variant_game = base_game
-    else:
-        # Additional check: verify payoff matrix has correct keys
-        payoff = variant_game.payoff_matrix
-        base_payoff = base_game.payoff_matrix
-        missing_keys = set(base_payoff.keys()) - set(payoff.keys())
-        if missing_keys:
-            print(f"Warning: Variant payoff matrix missing keys: {missing_keys}")
-            print("Falling back to base game...")
-            variant_game = base_game
-        else:
-            print(f"✓ Variant payoff matrix validated: {len(payoff)} action combinations")
-    
-    # Step 5: Set up player models
-    models = {
-        "agent_1": get_model_by_id_and_provider(player_model_1, provider=player_provider_1),
-        "agent_2": get_model_by_id_and_provider(player_model_2, provider=player_provider_2)
-    }
+        logger.warning("Variant validation failed: %s. Falling back to base game", error_msg)
+        return base_game
     
-    intent_model = get_model_by_id_and_provider("gpt-4o-mini")
-    callback_handler = OpenAICallbackHandler()
+    # Additional check: verify payoff matrix has correct keys
+    payoff = variant_game.payoff_matrix
+    base_payoff = base_game.payoff_matrix
+    missing_keys = set(base_payoff.keys()) - set(payoff.keys())
+    if missing_keys:
+        logger.warning("Variant payoff matrix missing keys: %s. Falling back to base game", missing_keys)
+        return base_game
+    logger.debug("Variant payoff matrix validated: %d action combinations", len(payoff))
+    return variant_game
+
+
+def build_game_graph():
+    """
+    Build and compile the round graph.
     
-    # Step 6: Create graph with sequential execution for rate limit compliance
+    The topology is the same for every game: the game structure, the models and per-game
+    callbacks are runtime inputs read from `config["configurable"]` (see game_configurable),
+    so one compiled graph can run any number of games via invoke/batch/abatch.
+    
+    Returns:
+        CompiledStateGraph: The compiled graph
+    """
+    from langgraph.graph import StateGraph, START, END
+    
+    # Sequential execution for rate limit compliance
     graph = StateGraph(RegulatedGameState, input = RegulatedGameState, output = RegulatedGameState)
     
     # Lambda nodes for sequential state management
@@ -450,27 +398,27 @@ def run_regulated_game(
     
     # Invoke nodes - separate nodes for each agent to avoid state conflicts
     # Message nodes: separate for agent_1 and agent_2
-    graph.add_node(f"invoke_from_prompt_state_message_1", invoke_from_prompt_state_node(models, variant_game))
-    graph.add_node(f"invoke_from_prompt_state_message_2", invoke_from_prompt_state_node(models, variant_game))
+    graph.add_node(f"invoke_from_prompt_state_message_1", invoke_from_prompt_state_node())
+    graph.add_node(f"invoke_from_prompt_state_message_2", invoke_from_prompt_state_node())
     # Action nodes: separate for agent_1 and agent_2
-    graph.add_node(f"invoke_from_prompt_state_action_1", invoke_from_prompt_state_node(models, variant_game))
-    graph.add_node(f"invoke_from_prompt_state_action_2", invoke_from_prompt_state_node(models, variant_game))
-    graph.add_node("judge_intent", judge_intent_node(intent_model, variant_game))
-    graph.add_node("update_state", update_state_node(variant_game))
+    graph.add_node(f"invoke_from_prompt_state_action_1", invoke_from_prompt_state_node())
+    graph.add_node(f"invoke_from_prompt_state_action_2", invoke_from_prompt_state_node())
+    graph.add_node("judge_intent", judge_intent_node())
+    graph.add_node("update_state", update_state_node())
     
     # Message phase: Sequential execution (agent_1 -> agent_2)
     graph.add_edge(START, "lambda_to_messages")
     # Agent 1 message
     graph.add_conditional_edges(
         source = "lambda_to_messages", 
-        path = send_prompts_node("message", variant_game),
+        path = send_prompts_node("message"),
         path_map = ["invoke_from_prompt_state_message_1"]
     )
     graph.add_edge("invoke_from_prompt_state_message_1", "lambda_from_messages_1")
     # Agent 2 message (after agent 1 completes) - use separate node
     graph.add_conditional_edges(
         source = "lambda_from_messages_1",
-        path = send_second_agent_prompt_node("message", variant_game),
+        path = send_second_agent_prompt_node("message"),
         path_map = ["invoke_from_prompt_state_message_2"]
     )
     graph.add_edge("invoke_from_prompt_state_message_2", "lambda_from_messages_2")
@@ -478,14 +426,14 @@ def run_regulated_game(
     # Action phase: Sequential execution (agent_1 -> agent_2)
     graph.add_conditional_edges(
         source = "lambda_from_messages_2", 
-        path = send_prompts_node("action", variant_game),
+        path = send_prompts_node("action"),
         path_map = ["invoke_from_prompt_state_action_1"]
     )
     graph.add_edge("invoke_from_prompt_state_action_1", "lambda_from_actions_1")
     # Agent 2 action (after agent 1 completes) - use separate node
     graph.add_conditional_edges(
         source = "lambda_from_actions_1",
-        path = send_second_agent_prompt_node("action", variant_game),
+        path = send_second_agent_prompt_node("action"),
         path_map = ["invoke_from_prompt_state_action_2"]
     )
     graph.add_edge("invoke_from_prompt_state_action_2", "lambda_from_actions_2")
@@ -506,11 +454,28 @@ def run_regulated_game(
         }
     )
     
-    # Step 7: Compile and run
-    compiled_graph = graph.compile()
-    
-    # Create initial state with empty lists initialized
-    initial_state = RegulatedGameState(
+    return graph.compile()
+
+
+@lru_cache(maxsize=None)
+def get_game_graph():
+    """
+    The compiled round graph, built once per process.
+    """
+    return build_game_graph()
+
+
+def make_initial_state(
+    personality_key_1: str,
+    personality_key_2: str,
+    total_rounds: int,
+    variant_response: GameVariantResponse,
+    regulator_model_id: str
+) -> RegulatedGameState:
+    """
+    Create the initial state of one game, with empty lists initialized to avoid IndexError.
+    """
+    return RegulatedGameState(
         personality_key_1=personality_key_1,
         personality_key_2=personality_key_2,
         current_round=1,
@@ -519,7 +484,6 @@ def run_regulated_game(
         variant_complexity=variant_response.complexity_level,
         variant_reasoning=variant_response.reasoning,
         regulator_model=regulator_model_id,
-        # Initialize empty lists to avoid IndexError
         agent_1_messages=[],
         agent_2_messages=[],
         agent_1_actions=[],
@@ -533,28 +497,281 @@ def run_regulated_game(
         analysis_agent_1=[],
         analysis_agent_2=[]
     )
+
+
+def _result_row(end_state: dict, setup: dict, tags: dict = None) -> dict:
+    end_state["agent_1_messages"] = [msg.replace('"', "'") for msg in end_state["agent_1_messages"]]
+    end_state["agent_2_messages"] = [msg.replace('"', "'") for msg in end_state["agent_2_messages"]]
+    end_state["agent_1_actions"] = [action.replace('"', "'") for action in end_state["agent_1_actions"]]
+    end_state["agent_2_actions"] = [action.replace('"', "'") for action in end_state["agent_2_actions"]]
+
+    return {
+        # The payoff table is only stored by the Parquet store
+        **{key: value for key, value in setup.items() if key != "payoff_matrix"},
+        "game_id": end_state.get("game_id"),
+        "personality_1": end_state["personality_key_1"],
+        "personality_2": end_state["personality_key_2"],
+        "variant_complexity": end_state["variant_complexity"],
+        "agent_1_scores": end_state["agent_1_scores"],
+        "agent_2_scores": end_state["agent_2_scores"],
+        "agent_1_messages": end_state["agent_1_messages"],
+        "agent_2_messages": end_state["agent_2_messages"],
+        "agent_1_actions": end_state["agent_1_actions"],
+        "agent_2_actions": end_state["agent_2_actions"],
+        "intent_agent_1": end_state["intent_agent_1"],
+        "intent_agent_2": end_state["intent_agent_2"],
+        "truthful_agent_1": end_state["truthful_agent_1"],
+        "truthful_agent_2": end_state["truthful_agent_2"],
+        "analysis_agent_1": end_state["analysis_agent_1"],
+        "analysis_agent_2": end_state["analysis_agent_2"],
+        "total_rounds": end_state["total_rounds"],
+        "total_tokens": end_state["total_tokens"],
+        "total_cost_USD": end_state["total_cost_USD"],
+        "variant_reasoning": end_state["variant_reasoning"][:500],  # Truncate for CSV
+        **(tags or {})
+    }
+
+
+def save_game_results(file_path: str, results: list):
+    """
+    Append the result rows of several games to a CSV file with a single write, or to a Parquet
+    dataset (see parquet_store) if the path ends in .parquet or MBTI_RESULTS_FORMAT=parquet, and
+    merge them into the aggregate store set by MBTI_AGGREGATES (see aggregates).
+    
+    Args:
+        file_path (str): Path of the results CSV
+        results (list): (end_state, setup, tags) of each game, as in save_game_result
+    """
+    import pandas as pd
     
-    end_state = compiled_graph.invoke(initial_state, config={"recursion_limit": 200, "callbacks": [callback_handler]})
-    print(f"Total Cost (USD): ${callback_handler.total_cost}")
+    from aggregates import update_aggregates
+    from parquet_store import is_parquet, results_path, write_results
     
-    # Step 8: Save results
-    if file_path:
-        columns = [
-            "game_name", "base_game_name", "variant_type", "regulator_model",
-            "model_provider_1", "model_name_1", "model_provider_2", "model_name_2",
-            "personality_1", "personality_2", "variant_complexity",
-            "agent_1_scores", "agent_2_scores", "agent_1_messages", "agent_2_messages",
-            "agent_1_actions", "agent_2_actions", "intent_agent_1", "intent_agent_2",
-            "truthful_agent_1", "truthful_agent_2", "analysis_agent_1", "analysis_agent_2",
-            "total_rounds", "total_tokens", "total_cost_USD", "variant_reasoning"
-        ]
+    file_path = results_path(file_path)
+    if is_parquet(file_path):
+        write_results(file_path, results)
+    else:
+        new_rows = pd.DataFrame([_result_row(end_state, setup, tags) for end_state, setup, tags in results])
+        
+        # Games running in threads of one process may share the file
+        with _results_file_lock:
+            try:
+                df = pd.read_csv(file_path)
+            except FileNotFoundError:
+                df = new_rows
+            else:
+                df = pd.concat([df, new_rows], ignore_index=True)
+            df.to_csv(file_path, mode='w', header=True, index=False)
+    logger.info("Results of %d game(s) saved to %s", len(results), file_path)
+    update_aggregates(results)
 
-        end_state["agent_1_messages"] = [msg.replace('"', "'") for msg in end_state["agent_1_messages"]]
-        end_state["agent_2_messages"] = [msg.replace('"', "'") for msg in end_state["agent_2_messages"]]
-        end_state["agent_1_actions"] = [action.replace('"', "'") for action in end_state["agent_1_actions"]]
-        end_state["agent_2_actions"] = [action.replace('"', "'") for action in end_state["agent_2_actions"]]
 
-        new_row = pd.DataFrame([{
+def save_game_result(file_path: str, end_state: dict, setup: dict, tags: dict = None):
+    """
+    Append one game's result row to a CSV file.
+    
+    Args:
+        file_path (str): Path of the results CSV
+        end_state (dict): Final game state, including game_id, total_tokens and total_cost_USD
+        setup (dict): Columns describing the setup (game_name, base_game_name, variant_type,
+            regulator_model, model_provider_1, model_name_1, model_provider_2, model_name_2)
+            and the payoff_matrix the game was played with
+        tags (dict, optional): Extra columns stored with the result row
+    """
+    save_game_results(file_path, [(end_state, setup, tags)])
+
+
+def game_reporter(game_id: str, handler, progress_callback: Callable[[dict], None],
+                   event_log: EventLog) -> Callable[[dict], None]:
+    """
+    Event sink of one game: writes each event to the event log (tagged with the game id) and
+    passes game_started / round_completed events, with the cumulative prompt tokens and
+    successful requests so far, to the progress callback.
+    """
+    def report(event: dict):
+        if event_log:
+            event_log.emit(event["event"], game_id=game_id,
+                           **{key: value for key, value in event.items() if key != "event"})
+        if progress_callback and event["event"] in ("game_started", "round_completed"):
+            progress_callback({
+                **event,
+                "prompt_tokens": handler.prompt_tokens,
+                "successful_requests": handler.successful_requests,
+            })
+    return report
+
+
+def game_started_event(personality_key_1: str, personality_key_2: str, base_game_name: str,
+                        variant_type: str, total_rounds: int, tags: dict = None) -> dict:
+    return {
+        "event": "game_started",
+        "round": 0,
+        "cell": (tags or {}).get("cell_key"),
+        "personalities": [personality_key_1, personality_key_2],
+        "game": base_game_name,
+        "variant_type": variant_type,
+        "total_rounds": total_rounds,
+    }
+
+
+def game_finished_event(end_state, handler, started: float, variant_usage: dict = None) -> dict:
+    if isinstance(end_state, Exception):
+        return {
+            "event": "game_finished",
+            "status": "failed",
+            "error": f"{type(end_state).__name__}: {end_state}",
+            "duration_s": round(time.monotonic() - started, 3),
+        }
+    return {
+        "event": "game_finished",
+        "status": "ok",
+        "rounds": len(end_state["agent_1_actions"]),
+        "total_tokens": handler.total_tokens + (variant_usage or NO_VARIANT_USAGE)["total_tokens"],
+        "cost_usd": handler.total_cost + (variant_usage or NO_VARIANT_USAGE)["total_cost_USD"],
+        "duration_s": round(time.monotonic() - started, 3),
+    }
+
+
+def stream_game(compiled_graph, initial_state: dict, config: dict, report: Callable[[dict], None]) -> dict:
+    """
+    Run one game with `compiled_graph.stream` and report a round_completed event (actions and
+    scores) whenever an update_state step has been applied.
+    
+    Returns:
+        dict: Final game state
+    """
+    end_state, round_completed = None, False
+    for mode, chunk in compiled_graph.stream(initial_state, config=config, stream_mode=["updates", "values"]):
+        if mode == "updates":
+            round_completed = round_completed or "update_state" in chunk
+            continue
+        end_state = chunk
+        if round_completed:
+            round_completed = False
+            report({
+                "event": "round_completed",
+                "round": end_state["current_round"] - 1,
+                "actions": [end_state["agent_1_actions"][-1], end_state["agent_2_actions"][-1]],
+                "scores": [end_state["agent_1_scores"][-1], end_state["agent_2_scores"][-1]],
+            })
+    return end_state
+
+
+def run_regulated_game(
+    regulator_model_id: str,
+    regulator_provider: str,
+    player_model_1: str,
+    player_provider_1: str,
+    player_model_2: str,
+    player_provider_2: str,
+    total_rounds: int,
+    personality_key_1: str,
+    personality_key_2: str,
+    base_game_name: str,
+    variant_type: str = "complex",
+    file_path: str = None,
+    progress_callback: Callable[[dict], None] = None,
+    tags: dict = None,
+    variant_response: GameVariantResponse = None,
+    event_log: EventLog = None,
+    variant_usage: dict = None
+) -> RegulatedGameState:
+    """
+    Run a game with a regulator agent generating variants.
+    
+    Args:
+        regulator_model_id (str): Model ID for regulator (e.g., "gpt-4o")
+        regulator_provider (str): Provider for regulator model
+        player_model_1 (str): Model ID for player 1 (e.g., "gpt-4o-mini")
+        player_provider_1 (str): Provider for player 1 model
+        player_model_2 (str): Model ID for player 2
+        player_provider_2 (str): Provider for player 2 model
+        total_rounds (int): Number of rounds to play
+        personality_key_1 (str): MBTI personality for player 1
+        personality_key_2 (str): MBTI personality for player 2
+        base_game_name (str): Name of the base game
+        variant_type (str): Type of variant to generate
+        file_path (str): Path to save results
+        progress_callback (Callable, optional): Called with a "game_started" event before the
+            first round and a "round_completed" event after each round, including cumulative
+            prompt tokens and successful requests (used by benchmark_throughput.py)
+        tags (dict, optional): Extra columns stored with the result row (e.g. the sweep cell key)
+        variant_response (GameVariantResponse, optional): Variant to play instead of asking the
+            regulator for a new one (lets mirrored seatings share one variant)
+        event_log (EventLog, optional): Where to write the game's events (default: the log at
+            MBTI_EVENT_LOG, if set)
+        variant_usage (dict, optional): This game's share of the regulator call that produced a
+            shared `variant_response` (see variant_usage_shares); a variant generated here is
+            charged to the game in full
+    
+    Returns:
+        RegulatedGameState: Final game state, with a unique game_id; total_tokens and
+            total_cost_USD include the game's share of the regulator call
+    """
+    from usage_handler import UsageCallbackHandler
+    
+    # Step 1: Load base game
+    base_game = load_game_structure_from_registry(base_game_name)
+    
+    # Step 2: Generate variant using regulator agent (unless one is shared, e.g. by a mirrored pair)
+    if variant_response is None:
+        regulator_handler = UsageCallbackHandler()
+        variant_response = generate_variant(regulator_model_id, regulator_provider, base_game, variant_type,
+                                            callbacks=[regulator_handler])
+        variant_usage = variant_usage_shares(regulator_handler, 1)[0]
+    else:
+        logger.info("Using shared game variant - Complexity: %s", variant_response.complexity_level)
+    variant_usage = variant_usage or NO_VARIANT_USAGE
+    
+    # Step 3: Create and validate the variant game structure
+    variant_game = prepare_variant_game(base_game, variant_response)
+    
+    # Step 4: Set up player models
+    models = {
+        "agent_1": get_cached_model(player_model_1, provider=player_provider_1),
+        "agent_2": get_cached_model(player_model_2, provider=player_provider_2)
+    }
+    
+    intent_model = get_cached_model(INTENT_MODEL_ID)
+    callback_handler = UsageCallbackHandler()
+    game_id = uuid.uuid4().hex
+    report = game_reporter(
+        game_id, callback_handler, progress_callback, event_log or get_event_log()
+    )
+    
+    # Step 5: Stream the game on the cached graph; the game structure and models are runtime inputs
+    compiled_graph = get_game_graph()
+    initial_state = make_initial_state(
+        personality_key_1, personality_key_2, total_rounds, variant_response, regulator_model_id
+    )
+    
+    report(game_started_event(
+        personality_key_1, personality_key_2, base_game_name, variant_type, total_rounds, tags
+    ))
+    started = time.monotonic()
+    with log_context(game_id=game_id):
+        try:
+            end_state = stream_game(compiled_graph, initial_state, {
+                "recursion_limit": 200,
+                "callbacks": [callback_handler],
+                "configurable": game_configurable(
+                    models, intent_model, variant_game, game_id=game_id,
+                    on_retry=lambda retry: report({"event": "retry", **retry})
+                ),
+            }, report)
+        except Exception as e:
+            report(game_finished_event(e, callback_handler, started))
+            raise
+        report(game_finished_event(end_state, callback_handler, started, variant_usage))
+    end_state["game_id"] = game_id
+    end_state["total_tokens"] = callback_handler.total_tokens + variant_usage["total_tokens"]
+    end_state["total_cost_USD"] = callback_handler.total_cost + variant_usage["total_cost_USD"]
+    logger.info("Game finished: %s vs %s, total cost (USD): $%s",
+                personality_key_1, personality_key_2, end_state["total_cost_USD"])
+    
+    # Step 6: Save results
+    if file_path:
+        save_game_result(file_path, end_state, {
             "game_name": variant_game.game_name,
             "base_game_name": base_game_name,
             "variant_type": variant_type,
@@ -563,34 +780,197 @@ def run_regulated_game(
             "model_name_1": player_model_1,
             "model_provider_2": player_provider_2,
             "model_name_2": player_model_2,
-            "personality_1": personality_key_1,
-            "personality_2": personality_key_2,
-            "variant_complexity": variant_response.complexity_level,
-            "agent_1_scores": end_state["agent_1_scores"],
-            "agent_2_scores": end_state["agent_2_scores"],
-            "agent_1_messages": end_state["agent_1_messages"],
-            "agent_2_messages": end_state["agent_2_messages"],
-            "agent_1_actions": end_state["agent_1_actions"],
-            "agent_2_actions": end_state["agent_2_actions"],
-            "intent_agent_1": end_state["intent_agent_1"],
-            "intent_agent_2": end_state["intent_agent_2"],
-            "truthful_agent_1": end_state["truthful_agent_1"],
-            "truthful_agent_2": end_state["truthful_agent_2"],
-            "analysis_agent_1": end_state["analysis_agent_1"],
-            "analysis_agent_2": end_state["analysis_agent_2"],
-            "total_rounds": total_rounds,
-            "total_tokens": callback_handler.total_tokens,
-            "total_cost_USD": callback_handler.total_cost,
-            "variant_reasoning": variant_response.reasoning[:500]  # Truncate for CSV
-        }])
-        
-        try:
-            df = pd.read_csv(file_path)
-        except FileNotFoundError:
-            df = new_row
-        else:
-            df = pd.concat([df, new_row], ignore_index=True)
-        df.to_csv(file_path, mode='w', header=True, index=False)
-        print(f"Results saved to {file_path}")
+            "payoff_matrix": variant_game.payoff_matrix,
+        }, tags)
     
     return end_state
+
+
+def _prepare_game_batch(
+    regulator_model_id, regulator_provider, player_model_1, player_provider_1, player_model_2,
+    player_provider_2, total_rounds, personality_pairs, base_game_name, variant_type, file_path,
+    max_concurrency, progress_callback, tags, variant_response, event_log, variant_usage
+):
+    """
+    Shared setup of the batch runners: one variant and one model set for all games on the cached
+    compiled graph, plus a per-game config carrying its own callback handler and event reporter.
+
+    Returns:
+        tuple: (compiled graph, initial states, configs, finish) where finish(results) sets the
+            per-game totals, saves the result rows and returns the results
+    """
+    from usage_handler import UsageCallbackHandler
+    
+    base_game = load_game_structure_from_registry(base_game_name)
+    if variant_response is None:
+        regulator_handler = UsageCallbackHandler()
+        variant_response = generate_variant(regulator_model_id, regulator_provider, base_game, variant_type,
+                                            callbacks=[regulator_handler])
+        variant_usage = variant_usage_shares(regulator_handler, len(personality_pairs))
+    variant_usage = variant_usage or [NO_VARIANT_USAGE] * len(personality_pairs)
+    variant_game = prepare_variant_game(base_game, variant_response)
+    
+    models = {
+        "agent_1": get_cached_model(player_model_1, provider=player_provider_1),
+        "agent_2": get_cached_model(player_model_2, provider=player_provider_2)
+    }
+    intent_model = get_cached_model(INTENT_MODEL_ID)
+    compiled_graph = get_game_graph()
+    
+    handlers = [UsageCallbackHandler() for _ in personality_pairs]
+    game_ids = [uuid.uuid4().hex for _ in personality_pairs]
+    event_log = event_log or get_event_log()
+    
+    def game_progress(index: int):
+        if progress_callback:
+            return lambda event: progress_callback({**event, "game_index": index})
+        return None
+    
+    reporters = [
+        game_reporter(game_id, handler, game_progress(index), event_log)
+        for index, (game_id, handler) in enumerate(zip(game_ids, handlers))
+    ]
+    
+    states = [
+        make_initial_state(p1, p2, total_rounds, variant_response, regulator_model_id)
+        for p1, p2 in personality_pairs
+    ]
+    configs = [
+        {
+            "recursion_limit": 200,
+            "max_concurrency": max_concurrency,
+            "callbacks": [handler],
+            "configurable": game_configurable(
+                models, intent_model, variant_game, game_id=game_ids[index],
+                on_round_completed=reporters[index],
+                on_retry=lambda retry, report=reporters[index]: report({"event": "retry", **retry})
+            ),
+        }
+        for index, handler in enumerate(handlers)
+    ]
+    setup = {
+        "game_name": variant_game.game_name,
+        "base_game_name": base_game_name,
+        "variant_type": variant_type,
+        "regulator_model": regulator_model_id,
+        "model_provider_1": player_provider_1,
+        "model_name_1": player_model_1,
+        "model_provider_2": player_provider_2,
+        "model_name_2": player_model_2,
+        "payoff_matrix": variant_game.payoff_matrix,
+    }
+    
+    def finish(results: list) -> list:
+        finished = []
+        for index, (end_state, handler) in enumerate(zip(results, handlers)):
+            reporters[index](game_finished_event(end_state, handler, started, variant_usage[index]))
+            if isinstance(end_state, Exception):
+                logger.error("Game %d %s failed: %s: %s", index, personality_pairs[index],
+                             type(end_state).__name__, end_state)
+                continue
+            end_state["game_id"] = game_ids[index]
+            end_state["total_tokens"] = handler.total_tokens + variant_usage[index]["total_tokens"]
+            end_state["total_cost_USD"] = handler.total_cost + variant_usage[index]["total_cost_USD"]
+            finished.append((end_state, setup, tags[index] if tags else None))
+        # One read/concat/write (and one aggregates transaction) for all games of the batch
+        if file_path and finished:
+            save_game_results(file_path, finished)
+        total_cost = sum(h.total_cost for h in handlers) + sum(usage["total_cost_USD"] for usage in variant_usage)
+        logger.info("Total cost (USD): $%s for %d games", total_cost, len(results))
+        get_judge_service(intent_model).log_stats()
+        return results
+    
+    for index, (p1, p2) in enumerate(personality_pairs):
+        reporters[index](game_started_event(
+            p1, p2, base_game_name, variant_type, total_rounds, tags[index] if tags else None
+        ))
+    started = time.monotonic()
+    return compiled_graph, states, configs, finish
+
+
+def run_regulated_game_batch(
+    regulator_model_id: str,
+    regulator_provider: str,
+    player_model_1: str,
+    player_provider_1: str,
+    player_model_2: str,
+    player_provider_2: str,
+    total_rounds: int,
+    personality_pairs: List[tuple],
+    base_game_name: str,
+    variant_type: str = "complex",
+    file_path: str = None,
+    max_concurrency: int = 8,
+    progress_callback: Callable[[dict], None] = None,
+    tags: List[dict] = None,
+    variant_response: GameVariantResponse = None,
+    event_log: EventLog = None,
+    variant_usage: List[dict] = None
+) -> list:
+    """
+    Play many games on one variant and one model set through a single compiled graph.
+    
+    The variant and the models are created once and the compiled graph is cached per process;
+    the games (one per personality pair) then run in parallel via `compiled_graph.batch`, at most
+    `max_concurrency` at a time. Request-level concurrency is still governed by the shared
+    request executor.
+    
+    Args:
+        regulator_model_id (str): Model ID for regulator (e.g., "gpt-4o")
+        regulator_provider (str): Provider for regulator model
+        player_model_1 (str): Model ID for player 1 (e.g., "gpt-4o-mini")
+        player_provider_1 (str): Provider for player 1 model
+        player_model_2 (str): Model ID for player 2
+        player_provider_2 (str): Provider for player 2 model
+        total_rounds (int): Number of rounds to play
+        personality_pairs (List[tuple]): (personality_1, personality_2) of each game
+        base_game_name (str): Name of the base game
+        variant_type (str): Type of variant to generate
+        file_path (str): Path to save results
+        max_concurrency (int): Maximum number of games running at the same time
+        progress_callback (Callable, optional): Like in run_regulated_game, with a "game_index" key
+        tags (List[dict], optional): Extra result columns for each game
+        variant_response (GameVariantResponse, optional): Shared variant instead of a new one
+        event_log (EventLog, optional): Where to write the games' events (default: MBTI_EVENT_LOG)
+        variant_usage (List[dict], optional): Each game's share of the regulator call behind a
+            shared variant (see variant_usage_shares); a variant generated here is split evenly
+    
+    Returns:
+        list: Final game state of each game, or the exception that game raised
+    """
+    compiled_graph, states, configs, finish = _prepare_game_batch(
+        regulator_model_id, regulator_provider, player_model_1, player_provider_1, player_model_2,
+        player_provider_2, total_rounds, personality_pairs, base_game_name, variant_type, file_path,
+        max_concurrency, progress_callback, tags, variant_response, event_log, variant_usage
+    )
+    return finish(compiled_graph.batch(states, configs, return_exceptions=True))
+
+
+async def arun_regulated_game_batch(
+    regulator_model_id: str,
+    regulator_provider: str,
+    player_model_1: str,
+    player_provider_1: str,
+    player_model_2: str,
+    player_provider_2: str,
+    total_rounds: int,
+    personality_pairs: List[tuple],
+    base_game_name: str,
+    variant_type: str = "complex",
+    file_path: str = None,
+    max_concurrency: int = 8,
+    progress_callback: Callable[[dict], None] = None,
+    tags: List[dict] = None,
+    variant_response: GameVariantResponse = None,
+    event_log: EventLog = None,
+    variant_usage: List[dict] = None
+) -> list:
+    """
+    Async version of run_regulated_game_batch (uses `compiled_graph.abatch`).
+    """
+    compiled_graph, states, configs, finish = _prepare_game_batch(
+        regulator_model_id, regulator_provider, player_model_1, player_provider_1, player_model_2,
+        player_provider_2, total_rounds, personality_pairs, base_game_name, variant_type, file_path,
+        max_concurrency, progress_callback, tags, variant_response, event_log, variant_usage
+    )
+    return finish(await compiled_graph.abatch(states, configs, return_exceptions=True))
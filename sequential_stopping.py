@@ -0,0 +1,326 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Adaptive sequential stopping: stop replicating a condition once its estimates are tight enough
+
+import argparse
+import json
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from statistics import NormalDist
+
+from aggregates import METRICS, RATE_METRICS, RunningStats, game_metrics
+from logging_setup import setup_logging, worker_logging
+from sweep import SweepCell, SweepSpec, run_unit
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StoppingRule:
+    """
+    When a condition has enough replicates.
+
+    method "ci": every metric's normal confidence interval half-width is below its target.
+    method "bayes": rates use a Beta(1 + successes, 1 + failures) posterior over the pooled
+    agent-round decisions (ignoring within-game correlation, so it stops earlier than "ci" on
+    near-deterministic cells) and stop when the normal approximation of the credible interval is
+    below the target; score_diff still uses the confidence interval.
+    """
+    method: str = "ci"
+    confidence: float = 0.95
+    rate_half_width: float = 0.1
+    score_half_width: float = 0.5
+    min_replicates: int = 3
+    max_replicates: int = 20
+
+    def __post_init__(self):
+        if self.method not in ("ci", "bayes"):
+            raise ValueError(f"Unknown stopping method: {self.method}")
+        if not 2 <= self.min_replicates <= self.max_replicates:
+            raise ValueError("Need 2 <= min_replicates <= max_replicates")
+
+    @property
+    def z(self) -> float:
+        return NormalDist().inv_cdf(0.5 + self.confidence / 2)
+
+    def half_width(self, metric: str, state: "ConditionState") -> float:
+        if self.method == "bayes" and metric in RATE_METRICS:
+            a = 1 + state.successes[metric]
+            b = 1 + state.trials[metric] - state.successes[metric]
+            return self.z * math.sqrt(a * b / ((a + b) ** 2 * (a + b + 1)))
+        return state.stats[metric].ci_half_width(self.z)
+
+    def target(self, metric: str) -> float:
+        return self.rate_half_width if metric in RATE_METRICS else self.score_half_width
+
+
+@dataclass
+class ConditionState:
+    template: SweepCell
+    stats: dict = field(default_factory=lambda: {m: RunningStats() for m in METRICS})
+    successes: dict = field(default_factory=lambda: {m: 0.0 for m in RATE_METRICS})
+    trials: dict = field(default_factory=lambda: {m: 0 for m in RATE_METRICS})
+    in_flight: int = 0
+    launched: int = 0
+
+    @property
+    def completed(self) -> int:
+        return self.stats[METRICS[0]].n
+
+
+class SequentialScheduler:
+    """
+    Decide which condition gets the next replicate.
+
+    Every condition first receives `min_replicates`. After that, replicates go to the
+    unconverged condition whose widest interval is furthest from its target, so budget saved on
+    conditions that converge early is spent on the high-variance ones.
+
+    With `mirror_pairs`, a condition's replicate is launched together with the same replicate of
+    its mirrored condition (seats swapped) as one unit, so both seatings share a regulator
+    variant. Each seating keeps its own statistics (score_diff is agent_1 - agent_2).
+    """
+
+    def __init__(self, cells: list, rule: StoppingRule, mirror_pairs: bool = False):
+        self.rule = rule
+        self.mirror_pairs = mirror_pairs
+        self.conditions = {}
+        for cell in cells:
+            self.conditions.setdefault(cell.condition_key, ConditionState(template=replace(cell, replicate=0)))
+
+    def record(self, condition_key: str, metrics: dict, replicate: int = None):
+        state = self.conditions[condition_key]
+        for metric in METRICS:
+            state.stats[metric].add(metrics[metric])
+        for metric in RATE_METRICS:
+            state.trials[metric] += metrics["observations"][metric]
+            state.successes[metric] += metrics[metric] * metrics["observations"][metric]
+        if replicate is not None:
+            state.launched = max(state.launched, replicate + 1)
+
+    def precision_ratio(self, state: ConditionState) -> float:
+        """
+        Largest half-width / target over all metrics (<= 1 means converged).
+        """
+        return max(self.rule.half_width(m, state) / self.rule.target(m) for m in METRICS)
+
+    def status(self, state: ConditionState) -> str:
+        if state.completed < self.rule.min_replicates:
+            return "running"
+        if self.precision_ratio(state) <= 1:
+            return "converged"
+        if state.completed >= self.rule.max_replicates:
+            return "max_replicates"
+        return "running"
+
+    def next_unit(self):
+        """
+        Next unit (one cell, or a mirrored pair with `mirror_pairs`) to launch, or None if every
+        condition is converged, capped or waiting on results.
+        """
+        candidates = []
+        for state in self.conditions.values():
+            if state.launched >= self.rule.max_replicates or self.status(state) != "running":
+                continue
+            if state.launched < self.rule.min_replicates:
+                # Warm-up replicates first, fewest launched first
+                candidates.append((0, state.launched, state))
+            elif state.in_flight == 0:
+                # Wait for results before adding more: the interval may already be tight enough
+                candidates.append((1, -self.precision_ratio(state), state))
+        if not candidates:
+            return None
+        _, _, state = min(candidates, key=lambda c: c[:2])
+        states = [state]
+        if self.mirror_pairs:
+            mirrored = self.conditions.get(state.template.mirrored.condition_key)
+            if mirrored is not None and mirrored is not state:
+                states.append(mirrored)
+        # Both seatings of a pair take the same replicate index, so their rows share a pair_key
+        replicate = max(s.launched for s in states)
+        unit = []
+        for s in states:
+            unit.append(replace(s.template, replicate=replicate))
+            s.launched = replicate + 1
+            s.in_flight += 1
+        return sorted(unit, key=lambda c: c.seating)
+
+    def finished(self, cell: SweepCell, metrics: dict):
+        self.conditions[cell.condition_key].in_flight -= 1
+        self.record(cell.condition_key, metrics)
+
+    def failed(self, cell: SweepCell):
+        self.conditions[cell.condition_key].in_flight -= 1
+
+    def summary(self) -> list:
+        rows = []
+        for key, state in self.conditions.items():
+            rows.append({
+                "condition_key": key,
+                "replicates": state.completed,
+                "status": self.status(state),
+                **{f"{m}_mean": state.stats[m].mean for m in METRICS},
+                **{f"{m}_half_width": self.rule.half_width(m, state) for m in METRICS},
+            })
+        return rows
+
+
+def load_results(scheduler: SequentialScheduler, csv_path: str) -> int:
+    """
+    Seed the scheduler with result rows saved by an earlier (interrupted) run.
+    """
+    from parquet_store import read_results_frame
+
+    df = read_results_frame(csv_path)
+    loaded = 0
+    for _, row in df.drop_duplicates(subset="cell_key").iterrows():
+        condition_key, _, replicate = row["cell_key"].rpartition("|r")
+        if condition_key not in scheduler.conditions:
+            continue
+        game_name = scheduler.conditions[condition_key].template.game_name
+        scheduler.record(condition_key, game_metrics(game_name, row), replicate=int(replicate))
+        loaded += 1
+    return loaded
+
+
+def load_aggregates(scheduler: SequentialScheduler, db_path: str) -> int:
+    """
+    Seed the scheduler from the per-cell statistics of an aggregate store (see aggregates.py),
+    without rescanning results.
+    """
+    from aggregates import AggregateStore
+
+    rows = {}
+    for row in AggregateStore(db_path).query("cell"):
+        rows.setdefault(row["condition_key"], {})[row["metric"]] = row
+    loaded = 0
+    for condition_key, metrics in rows.items():
+        state = scheduler.conditions.get(condition_key)
+        if state is None or METRICS[0] not in metrics:
+            continue
+        for metric in METRICS:
+            if metric in metrics:
+                row = metrics[metric]
+                state.stats[metric].merge(RunningStats(row["n"], row["mean"], row["m2"]))
+        for metric in RATE_METRICS:
+            state.trials[metric] += int(metrics.get(f"{metric}_trials", {}).get("total", 0))
+            state.successes[metric] += metrics.get(f"{metric}_successes", {}).get("total", 0.0)
+        if "replicate" in metrics:
+            state.launched = max(state.launched, int(metrics["replicate"]["max"]) + 1)
+        loaded += metrics[METRICS[0]]["n"]
+    return loaded
+
+
+def run_replicate(unit: list, output_dir: str, api_base: str = None, mirror_pairs: bool = False,
+                  concurrent_seatings: bool = False) -> list:
+    """
+    Worker process entry point: run one replicate unit and return the metrics of each cell.
+    """
+    if api_base:
+        os.environ["MBTI_API_BASE"] = api_base
+    date_string = datetime.now().strftime("%y%m%d")
+    file_path = os.path.join(output_dir, f"{date_string}_regulated_adaptive_{os.getpid()}.csv")
+    log_dir = os.path.join(output_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    with worker_logging(os.path.join(log_dir, f"adaptive_{os.getpid()}.log")):
+        end_states = run_unit(unit, file_path, mirror_pairs, concurrent_seatings)
+    return [game_metrics(cell.game_name, end_state) for cell, end_state in zip(unit, end_states)]
+
+
+def main(args):
+    setup_logging()
+    spec = SweepSpec.from_file(args.spec)
+    rule = StoppingRule(
+        method=args.method,
+        confidence=args.confidence,
+        rate_half_width=args.rate_half_width,
+        score_half_width=args.score_half_width,
+        min_replicates=args.min_replicates,
+        max_replicates=max(args.max_replicates or StoppingRule.max_replicates, args.min_replicates),
+    )
+    scheduler = SequentialScheduler(spec.expand(), rule, mirror_pairs=spec.mirror_pairs)
+    for path in args.resume or []:
+        print(f"Loaded {load_results(scheduler, path)} earlier results from {path}")
+    if args.resume_aggregates:
+        print(f"Loaded {load_aggregates(scheduler, args.resume_aggregates)} earlier results "
+              f"from {args.resume_aggregates}")
+
+    n_conditions = len(scheduler.conditions)
+    budget = args.budget or n_conditions * rule.max_replicates
+    print(f"Adaptive sweep {args.spec}: {n_conditions} conditions, {rule.min_replicates}-{rule.max_replicates} "
+          f"replicates each, budget {budget} games", flush=True)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    launched, completed, failed = 0, 0, 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        running = {}
+        while True:
+            while len(running) < args.workers and launched < budget:
+                unit = scheduler.next_unit()
+                if unit is None:
+                    break
+                running[pool.submit(run_replicate, unit, args.output_dir, args.api_base,
+                                    spec.mirror_pairs, spec.concurrent_seatings)] = unit
+                launched += len(unit)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = running.pop(future)
+                try:
+                    for cell, metrics in zip(unit, future.result()):
+                        scheduler.finished(cell, metrics)
+                    completed += len(unit)
+                except Exception as e:
+                    logger.error("Error in %s: %s: %s", " / ".join(c.key for c in unit), type(e).__name__, e)
+                    for cell in unit:
+                        scheduler.failed(cell)
+                    failed += len(unit)
+            if args.verbose:
+                print(f"  {completed} completed, {failed} failed, {len(running)} running", flush=True)
+
+    summary = scheduler.summary()
+    statuses = {}
+    for row in summary:
+        statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+    fixed_design = n_conditions * rule.max_replicates
+    print(f"✓ {completed} games run ({failed} failed) vs {fixed_design} for a fixed design; "
+          f"conditions: {statuses}")
+
+    summary_path = os.path.join(args.output_dir, f"adaptive_summary_{datetime.now().strftime('%y%m%d_%H%M%S')}.json")
+    with open(summary_path, "w") as f:
+        json.dump({"spec": args.spec, "rule": vars(rule), "games": completed, "conditions": summary}, f, indent=2)
+    print(f"Summary saved to {summary_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a sweep with adaptive per-condition stopping")
+    parser.add_argument("spec", type=str, help="Path to the sweep spec (see sweeps/)")
+    parser.add_argument("--method", type=str, default="ci", choices=["ci", "bayes"])
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--rate_half_width", type=float, default=0.1,
+                       help="Target half-width for cooperation rate and truthfulness")
+    parser.add_argument("--score_half_width", type=float, default=0.5,
+                       help="Target half-width for the per-round score difference")
+    parser.add_argument("--min_replicates", type=int, default=3)
+    parser.add_argument("--max_replicates", type=int, required=False,
+                       help=f"Per-condition cap (default: {StoppingRule.max_replicates}; the spec's replicates "
+                            "are ignored)")
+    parser.add_argument("--budget", type=int, required=False, help="Total games to run at most")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--resume", type=str, nargs="*", help="Result CSVs of an earlier run to start from")
+    parser.add_argument("--resume_aggregates", type=str, required=False,
+                        help="Aggregate database (aggregates.py) of earlier runs to start from, instead of --resume")
+    parser.add_argument("--output_dir", type=str, default="data/outputs")
+    parser.add_argument("--api_base", type=str, required=False,
+                       help="OpenAI-compatible endpoint (default: OpenRouter, or MBTI_API_BASE)")
+    parser.add_argument("--verbose", action="store_true")
+    main(parser.parse_args())
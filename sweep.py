@@ -0,0 +1,376 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Declarative factorial sweeps: expand a spec file into cells and shard them across processes
+
+import argparse
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Union
+
+from config import BASE_VARIANT_TYPE, ExperimentConfig, GAME_NAMES, VARIANT_TYPES, load_personality_keys
+from event_log import EVENT_LOG_ENV
+from logging_setup import setup_logging, worker_logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SweepCell:
+    """
+    One fully specified experiment (a point of the factorial design plus a replicate index).
+    """
+    personality_1: str
+    personality_2: str
+    game_name: str
+    variant_type: str
+    regulator_model: str
+    player_model_1: str
+    player_model_2: str
+    rounds: int
+    replicate: int = 0
+
+    @property
+    def condition_key(self) -> str:
+        """
+        Key of the experimental condition, shared by all replicates of the cell.
+        """
+        return "|".join([
+            self.personality_1, self.personality_2, self.game_name, self.variant_type,
+            self.regulator_model, self.player_model_1, self.player_model_2, str(self.rounds),
+        ])
+
+    @property
+    def key(self) -> str:
+        return f"{self.condition_key}|r{self.replicate}"
+
+    @property
+    def mirrored(self) -> "SweepCell":
+        """
+        The same matchup with the two seats swapped (personalities and player models).
+        """
+        return replace(self, personality_1=self.personality_2, personality_2=self.personality_1,
+                       player_model_1=self.player_model_2, player_model_2=self.player_model_1)
+
+    @property
+    def pair_key(self) -> str:
+        """
+        Key shared by a cell and its mirrored cell (the smaller of the two cell keys).
+        """
+        return min(self.key, self.mirrored.key)
+
+    @property
+    def seating(self) -> str:
+        """
+        "AB" for the seating whose key is the pair key, "BA" for the mirrored one.
+        """
+        return "AB" if self.key == self.pair_key else "BA"
+
+    def to_config(self, output_dir: str = "data/outputs") -> ExperimentConfig:
+        return ExperimentConfig(
+            regulator_model=self.regulator_model,
+            player_model_1=self.player_model_1,
+            player_model_2=self.player_model_2,
+            base_game_name=self.game_name,
+            variant_type=self.variant_type,
+            rounds=self.rounds,
+            personality_1=self.personality_1,
+            personality_2=self.personality_2,
+            output_dir=output_dir,
+        )
+
+
+@dataclass
+class SweepSpec:
+    """
+    Factorial design over personalities, games, variant types, models, rounds and replicates.
+
+    `personalities` is a list of keys, "mbti" (the 16 types in the priming file) or "all"
+    (every key in the priming file). `personalities_2` defaults to the same set; set it to
+    a different list for focal designs. `player_models` entries are either a model id (used
+    for both players) or a [player_1, player_2] pair.
+
+    With `mirror_pairs`, a cell and its mirror (seats swapped) form one unit that shares a single
+    regulator variant; `concurrent_seatings` plays the two seatings at the same time.
+    """
+    personalities: Union[str, list] = "mbti"
+    personalities_2: Union[str, list, None] = None
+    games: list = field(default_factory=lambda: ["prisoners_dilemma"])
+    variant_types: list = field(default_factory=lambda: ["complex"])
+    regulator_models: list = field(default_factory=lambda: ["gpt-4o"])
+    player_models: list = field(default_factory=lambda: ["gpt-4o-mini"])
+    rounds: list = field(default_factory=lambda: [7])
+    replicates: int = 1
+    include_self_play: bool = True
+    mirror_pairs: bool = False
+    concurrent_seatings: bool = False
+
+    @classmethod
+    def from_file(cls, path: str) -> "SweepSpec":
+        with open(path) as f:
+            data = json.load(f)
+        unknown = set(data) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown sweep spec fields in {path}: {sorted(unknown)}")
+        return cls(**data)
+
+    @staticmethod
+    def _resolve_personalities(value) -> list:
+        if value == "mbti":
+            return load_personality_keys(mbti_only=True)
+        if value == "all":
+            return load_personality_keys()
+        available = set(load_personality_keys())
+        unknown = [p for p in value if p not in available]
+        if unknown:
+            raise ValueError(f"Unknown personalities: {unknown}")
+        return list(value)
+
+    def validate(self):
+        for game in self.games:
+            if game not in GAME_NAMES:
+                raise ValueError(f"Unknown game name: {game}")
+        for variant_type in self.variant_types:
+            if variant_type not in VARIANT_TYPES + [BASE_VARIANT_TYPE]:
+                raise ValueError(f"Unknown variant type: {variant_type}")
+        if self.replicates < 1:
+            raise ValueError("replicates must be >= 1")
+
+    def expand(self) -> list[SweepCell]:
+        """
+        Expand the design into cells, dropping duplicates while keeping first-seen order.
+        """
+        self.validate()
+        personalities_1 = self._resolve_personalities(self.personalities)
+        personalities_2 = self._resolve_personalities(
+            self.personalities if self.personalities_2 is None else self.personalities_2
+        )
+        player_pairs = [(m, m) if isinstance(m, str) else tuple(m) for m in self.player_models]
+
+        cells = {}
+        for p1, p2, game, variant_type, regulator, (m1, m2), rounds, replicate in itertools.product(
+            personalities_1, personalities_2, self.games, self.variant_types,
+            self.regulator_models, player_pairs, self.rounds, range(self.replicates),
+        ):
+            if p1 == p2 and not self.include_self_play:
+                continue
+            cell = SweepCell(p1, p2, game, variant_type, regulator, m1, m2, int(rounds), replicate)
+            cells.setdefault(cell.key, cell)
+        return list(cells.values())
+
+
+    def units(self) -> list[list[SweepCell]]:
+        """
+        Expand the design into units of work: single cells, or mirrored pairs with `mirror_pairs`.
+        """
+        cells = self.expand()
+        if not self.mirror_pairs:
+            return [[cell] for cell in cells]
+        return group_mirrored(cells)
+
+
+def group_mirrored(cells: list) -> list[list[SweepCell]]:
+    """
+    Group each cell with its mirrored cell (if present), keeping first-seen order.
+    """
+    units = {}
+    for cell in cells:
+        units.setdefault(cell.pair_key, []).append(cell)
+    return [sorted(unit, key=lambda c: c.seating) for unit in units.values()]
+
+
+def shard_cells(cells: list, n_shards: int) -> list[list]:
+    """
+    Split cells (or units) into `n_shards` balanced shards (round-robin, so every shard gets a mix of conditions).
+    """
+    return [cells[i::n_shards] for i in range(n_shards)]
+
+
+def run_cell(cell: SweepCell, file_path: str, tags: dict = None, variant_response=None, variant_usage: dict = None):
+    """
+    Run one sweep cell and append its result row (tagged with the cell key) to `file_path`.
+
+    `variant_usage` is the cell's share of the regulator call behind a shared `variant_response`.
+    """
+    from run_regulated_game import run_regulated_game
+
+    config = cell.to_config()
+    return run_regulated_game(
+        regulator_model_id=config.regulator_model,
+        regulator_provider=config.regulator_provider,
+        player_model_1=config.player_model_1,
+        player_provider_1=config.player_provider_1,
+        player_model_2=config.player_model_2,
+        player_provider_2=config.player_provider_2,
+        total_rounds=config.rounds,
+        personality_key_1=config.personality_1,
+        personality_key_2=config.personality_2,
+        base_game_name=config.base_game_name,
+        variant_type=config.variant_type,
+        file_path=file_path,
+        tags={"cell_key": cell.key, "replicate": cell.replicate, **(tags or {})},
+        variant_response=variant_response,
+        variant_usage=variant_usage,
+    )
+
+
+def run_mirrored_pair(cells: list, file_path: str, concurrent: bool = False, tags: dict = None) -> list:
+    """
+    Play both seatings of a mirrored pair on one shared regulator variant.
+
+    Rows are tagged with `pair_key` and `seating` ("AB"/"BA") so position effects can be
+    separated from personality effects. The regulator call is split evenly over the seatings'
+    total_tokens and total_cost_USD.
+
+    Returns:
+        list: The end state of each seating, in the order of `cells`
+    """
+    from usage_handler import UsageCallbackHandler
+    from run_regulated_game import generate_variant, run_regulated_game_batch, variant_usage_shares
+    from node_helpers import load_game_structure_from_registry
+
+    config = cells[0].to_config()
+    regulator_handler = UsageCallbackHandler()
+    variant_response = generate_variant(
+        config.regulator_model, config.regulator_provider,
+        load_game_structure_from_registry(config.base_game_name), config.variant_type,
+        callbacks=[regulator_handler],
+    )
+    shares = dict(zip((cell.key for cell in cells), variant_usage_shares(regulator_handler, len(cells))))
+
+    def pair_tags(cell):
+        return {"pair_key": cell.pair_key, "seating": cell.seating, **(tags or {})}
+
+    def play(cell):
+        return run_cell(cell, file_path, variant_response=variant_response, tags=pair_tags(cell),
+                        variant_usage=shares[cell.key])
+
+    if concurrent and len(cells) > 1:
+        if config.player_model_1 == config.player_model_2:
+            # Same model in both seats: both seatings run through one compiled graph
+            end_states = run_regulated_game_batch(
+                regulator_model_id=config.regulator_model,
+                regulator_provider=config.regulator_provider,
+                player_model_1=config.player_model_1,
+                player_provider_1=config.player_provider_1,
+                player_model_2=config.player_model_2,
+                player_provider_2=config.player_provider_2,
+                total_rounds=config.rounds,
+                personality_pairs=[(cell.personality_1, cell.personality_2) for cell in cells],
+                base_game_name=config.base_game_name,
+                variant_type=config.variant_type,
+                file_path=file_path,
+                max_concurrency=len(cells),
+                tags=[{"cell_key": cell.key, "replicate": cell.replicate, **pair_tags(cell)} for cell in cells],
+                variant_response=variant_response,
+                variant_usage=[shares[cell.key] for cell in cells],
+            )
+            for end_state in end_states:
+                if isinstance(end_state, Exception):
+                    raise end_state
+            return end_states
+        with ThreadPoolExecutor(max_workers=len(cells)) as pool:
+            return list(pool.map(play, cells))
+    return [play(cell) for cell in cells]
+
+
+def run_unit(unit: list, file_path: str, mirror_pairs: bool = False, concurrent: bool = False,
+             tags: dict = None) -> list:
+    """
+    Run one unit of `SweepSpec.units()`: a mirrored pair (on one shared variant) with
+    `mirror_pairs`, otherwise its single cell.
+
+    Returns:
+        list: The end state of each cell, in the order of `unit`
+    """
+    if mirror_pairs:
+        return run_mirrored_pair(unit, file_path, concurrent=concurrent, tags=tags)
+    return [run_cell(unit[0], file_path, tags=tags)]
+
+
+def run_shard(shard_index: int, units: list, output_dir: str, api_base: str = None,
+              mirror_pairs: bool = False, concurrent_seatings: bool = False) -> dict:
+    """
+    Worker process entry point: run every unit (cell or mirrored pair) of one shard sequentially.
+
+    Each shard writes its own CSV and log file so workers never contend for a file.
+    """
+    if api_base:
+        os.environ["MBTI_API_BASE"] = api_base
+    date_string = datetime.now().strftime("%y%m%d")
+    file_path = os.path.join(output_dir, f"{date_string}_regulated_shard{shard_index}.csv")
+    log_dir = os.path.join(output_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    completed, failed = 0, []
+    with worker_logging(os.path.join(log_dir, f"shard{shard_index}.log")):
+        for unit in units:
+            try:
+                run_unit(unit, file_path, mirror_pairs, concurrent_seatings)
+                completed += len(unit)
+            except Exception as e:
+                logger.error("Error in %s: %s: %s", " / ".join(c.key for c in unit), type(e).__name__, e)
+                failed.extend(c.key for c in unit)
+    return {"shard": shard_index, "file_path": file_path, "completed": completed, "failed": failed}
+
+
+def main(args):
+    setup_logging()
+    spec = SweepSpec.from_file(args.spec)
+    units = spec.units()
+    cells = [cell for unit in units for cell in unit]
+    shards = shard_cells(units, args.workers)
+    if args.shard is not None:
+        # Run a single shard (e.g. one of several machines working through the same spec)
+        shards = [shards[args.shard] if i == args.shard else [] for i in range(args.workers)]
+
+    # Base-game units play the unmodified game without a regulator call
+    regulator_calls = sum(unit[0].variant_type != BASE_VARIANT_TYPE for unit in units)
+    print(f"Sweep {args.spec}: {len(cells)} cells in {len(units)} units "
+          f"({regulator_calls} regulator calls), {args.workers} shards "
+          f"({', '.join(str(sum(len(u) for u in s)) for s in shards)} cells each)", flush=True)
+    if args.dry_run:
+        for cell in cells[:args.show]:
+            print(f"  {cell.key}")
+        if len(cells) > args.show:
+            print(f"  ... {len(cells) - args.show} more")
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.event_log:
+        os.environ[EVENT_LOG_ENV] = args.event_log  # inherited by the shard processes
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(run_shard, index, shard, args.output_dir, args.api_base,
+                        spec.mirror_pairs, spec.concurrent_seatings)
+            for index, shard in enumerate(shards) if shard
+        ]
+        for future in as_completed(futures):
+            summary = future.result()
+            print(f"✓ Shard {summary['shard']}: {summary['completed']} completed, "
+                  f"{len(summary['failed'])} failed -> {summary['file_path']}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a factorial sweep described by a JSON spec file")
+    parser.add_argument("spec", type=str, help="Path to the sweep spec (see sweeps/)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                       help="Number of worker processes / shards")
+    parser.add_argument("--shard", type=int, required=False,
+                       help="Only run this shard index (0-based) out of --workers")
+    parser.add_argument("--output_dir", type=str, default="data/outputs")
+    parser.add_argument("--api_base", type=str, required=False,
+                       help="OpenAI-compatible endpoint (default: OpenRouter, or MBTI_API_BASE)")
+    parser.add_argument("--event_log", type=str, required=False,
+                       help="Append game events to this JSONL file (follow with event_log.py)")
+    parser.add_argument("--dry_run", action="store_true", help="Only expand and print the cells")
+    parser.add_argument("--show", type=int, default=20, help="Cells to print in --dry_run")
+    main(parser.parse_args())
@@ -0,0 +1,230 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Round-robin personality tournaments on one game: pairwise payoff and cooperation matrices
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+from config import BASE_VARIANT_TYPE, COOPERATIVE_ACTIONS, GAME_NAMES, VARIANT_TYPES, load_personality_keys
+
+
+def tournament_pairs(personalities: list, focal: str = None, include_self_play: bool = False,
+                     replicates: int = 1) -> list:
+    """
+    Seatings (personality_1, personality_2) of a tournament.
+
+    Every ordered pair is played, so each matchup is seen from both seats. With a focal
+    personality only the matchups of the focal personality against all others are played.
+
+    Args:
+        personalities (list): Personality keys taking part
+        focal (str, optional): Only play this personality against all others
+        include_self_play (bool): Also play each personality against itself
+        replicates (int): Number of times every seating is played
+
+    Returns:
+        list[tuple]: (personality_1, personality_2) of each game
+    """
+    pairs = []
+    for p1 in personalities:
+        for p2 in personalities:
+            if p1 == p2 and not include_self_play:
+                continue
+            if focal is not None and focal not in (p1, p2):
+                continue
+            pairs.append((p1, p2))
+    return pairs * replicates
+
+
+def _cooperation(game_name: str, own_actions: list, other_actions: list) -> float:
+    """
+    Share of an agent's rounds that were cooperative (coordination rate for battle of the sexes).
+    """
+    rounds = max(len(own_actions), 1)
+    cooperative_action = COOPERATIVE_ACTIONS.get(game_name)
+    if cooperative_action is None:
+        return sum(a == b for a, b in zip(own_actions, other_actions)) / rounds
+    return sum(a == cooperative_action for a in own_actions) / rounds
+
+
+def tournament_matrices(game_name: str, personalities: list, end_states: list) -> dict:
+    """
+    Pairwise payoff and cooperation matrices of a tournament.
+
+    Entry [i][j] is the mean over all games of personality i against personality j (in either
+    seat) of i's per-round score, respectively i's cooperation rate. Matchups without a
+    finished game are None.
+
+    Args:
+        game_name (str): Name of the base game (selects the cooperative action)
+        personalities (list): Row and column order of the matrices
+        end_states (list): Final game states; failed games (exceptions) are skipped
+
+    Returns:
+        dict: "personalities", "payoff", "cooperation" and "games" (number of games per entry)
+    """
+    index = {p: i for i, p in enumerate(personalities)}
+    size = len(personalities)
+    payoff = [[0.0] * size for _ in range(size)]
+    cooperation = [[0.0] * size for _ in range(size)]
+    games = [[0] * size for _ in range(size)]
+
+    for end_state in end_states:
+        if isinstance(end_state, Exception):
+            continue
+        rounds = max(len(end_state["agent_1_actions"]), 1)
+        seats = [
+            (end_state["personality_key_1"], end_state["personality_key_2"],
+             end_state["agent_1_scores"], end_state["agent_1_actions"], end_state["agent_2_actions"]),
+            (end_state["personality_key_2"], end_state["personality_key_1"],
+             end_state["agent_2_scores"], end_state["agent_2_actions"], end_state["agent_1_actions"]),
+        ]
+        if seats[0][0] == seats[1][0]:
+            seats = seats[:1]  # self-play: count the game once
+        for own, other, scores, own_actions, other_actions in seats:
+            i, j = index[own], index[other]
+            games[i][j] += 1
+            payoff[i][j] += (sum(scores) / rounds - payoff[i][j]) / games[i][j]
+            cooperation[i][j] += (_cooperation(game_name, own_actions, other_actions)
+                                  - cooperation[i][j]) / games[i][j]
+
+    def finished(matrix):
+        return [[matrix[i][j] if games[i][j] else None for j in range(size)] for i in range(size)]
+
+    return {
+        "personalities": personalities,
+        "payoff": finished(payoff),
+        "cooperation": finished(cooperation),
+        "games": games,
+    }
+
+
+def load_variant(path: str):
+    """
+    Load a stored game variant (a GameVariantResponse saved as JSON).
+    """
+    from regulator_agent import GameVariantResponse
+
+    with open(path) as f:
+        return GameVariantResponse.model_validate_json(f.read())
+
+
+def save_matrices(output_dir: str, matrices: dict):
+    """
+    Write matrices.json plus payoff_matrix.csv and cooperation_matrix.csv (rows: the player).
+    """
+    import pandas as pd
+
+    with open(os.path.join(output_dir, "matrices.json"), "w") as f:
+        json.dump(matrices, f, indent=2)
+    for name in ("payoff", "cooperation"):
+        pd.DataFrame(
+            matrices[name], index=matrices["personalities"], columns=matrices["personalities"]
+        ).to_csv(os.path.join(output_dir, f"{name}_matrix.csv"))
+
+
+def main(args):
+    if args.api_base:
+        os.environ["MBTI_API_BASE"] = args.api_base
+
+    from usage_handler import UsageCallbackHandler
+    from game_variant_generator import GameVariantGenerator
+    from logging_setup import setup_logging
+    from run_regulated_game import (
+        generate_variant, load_game_structure_from_registry, run_regulated_game_batch, variant_usage_shares
+    )
+    setup_logging()
+
+    personalities = args.personalities or load_personality_keys(mbti_only=args.mbti_only)
+    if args.focal is not None and args.focal not in personalities:
+        personalities = [args.focal] + personalities
+    pairs = tournament_pairs(personalities, args.focal, args.include_self_play, args.replicates)
+
+    base_game = load_game_structure_from_registry(args.game_name)
+    variant_usage = None
+    if args.variant_file:
+        variant_response, variant_label = load_variant(args.variant_file), "stored"
+    elif args.base_game:
+        variant_response, variant_label = GameVariantGenerator.base_game_variant(base_game), BASE_VARIANT_TYPE
+    else:
+        regulator_handler = UsageCallbackHandler()
+        variant_response = generate_variant(args.regulator_model, args.regulator_provider,
+                                            base_game, args.variant_type, callbacks=[regulator_handler])
+        # Every game plays this variant, so each carries an equal share of the regulator call
+        variant_usage = variant_usage_shares(regulator_handler, len(pairs))
+        variant_label = args.variant_type
+
+    timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M")
+    output_dir = args.output_dir or os.path.join(
+        "data", "tournaments", f"{timestamp}_{args.game_name}_{variant_label}"
+    )
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "variant.json"), "w") as f:
+        f.write(variant_response.model_dump_json(indent=2))
+
+    print(f"Tournament on {args.game_name} ({variant_label}): {len(personalities)} personalities, "
+          f"{len(pairs)} games" + (f", focal {args.focal}" if args.focal else ""), flush=True)
+    end_states = run_regulated_game_batch(
+        args.regulator_model, args.regulator_provider,
+        args.player_model, args.player_provider,
+        args.player_model, args.player_provider,
+        args.rounds, pairs, args.game_name, variant_type=variant_label,
+        file_path=os.path.join(output_dir, "results.csv"),
+        max_concurrency=args.max_concurrency,
+        tags=[{"tournament": os.path.basename(output_dir)} for _ in pairs],
+        variant_response=variant_response,
+        variant_usage=variant_usage,
+    )
+
+    matrices = tournament_matrices(args.game_name, personalities, end_states)
+    save_matrices(output_dir, matrices)
+
+    failed = sum(isinstance(end_state, Exception) for end_state in end_states)
+    print(f"✓ {len(end_states) - failed} games finished, {failed} failed -> {output_dir}")
+    rows = [personalities.index(args.focal)] if args.focal else range(len(personalities))
+    for i in rows:
+        scores = [v for v in matrices["payoff"][i] if v is not None]
+        rates = [v for v in matrices["cooperation"][i] if v is not None]
+        if scores:
+            print(f"  {personalities[i]:<12} mean payoff {sum(scores) / len(scores):6.2f}  "
+                  f"cooperation {sum(rates) / len(rates):5.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Play personalities against each other on one game and build pairwise matrices"
+    )
+    parser.add_argument("--game_name", type=str, required=True, choices=GAME_NAMES)
+    parser.add_argument("--personalities", type=str, nargs="+", required=False,
+                       help="Personality keys taking part (default: all in the priming file)")
+    parser.add_argument("--mbti_only", action="store_true",
+                       help="Only the 16 MBTI types when --personalities is not given")
+    parser.add_argument("--focal", type=str, required=False,
+                       help="Only play this personality against all others (in both seats)")
+    parser.add_argument("--include_self_play", action="store_true")
+    parser.add_argument("--replicates", type=int, default=1, help="Games per seating")
+    parser.add_argument("--rounds", type=int, default=7)
+
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--variant_file", type=str, help="Play a stored variant (variant.json)")
+    source.add_argument("--base_game", action="store_true", help="Play the unmodified base game")
+    parser.add_argument("--variant_type", type=str, default="complex", choices=VARIANT_TYPES,
+                       help="Type of the variant generated when neither source option is given")
+
+    parser.add_argument("--regulator_model", type=str, default="gpt-4o")
+    parser.add_argument("--regulator_provider", type=str, required=False)
+    parser.add_argument("--player_model", type=str, default="gpt-4o-mini")
+    parser.add_argument("--player_provider", type=str, required=False)
+    parser.add_argument("--max_concurrency", type=int, default=16,
+                       help="Maximum number of games running at the same time")
+    parser.add_argument("--output_dir", type=str, required=False,
+                       help="Default: data/tournaments/<timestamp>_<game>_<variant>")
+    parser.add_argument("--api_base", type=str, required=False,
+                       help="OpenAI-compatible endpoint (default: OpenRouter, or MBTI_API_BASE)")
+    main(parser.parse_args())
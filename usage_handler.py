@@ -0,0 +1,70 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Token and cost counter for the games' model calls
+
+from langchain_community.callbacks.openai_info import (
+    MODEL_COST_PER_1K_TOKENS, OpenAICallbackHandler, TokenType, get_openai_token_cost_for_model,
+    standardize_model_name,
+)
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+
+def _without_provider(metadata: dict) -> dict:
+    name = (metadata or {}).get("model_name")
+    if not name or "/" not in name:
+        return metadata
+    return {**metadata, "model_name": name.split("/")[-1]}
+
+
+def token_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """
+    USD cost of tokens of `model_name` as the handlers price them ($0 for unknown models).
+    """
+    name = standardize_model_name(model_name.split("/")[-1])
+    if name not in MODEL_COST_PER_1K_TOKENS:
+        return 0.0
+    return (get_openai_token_cost_for_model(name, prompt_tokens, token_type=TokenType.PROMPT)
+            + get_openai_token_cost_for_model(name, completion_tokens, token_type=TokenType.COMPLETION))
+
+
+def add_usage(handler: OpenAICallbackHandler, model_name: str, prompt_tokens: int, completion_tokens: int):
+    """
+    Add a share of a call's tokens and cost to `handler` without counting it as a request of
+    the handler's game (`successful_requests`), e.g. one item's share of a multi-item judge call.
+    """
+    cost = token_cost(model_name, prompt_tokens, completion_tokens)
+    with handler._lock:
+        handler.prompt_tokens += prompt_tokens
+        handler.completion_tokens += completion_tokens
+        handler.total_tokens += prompt_tokens + completion_tokens
+        handler.total_cost += cost
+
+
+class UsageCallbackHandler(OpenAICallbackHandler):
+    """
+    OpenAICallbackHandler that also prices OpenRouter model ids.
+
+    OpenRouter (and the stand-in server) answer with the provider in the model name
+    ("openai/gpt-4o"), which the OpenAI price table does not know, so the plain handler counts
+    the tokens at $0. The provider is dropped before pricing, as cost_budget.PriceTable does.
+    """
+
+    def on_llm_end(self, response: LLMResult, **kwargs) -> None:
+        generations = [
+            [
+                generation.model_copy(update={"message": generation.message.model_copy(update={
+                    "response_metadata": _without_provider(generation.message.response_metadata)
+                })}) if isinstance(generation, ChatGeneration) else generation
+                for generation in candidates
+            ]
+            for candidates in response.generations
+        ]
+        super().on_llm_end(
+            response.model_copy(update={"generations": generations,
+                                        "llm_output": _without_provider(response.llm_output)}),
+            **kwargs,
+        )
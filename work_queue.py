@@ -0,0 +1,427 @@
+# Copyright (c) 2025 ETH Zurich.
+#                    All rights reserved.
+#
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+#
+# Durable SQLite job queue with leases and heartbeats for multi-machine sweeps
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Optional
+
+from event_log import EVENT_LOG_ENV
+from logging_setup import setup_logging, worker_logging
+from parquet_store import results_path
+from sweep import SweepCell, SweepSpec, run_unit
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key       TEXT PRIMARY KEY,
+    payload       TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    heartbeat_at  REAL,
+    result        TEXT,
+    error         TEXT,
+    created_at    REAL NOT NULL,
+    completed_at  REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+
+@dataclass
+class Job:
+    """
+    A leased job: the sweep unit to run (one cell, or a mirrored pair) and how many times it has
+    been leased.
+    """
+    key: str
+    cells: list
+    attempts: int
+    mirror_pairs: bool = False
+    concurrent_seatings: bool = False
+
+
+def job_payload(unit: list, mirror_pairs: bool = False, concurrent_seatings: bool = False) -> str:
+    return json.dumps({"cells": [asdict(cell) for cell in unit], "mirror_pairs": mirror_pairs,
+                       "concurrent_seatings": concurrent_seatings})
+
+
+def parse_job(key: str, payload: str, attempts: int) -> Job:
+    data = json.loads(payload)
+    if "cells" not in data:
+        data = {"cells": [data]}  # Queues created before jobs were units hold a single cell
+    return Job(key=key, cells=[SweepCell(**cell) for cell in data["cells"]], attempts=attempts,
+               mirror_pairs=data.get("mirror_pairs", False),
+               concurrent_seatings=data.get("concurrent_seatings", False))
+
+
+class WorkQueue:
+    """
+    Job queue stored in one SQLite file, safe for several processes and machines.
+
+    Workers lease jobs for `lease_seconds` and extend the lease with heartbeats. A job whose lease
+    expires (its worker died) is handed out again. Completion is idempotent: the first completion
+    of a job wins and later ones are ignored, so reruns skip finished cells. A job is a unit of
+    `SweepSpec.units()`, so a mirrored pair is leased, run and completed as one.
+
+    The default rollback journal works on shared/network filesystems; pass `wal=True` only when
+    every worker runs on the same machine.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 900.0, max_attempts: int = 3, wal: bool = False):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            if wal:
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers cannot lease the same job
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def enqueue(self, units: list, mirror_pairs: bool = False, concurrent_seatings: bool = False) -> int:
+        """
+        Add units (lists of cells, see `SweepSpec.units`) as pending jobs, keyed by their first
+        cell; units already in the queue (in any state) are left untouched.
+
+        Returns:
+            int: Number of newly added jobs
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (job_key, payload, created_at) VALUES (?, ?, ?)",
+                [(unit[0].key, job_payload(unit, mirror_pairs, concurrent_seatings), now) for unit in units],
+            )
+            return connection.total_changes - before
+
+    def lease(self, worker_id: str) -> Optional[Job]:
+        """
+        Lease the next pending job, or reclaim one whose lease has expired. An expired lease on
+        a job's last attempt (its worker died) marks the job failed, so `retry_failed` can
+        bring it back.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                """
+                UPDATE jobs SET status = 'failed', error = 'expired lease on the last attempt',
+                                lease_owner = NULL, lease_expires = NULL
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+                """,
+                (now, self.max_attempts),
+            )
+            row = connection.execute(
+                """
+                SELECT job_key, payload, attempts FROM jobs
+                WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                  AND attempts < ?
+                ORDER BY rowid LIMIT 1
+                """,
+                (now, self.max_attempts),
+            ).fetchone()
+            if row is None:
+                return None
+            job_key, payload, attempts = row
+            connection.execute(
+                """
+                UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                                heartbeat_at = ?, attempts = attempts + 1
+                WHERE job_key = ?
+                """,
+                (worker_id, now + self.lease_seconds, now, job_key),
+            )
+        return parse_job(job_key, payload, attempts + 1)
+
+    def heartbeat(self, job_key: str, worker_id: str) -> bool:
+        """
+        Extend the lease; False means the lease was lost (expired and taken by another worker).
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                """
+                UPDATE jobs SET lease_expires = ?, heartbeat_at = ?
+                WHERE job_key = ? AND lease_owner = ? AND status = 'leased'
+                """,
+                (now + self.lease_seconds, now, job_key, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_key: str, worker_id: str, result: dict) -> bool:
+        """
+        Record a finished job. Idempotent: returns False if the job was already completed.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                """
+                UPDATE jobs SET status = 'done', result = ?, completed_at = ?, lease_owner = ?,
+                                lease_expires = NULL, error = NULL
+                WHERE job_key = ? AND status != 'done'
+                """,
+                (json.dumps(result), time.time(), worker_id, job_key),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_key: str, worker_id: str, error: str):
+        """
+        Release a failed job: back to pending while attempts remain, otherwise mark it failed.
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                """
+                UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END,
+                                error = ?, lease_owner = NULL, lease_expires = NULL
+                WHERE job_key = ? AND lease_owner = ? AND status = 'leased'
+                """,
+                (self.max_attempts, error, job_key, worker_id),
+            )
+
+    def retry_failed(self) -> int:
+        """
+        Put every failed job back to pending with a fresh attempt budget.
+        """
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0 WHERE status = 'failed'"
+            ).rowcount
+
+    def counts(self) -> dict:
+        """
+        Number of jobs per status; expired leases are reported as "expired".
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'expired' ELSE status END,
+                       COUNT(*)
+                FROM jobs GROUP BY 1
+                """,
+                (time.time(),),
+            ).fetchall()
+        return dict(rows)
+
+    def completed_results(self) -> dict:
+        """
+        Map of job key -> result dict for every completed job.
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT job_key, result FROM jobs WHERE status = 'done'").fetchall()
+        return {key: json.loads(result) for key, result in rows}
+
+
+class Heartbeat:
+    """
+    Background thread that keeps a job's lease alive while the game runs.
+    """
+
+    def __init__(self, queue: WorkQueue, job_key: str, worker_id: str, interval: float):
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(queue, job_key, worker_id, interval), daemon=True)
+
+    def _run(self, queue, job_key, worker_id, interval):
+        while not self._stop.wait(interval):
+            if not queue.heartbeat(job_key, worker_id):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(db_path: str, worker_id: str, output_dir: str, lease_seconds: float,
+               heartbeat_interval: float, api_base: str = None) -> dict:
+    """
+    Lease and run jobs until the queue has nothing left to hand out.
+
+    Each worker appends to its own CSV; the accepted rows of every job (one per cell of its unit)
+    are recorded in the queue so `export` can produce a duplicate-free result file.
+    """
+    if api_base:
+        os.environ["MBTI_API_BASE"] = api_base
+    queue = WorkQueue(db_path, lease_seconds=lease_seconds)
+    date_string = datetime.now().strftime("%y%m%d")
+    file_path = results_path(os.path.join(output_dir, f"{date_string}_regulated_{worker_id}.csv"))
+    log_dir = os.path.join(output_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    completed, failed = 0, 0
+    with worker_logging(os.path.join(log_dir, f"{worker_id}.log")):
+        while True:
+            job = queue.lease(worker_id)
+            if job is None:
+                break
+            logger.info("Leased %s (attempt %d)", job.key, job.attempts)
+            try:
+                with Heartbeat(queue, job.key, worker_id, heartbeat_interval) as heartbeat:
+                    end_states = run_unit(job.cells, file_path, job.mirror_pairs, job.concurrent_seatings,
+                                          tags={"worker_id": worker_id})
+            except Exception as e:
+                logger.error("Error in job %s: %s: %s", job.key, type(e).__name__, e)
+                queue.fail(job.key, worker_id, f"{type(e).__name__}: {e}")
+                failed += 1
+                continue
+            accepted = queue.complete(job.key, worker_id, {
+                "file_path": file_path,
+                "worker_id": worker_id,
+                "cells": [
+                    {"cell_key": cell.key, "agent_1_score": sum(end_state["agent_1_scores"]),
+                     "agent_2_score": sum(end_state["agent_2_scores"])}
+                    for cell, end_state in zip(job.cells, end_states)
+                ],
+            })
+            if heartbeat.lost or not accepted:
+                logger.warning("Job %s was already completed elsewhere; this row is a duplicate", job.key)
+            completed += 1
+    return {"worker_id": worker_id, "completed": completed, "failed": failed}
+
+
+def accepted_cell_keys(job_key: str, result: dict) -> list:
+    """
+    Cell keys of a completed job's accepted rows (results written before jobs were units hold
+    one cell, keyed by the job).
+    """
+    return [cell["cell_key"] for cell in result["cells"]] if "cells" in result else [job_key]
+
+
+def export_results(db_path: str, output_path: str) -> int:
+    """
+    Write one CSV (or Parquet file, for a .parquet output path) containing exactly the accepted
+    row of every completed job.
+    """
+    import pandas as pd
+
+    from parquet_store import is_parquet, read_results_frame
+
+    results = WorkQueue(db_path).completed_results()
+    frames = []
+    for file_path in sorted({r["file_path"] for r in results.values()}):
+        if not os.path.exists(file_path):
+            logger.warning("Missing result file %s", file_path)
+            continue
+        df = read_results_frame(file_path)
+        accepted = {cell_key for key, r in results.items() if r["file_path"] == file_path
+                    for cell_key in accepted_cell_keys(key, r)}
+        df = df[df["cell_key"].isin(accepted)].drop_duplicates(subset="cell_key", keep="first")
+        frames.append(df)
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if is_parquet(output_path):
+        merged.to_parquet(output_path, index=False)
+    else:
+        merged.to_csv(output_path, index=False)
+    return len(merged)
+
+
+def main(args):
+    setup_logging()
+    if args.command == "enqueue":
+        queue = WorkQueue(args.db, wal=args.wal)
+        spec = SweepSpec.from_file(args.spec)
+        units = spec.units()
+        added = queue.enqueue(units, spec.mirror_pairs, spec.concurrent_seatings)
+        print(f"Enqueued {added} new jobs ({len(units) - added} already present; "
+              f"{sum(len(unit) for unit in units)} cells) into {args.db}")
+    elif args.command == "worker":
+        os.makedirs(args.output_dir, exist_ok=True)
+        base_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        worker_ids = [base_id] if args.processes == 1 else [f"{base_id}-{i}" for i in range(args.processes)]
+        if args.event_log:
+            os.environ[EVENT_LOG_ENV] = args.event_log  # inherited by the worker processes
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            futures = [
+                pool.submit(run_worker, args.db, worker_id, args.output_dir,
+                            args.lease_seconds, args.heartbeat_interval, args.api_base)
+                for worker_id in worker_ids
+            ]
+            for future in futures:
+                summary = future.result()
+                print(f"✓ Worker {summary['worker_id']}: {summary['completed']} completed, {summary['failed']} failed")
+    elif args.command == "status":
+        counts = WorkQueue(args.db).counts()
+        total = sum(counts.values())
+        print(f"{args.db}: {total} jobs")
+        for status in ("pending", "leased", "expired", "done", "failed"):
+            print(f"  {status:<8} {counts.get(status, 0)}")
+    elif args.command == "retry_failed":
+        print(f"Reset {WorkQueue(args.db).retry_failed()} failed jobs to pending")
+    elif args.command == "export":
+        rows = export_results(args.db, args.output)
+        print(f"Exported {rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite lease work queue for sweeps across machines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add the units (cells or mirrored pairs) of a sweep spec as jobs")
+    enqueue_parser.add_argument("spec", type=str)
+    enqueue_parser.add_argument("--db", type=str, required=True)
+    enqueue_parser.add_argument("--wal", action="store_true",
+                               help="Use WAL journaling (only if all workers share one machine)")
+
+    worker_parser = subparsers.add_parser("worker", help="Lease and run jobs until none are left")
+    worker_parser.add_argument("--db", type=str, required=True)
+    worker_parser.add_argument("--processes", type=int, default=1, help="Worker processes on this machine")
+    worker_parser.add_argument("--worker_id", type=str, required=False, help="Default: <hostname>-<pid>")
+    worker_parser.add_argument("--output_dir", type=str, default="data/outputs")
+    worker_parser.add_argument("--lease_seconds", type=float, default=900.0)
+    worker_parser.add_argument("--heartbeat_interval", type=float, default=60.0)
+    worker_parser.add_argument("--api_base", type=str, required=False)
+    worker_parser.add_argument("--event_log", type=str, required=False,
+                               help="Append game events to this JSONL file (one per machine: "
+                                    "appends are not atomic on network file systems)")
+
+    status_parser = subparsers.add_parser("status", help="Show job counts per status")
+    status_parser.add_argument("--db", type=str, required=True)
+
+    retry_parser = subparsers.add_parser("retry_failed", help="Reset failed jobs to pending")
+    retry_parser.add_argument("--db", type=str, required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write the accepted row of every completed job")
+    export_parser.add_argument("--db", type=str, required=True)
+    export_parser.add_argument("--output", type=str, required=True)
+
+    main(parser.parse_args())